@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class ComplimentApiConfig(AppConfig):
+    name = 'complimentapi'
+
+    def ready(self):
+        from complimentapi import checks, signals  # noqa: F401
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'complimentapi.settings')
+# Set ASYNC_VIEWS=0 to serve the synchronous DRF viewsets instead
+os.environ.setdefault('ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -0,0 +1,31 @@
+"""complimentapi URL Configuration for ASGI
+
+Serves the receiver and compliment routes from the native async views in complimentapi.async_views, and falls back to
+complimentapi.urls for everything else. Used as ROOT_URLCONF when ASYNC_VIEWS is enabled, see complimentapi/asgi.py.
+"""
+from django.urls import path
+
+from complimentapi import async_views, urls
+
+urlpatterns = [
+    path('receivers', async_views.ReceiverListView.as_view(), name='receivers-list'),
+    path('receivers/random-digest', async_views.RandomDigestView.as_view(), name='receivers-random-digest'),
+    path('receivers/<int:pk>', async_views.ReceiverDetailView.as_view(), name='receivers-detail'),
+    path(
+        'receivers/<int:pk>/random-compliment',
+        async_views.RandomComplimentView.as_view(),
+        name='receivers-random-compliment'
+    ),
+    path(
+        'receivers/<int:pk>/random-compliment-list',
+        async_views.RandomComplimentListView.as_view(),
+        name='receivers-random-compliment-list'
+    ),
+    path('receivers/<int:receiver_pk>/compliments', async_views.ComplimentListView.as_view(), name='compliments-list'),
+    path(
+        'receivers/<int:receiver_pk>/compliments/<int:pk>',
+        async_views.ComplimentDetailView.as_view(),
+        name='compliments-detail'
+    ),
+]
+urlpatterns += urls.urlpatterns
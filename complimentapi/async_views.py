@@ -0,0 +1,268 @@
+import json
+from typing import Optional, Type
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.db.models import QuerySet
+from django.http import HttpRequest, HttpResponse
+from django.views import View
+from rest_framework.exceptions import AuthenticationFailed, MethodNotAllowed
+from rest_framework.request import Request
+from rest_framework.serializers import Serializer
+
+from complimentapi.authentication import StatelessJWTAuthentication
+from complimentapi.idempotency import IdempotencyKeyReused, idempotency_key, record_response, replayed_response
+from complimentapi.models import Receiver, Compliment, compliment_text_hash
+from complimentapi.pagination import paginated_response
+from complimentapi.renderers import FastJSONRenderer
+from complimentapi.retrievals import select_compliments, select_digest
+from complimentapi.serializers import DUPLICATE_TEXT_ERRORS, ReceiverSerializer, ComplimentSerializer
+from complimentapi.throttling import athrottle, with_rate_limit
+from complimentapi.validators import (
+    Validator, compliments_validator, not_modified, object_validator, receivers_validator, with_validator
+)
+
+import logging
+logger = logging.getLogger('django')
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def render(data, status: int = 200) -> HttpResponse:
+    # Same renderer as the DRF viewsets, so both modes return identical bytes
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def parse_body(request: HttpRequest) -> dict:
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError as e:
+        raise HttpError(400, 'JSON parse error - {}'.format(e))
+
+
+async def paginate(
+    request: HttpRequest, queryset: QuerySet, serializer_class: Type[Serializer], validator: Validator
+) -> HttpResponse:
+    # The paginator reads query params and builds links from a DRF request
+    response = await sync_to_async(paginated_response)(queryset, serializer_class, Request(request))
+
+    return with_validator(render(response.data), validator)
+
+
+async def get_owned_receiver(request: HttpRequest, receiver_pk: int) -> Receiver:
+    try:
+        receiver = await Receiver.objects.aget(id=receiver_pk)
+    except Receiver.DoesNotExist:
+        raise HttpError(404, 'Not found.')
+
+    if receiver.user_id != request.user.id:
+        raise HttpError(403, 'You do not have permission to perform this action.')
+
+    return receiver
+
+
+async def get_owned_compliment(request: HttpRequest, pk: int) -> Compliment:
+    try:
+        compliment = await Compliment.objects.select_related('receiver').aget(id=pk)
+    except Compliment.DoesNotExist:
+        raise HttpError(404, 'Not found.')
+
+    if compliment.receiver.user_id != request.user.id:
+        raise HttpError(403, 'You do not have permission to perform this action.')
+
+    return compliment
+
+
+class AsyncAPIView(View):
+    """
+    Base for the async counterparts of ReceiverViewSet and ComplimentViewSet. Authenticates with the same stateless
+    JWT authentication, which needs no database access, throttles with the same token buckets, and turns HttpErrors
+    into DRF-style error responses.
+    """
+
+    authentication = StatelessJWTAuthentication()
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # Token authenticated like the DRF views, which are exempt too
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        try:
+            user_auth_tuple: Optional[tuple] = self.authentication.authenticate(request)
+        except AuthenticationFailed as e:
+            return self.unauthorized(e.detail)
+
+        if user_auth_tuple is None:
+            return self.unauthorized('Authentication credentials were not provided.')
+
+        request.user, request.auth = user_auth_tuple
+
+        bucket, throttled = await athrottle(request, request.user)
+        if throttled is not None:
+            return throttled
+
+        try:
+            response = await super().dispatch(request, *args, **kwargs)
+        except HttpError as e:
+            response = render({'detail': e.detail}, e.status)
+
+        return with_rate_limit(response, bucket)
+
+    async def http_method_not_allowed(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        # View.dispatch hands unknown methods to this handler, and the response is awaited like any other. Django's
+        # logs the request
+        await super().http_method_not_allowed(request, *args, **kwargs)
+
+        response = render({'detail': MethodNotAllowed(request.method).detail}, 405)
+        response['Allow'] = ', '.join(self._allowed_methods())
+        return response
+
+    def unauthorized(self, detail) -> HttpResponse:
+        # Like DRF's exception handler, dict details (e.g. simplejwt's InvalidToken) are the body themselves
+        response = render(detail if isinstance(detail, dict) else {'detail': detail}, 401)
+        response['WWW-Authenticate'] = self.authentication.authenticate_header(self.request)
+        return response
+
+
+class ReceiverListView(AsyncAPIView):
+    async def get(self, request: HttpRequest) -> HttpResponse:
+        validator = await sync_to_async(receivers_validator)(request.user.id)
+
+        return not_modified(request, validator) or await paginate(
+            request, Receiver.objects.filter(user_id=request.user.id), ReceiverSerializer, validator
+        )
+
+    async def post(self, request: HttpRequest) -> HttpResponse:
+        serializer = ReceiverSerializer(data=parse_body(request))
+        if not serializer.is_valid():
+            return render(serializer.errors, 400)
+
+        receiver = await Receiver.objects.acreate(user_id=request.user.id, **serializer.validated_data)
+
+        return render(ReceiverSerializer(receiver).data)
+
+
+class ReceiverDetailView(AsyncAPIView):
+    async def get(self, request: HttpRequest, pk: int) -> HttpResponse:
+        receiver = await get_owned_receiver(request, pk)
+        validator = object_validator(receiver, 'updated_at')
+
+        return not_modified(request, validator) or with_validator(render(ReceiverSerializer(receiver).data), validator)
+
+    async def patch(self, request: HttpRequest, pk: int) -> HttpResponse:
+        receiver = await get_owned_receiver(request, pk)
+        serializer = ReceiverSerializer(receiver, data=parse_body(request), partial=True)
+
+        if not serializer.is_valid():
+            return render(serializer.errors, 400)
+
+        await sync_to_async(serializer.save)()
+
+        return render(serializer.data)
+
+    async def delete(self, request: HttpRequest, pk: int) -> HttpResponse:
+        # Receiver.delete removes the compliments in batches first, a queryset delete would collect them all
+        await sync_to_async((await get_owned_receiver(request, pk)).delete)()
+        return HttpResponse(status=204)
+
+
+class RandomComplimentView(AsyncAPIView):
+    async def get(self, request: HttpRequest, pk: int) -> HttpResponse:
+        random_compliments = await sync_to_async(select_compliments)(await get_owned_receiver(request, pk))
+
+        if not random_compliments:
+            return HttpResponse(status=404)
+
+        return render(ComplimentSerializer(random_compliments[0]).data)
+
+
+class RandomComplimentListView(AsyncAPIView):
+    async def get(self, request: HttpRequest, pk: int) -> HttpResponse:
+        number: int = 3
+
+        try:
+            number = int(request.GET.get('number', number))
+        except Exception as e:
+            logger.error(str(e), exc_info=True)
+
+        random_compliments = await sync_to_async(select_compliments)(await get_owned_receiver(request, pk), number)
+
+        return render(ComplimentSerializer(random_compliments, many=True).data)
+
+
+class RandomDigestView(AsyncAPIView):
+    async def get(self, request: HttpRequest) -> HttpResponse:
+        random_compliments = await sync_to_async(select_digest)(request.user.id)
+
+        return render(ComplimentSerializer(random_compliments, many=True).data)
+
+
+class ComplimentListView(AsyncAPIView):
+    async def get(self, request: HttpRequest, receiver_pk: int) -> HttpResponse:
+        receiver = await get_owned_receiver(request, receiver_pk)
+        validator = await sync_to_async(compliments_validator)(receiver.id)
+
+        return not_modified(request, validator) or await paginate(
+            request, Compliment.objects.filter(receiver=receiver), ComplimentSerializer, validator
+        )
+
+    async def post(self, request: HttpRequest, receiver_pk: int) -> HttpResponse:
+        receiver = await get_owned_receiver(request, receiver_pk)
+        serializer = ComplimentSerializer(data=parse_body(request))
+
+        if not serializer.is_valid():
+            return render(serializer.errors, 400)
+
+        text_hash = compliment_text_hash(serializer.validated_data['text'])
+        cache_key = idempotency_key(request, receiver.id)
+
+        try:
+            data = await sync_to_async(replayed_response)(cache_key, text_hash)
+        except IdempotencyKeyReused as e:
+            return render({'detail': str(e)}, 422)
+
+        if data is None:
+            # aget_or_create sends post_save like the sync path, so sampling tables are invalidated the same way
+            compliment, _ = await Compliment.objects.aget_or_create(
+                receiver=receiver, text_hash=text_hash, defaults=serializer.validated_data
+            )
+            data = ComplimentSerializer(compliment).data
+            await sync_to_async(record_response)(cache_key, text_hash, data)
+
+        return render(data)
+
+
+class ComplimentDetailView(AsyncAPIView):
+    async def get(self, request: HttpRequest, pk: int, receiver_pk: int) -> HttpResponse:
+        compliment = await get_owned_compliment(request, pk)
+        validator = object_validator(compliment, 'updated_at', 'last_retrieved_at')
+
+        return not_modified(request, validator) or with_validator(
+            render(ComplimentSerializer(compliment).data), validator
+        )
+
+    async def patch(self, request: HttpRequest, pk: int, receiver_pk: int) -> HttpResponse:
+        compliment = await get_owned_compliment(request, pk)
+        serializer = ComplimentSerializer(compliment, data=parse_body(request), partial=True)
+
+        if not serializer.is_valid():
+            return render(serializer.errors, 400)
+
+        try:
+            await sync_to_async(transaction.atomic(serializer.save))()
+        except IntegrityError:
+            return render(DUPLICATE_TEXT_ERRORS, 400)
+
+        return render(serializer.data)
+
+    async def delete(self, request: HttpRequest, pk: int, receiver_pk: int) -> HttpResponse:
+        await Compliment.objects.filter(id=(await get_owned_compliment(request, pk)).id).adelete()
+        return HttpResponse(status=204)
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.models import TokenUser
+
+from complimentapi.db_routers import identify_user
+from complimentapi.instrumentation import timed
+from complimentapi.models import User
+
+
+def _user_key(user_id: int) -> str:
+    return 'token-user:{}'.format(user_id)
+
+
+def forget_token_user(user_id: int) -> None:
+    """
+    Drop the cached User of LazyTokenUser once the current transaction commits, for users that changed or are gone.
+    """
+    transaction.on_commit(lambda: cache.delete(_user_key(user_id)))
+
+
+class LazyTokenUser(TokenUser):
+    """
+    A user built from the access token claims. Only the id is known up front, the User row is loaded the first time
+    any other attribute is read, and kept in the cache for TOKEN_USER_CACHE_TIMEOUT seconds or until it is saved or
+    deleted. Deleted and inactive users fail authentication then, like simplejwt's JWTAuthentication does up front.
+    """
+
+    @cached_property
+    def user(self) -> User:
+        key = _user_key(self.id)
+        user = cache.get(key) if settings.TOKEN_USER_CACHE_TIMEOUT else None
+
+        if user is None:
+            try:
+                user = User.objects.get(id=self.id)
+            except User.DoesNotExist:
+                raise AuthenticationFailed('User not found', code='user_not_found')
+
+            if settings.TOKEN_USER_CACHE_TIMEOUT:
+                cache.set(key, user, settings.TOKEN_USER_CACHE_TIMEOUT)
+
+        if not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+
+        return user
+
+    def __getattr__(self, name: str):
+        # Only reached for attributes TokenUser doesn't define itself
+        if name.startswith('_') or name == 'user':
+            raise AttributeError(name)
+
+        return getattr(self.user, name)
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    Authenticates requests from the access token alone, without a User query. request.user is a LazyTokenUser, and
+    ReplicaRouter routes the rest of the request by their pin.
+    """
+
+    def authenticate(self, request):
+        with timed('auth'):
+            user_auth_tuple = super().authenticate(request)
+
+        if user_auth_tuple is not None:
+            identify_user(user_auth_tuple[0].id)
+
+        return user_auth_tuple
@@ -0,0 +1,150 @@
+import io
+from contextlib import nullcontext
+import re
+from typing import Any, List, Optional
+
+from django.db import transaction
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from complimentapi.renderers import FastJSONRenderer
+
+import logging
+logger = logging.getLogger('django')
+
+# Operations refer to the response body of an earlier one with {{index.field}}, like /receivers/{{0.id}}/compliments.
+# A string that is only a reference is replaced with the value itself, so {"receiver": "{{0.id}}"} stays a number
+REFERENCE_PATTERN = re.compile(r'\{\{(\d+)\.([\w.]+)\}\}')
+
+
+# Headers that apply to the batch request itself, a single Idempotency-Key would make every creation after the first
+# one conflict
+BATCH_ONLY_HEADERS = {
+    'HTTP_IDEMPOTENCY_KEY', 'HTTP_IF_MATCH', 'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE', 'HTTP_IF_UNMODIFIED_SINCE'
+}
+
+
+class BatchReferenceError(Exception):
+    pass
+
+
+def _referenced_value(match: re.Match, results: List[dict]) -> Any:
+    index = int(match.group(1))
+    if index >= len(results):
+        raise BatchReferenceError('{} refers to an operation that has not run yet.'.format(match.group(0)))
+
+    result = results[index]
+    if result['status'] >= 400:
+        raise BatchReferenceError('{} refers to operation {}, which failed.'.format(match.group(0), index))
+
+    value = result['body']
+    for field in match.group(2).split('.'):
+        try:
+            value = value[int(field) if isinstance(value, list) else field]
+        except (KeyError, IndexError, TypeError, ValueError):
+            raise BatchReferenceError('{} is not in the body of operation {}.'.format(match.group(0), index))
+
+    return value
+
+
+def resolve_references(value: Any, results: List[dict]) -> Any:
+    """
+    `value` with the references to earlier results replaced, in strings nested in dicts and lists too.
+    """
+    if isinstance(value, str):
+        match = REFERENCE_PATTERN.fullmatch(value)
+        if match:
+            return _referenced_value(match, results)
+
+        return REFERENCE_PATTERN.sub(lambda match: str(_referenced_value(match, results)), value)
+
+    if isinstance(value, dict):
+        return {key: resolve_references(item, results) for key, item in value.items()}
+
+    if isinstance(value, list):
+        return [resolve_references(item, results) for item in value]
+
+    return value
+
+
+class SubRequest(HttpRequest):
+    """
+    An operation of a batch, sent straight to its view. Carries the batch request's headers, client address and
+    scheme, and its already authenticated user.
+    """
+
+    def __init__(self, batch_request: Request, method: str, path: str, body: Optional[Any]):
+        super().__init__()
+        self.batch_request = batch_request
+
+        path, _, query_string = path.partition('?')
+        content = FastJSONRenderer().render(body) if body is not None else b''
+
+        self.method = method
+        self.path = self.path_info = path
+        self.META = {
+            **{key: value for key, value in batch_request.META.items() if key not in BATCH_ONLY_HEADERS},
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': query_string,
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(content)),
+        }
+        self.GET = QueryDict(query_string)
+        self._stream = io.BytesIO(content)
+        self._read_started = False
+
+        # Read by DRF's Request in place of its authenticators, so the JWT isn't decoded again for every operation
+        self._force_auth_user = batch_request.user
+        self._force_auth_token = batch_request.auth
+
+    def _get_scheme(self) -> str:
+        return self.batch_request.scheme
+
+
+def run_operation(batch_request: Request, method: str, path: str, body: Optional[Any], results: List[dict]) -> dict:
+    """
+    Run one operation of a batch against complimentapi.urls, returning its status and body. Errors in the operation's
+    view are returned as a 500 for that operation.
+    """
+    try:
+        path = resolve_references(path, results)
+        body = resolve_references(body, results)
+    except BatchReferenceError as e:
+        return {'status': 424, 'body': {'detail': str(e)}}
+
+    # The views read their body as a dict, a list or a scalar would fail in them rather than in validation
+    if body is not None and not isinstance(body, dict):
+        return {'status': 400, 'body': {'detail': 'The body of an operation must be a JSON object.'}}
+
+    sub_request = SubRequest(batch_request, method, path, body)
+
+    try:
+        # Always the DRF views, also when ASYNC_VIEWS serves the async ones at the top level
+        match = resolve(sub_request.path_info, urlconf='complimentapi.urls')
+    except Resolver404:
+        match = None
+
+    # Only the API's DRF views can be batched, not plain Django views or batches themselves
+    if match is None or not hasattr(match.func, 'cls') or match.url_name == 'batch':
+        return {'status': 404, 'body': {'detail': 'Not found.'}}
+
+    sub_request.resolver_match = match
+
+    try:
+        # Writes get a savepoint of their own, so one that fails halfway leaves nothing behind for the ones after it
+        with transaction.atomic() if method != 'GET' else nullcontext():
+            response = match.func(sub_request, *match.args, **match.kwargs)
+    except Exception as e:
+        # Fails this operation only, the results of the others are still returned
+        logger.error(str(e), exc_info=True)
+        return {'status': 500, 'body': {'detail': str(APIException.default_detail)}}
+
+    if response.streaming:
+        response.close()
+        return {'status': 400, 'body': {'detail': 'Streamed responses like exports can\'t be batched.'}}
+
+    return {'status': response.status_code, 'body': response.data if isinstance(response, Response) else None}
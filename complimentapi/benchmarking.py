@@ -0,0 +1,147 @@
+import random
+import statistics
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import override_settings
+from django.utils import timezone
+
+from complimentapi.models import User, Receiver, Compliment, compliment_text_hash
+from complimentapi.search import index_compliments
+
+
+@contextmanager
+def benchmark_database() -> Iterator[None]:
+    """
+    Run the enclosed block against a throwaway copy of the configured database, the same way the test runner does,
+    so benchmarks never touch real data. Replicas are pointed at the copy too. Throttles still run, with a budget no
+    benchmark can use up.
+    """
+    old_name = connection.settings_dict['NAME']
+    replica_names = {alias: connections[alias].settings_dict['NAME'] for alias in settings.DATABASE_REPLICAS}
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    for alias in replica_names:
+        connections[alias].close()
+        connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+
+    try:
+        with override_settings(THROTTLE_RATES={'default': '1000000/s'}):
+            yield
+    finally:
+        for alias, name in replica_names.items():
+            connections[alias].close()
+            connections[alias].settings_dict['NAME'] = name
+
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+@contextmanager
+def capture_queries() -> Iterator[List[Tuple[str, str, Any]]]:
+    """
+    Collect (alias, sql, params) of every query this thread runs on default or a replica in the enclosed block.
+    """
+    captured = []
+
+    def capture(alias: str) -> Callable:
+        def wrapper(execute, sql, params, many, context):
+            captured.append((alias, sql, params))
+            return execute(sql, params, many, context)
+
+        return wrapper
+
+    with ExitStack() as stack:
+        for alias in [DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS]:
+            stack.enter_context(connections[alias].execute_wrapper(capture(alias)))
+
+        yield captured
+
+
+# Cache methods that are a round trip each on a networked cache
+CACHE_METHODS = (
+    'get', 'set', 'add', 'incr', 'decr', 'delete', 'touch', 'has_key', 'get_many', 'set_many', 'delete_many'
+)
+
+
+@contextmanager
+def capture_cache_calls(alias: str) -> Iterator[List[str]]:
+    """
+    Collect the names of the calls this thread makes to the `alias` cache in the enclosed block. Calls made by another
+    one, like BaseCache.get_many calling get, count once.
+    """
+    cache = caches[alias]
+    captured = []
+    depth = 0
+
+    def capture(name: str, method: Callable) -> Callable:
+        def wrapper(*args, **kwargs):
+            nonlocal depth
+            if not depth:
+                captured.append(name)
+
+            depth += 1
+            try:
+                return method(*args, **kwargs)
+            finally:
+                depth -= 1
+
+        return wrapper
+
+    for name in CACHE_METHODS:
+        setattr(cache, name, capture(name, getattr(cache, name)))
+
+    try:
+        yield captured
+    finally:
+        # Uncovers the class' methods again
+        for name in CACHE_METHODS:
+            delattr(cache, name)
+
+
+def seed_receiver(user: User, compliment_count: int, batch_size: int = 5000) -> Receiver:
+    receiver = Receiver.objects.create(user=user, name='Receiver with {} compliments'.format(compliment_count))
+    now = timezone.now()
+
+    for start in range(0, compliment_count, batch_size):
+        index_compliments(Compliment.objects.bulk_create([
+            Compliment(
+                receiver=receiver,
+                text='Compliment number {}'.format(i),
+                text_hash=compliment_text_hash('Compliment number {}'.format(i)),
+                # Skew retrievals so most compliments were seen recently and a long tail has not been seen in weeks
+                last_retrieved_at=now - timedelta(minutes=int(random.expovariate(1 / 600)))
+            )
+            for i in range(start, min(start + batch_size, compliment_count))
+        ]))
+
+    return receiver
+
+
+def time_calls(func: Callable[[], object], iterations: int) -> List[float]:
+    samples = []
+
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    return samples
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+
+    def percentile(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    return {
+        'mean_ms': round(statistics.fmean(ordered), 3),
+        'p50_ms': round(percentile(50), 3),
+        'p95_ms': round(percentile(95), 3),
+        'p99_ms': round(percentile(99), 3),
+    }
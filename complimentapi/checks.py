@@ -0,0 +1,83 @@
+from typing import List, Set
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core import checks
+
+# Backends whose entries only the process that wrote them can see
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Settings naming caches that every worker process has to share, and what breaks when they don't
+SHARED_CACHES = {
+    'SAMPLING_TABLE_CACHE': 'other workers would keep sampling from invalidated tables',
+    'REPLICA_PIN_CACHE': 'users would read their own writes from lagging replicas in other workers',
+    'THROTTLE_CACHE': 'every worker would keep a token bucket of its own, multiplying the rate limits',
+}
+
+# Settings naming caches whose entries must outlive memory pressure, and what breaks when they are evicted
+DURABLE_CACHES = {
+    'THROTTLE_CACHE': 'clients would get fresh token buckets and around the rate limits',
+    'REPLICA_PIN_CACHE': 'users would read their own writes from lagging replicas',
+    'IDEMPOTENCY_CACHE': 'retried creations would no longer be answered with the first response',
+}
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_caches(app_configs, **kwargs):
+    errors = []
+
+    for setting, problem in SHARED_CACHES.items():
+        alias = getattr(settings, setting)
+        backend = settings.CACHES[alias]['BACKEND']
+
+        if backend in PROCESS_LOCAL_CACHE_BACKENDS:
+            errors.append(checks.Error(
+                '{} uses the {!r} cache, whose {} backend is local to each process, so {}.'.format(
+                    setting, alias, backend.rsplit('.', 1)[-1], problem
+                ),
+                hint='Use a shared backend like RedisCache. Silence complimentapi.E001 if only one process serves the '
+                     'API.',
+                id='complimentapi.E001',
+            ))
+
+    return errors
+
+
+def _redis_instances(alias: str) -> Set[str]:
+    # The servers of a Redis cache, without the database number, which shares the server's eviction policy
+    cache = settings.CACHES[alias]
+    if not cache['BACKEND'].endswith('RedisCache'):
+        return set()
+
+    locations: List[str] = cache['LOCATION']
+    if isinstance(locations, str):
+        locations = locations.split(',')
+
+    return {urlsplit(location.strip()).netloc for location in locations}
+
+
+@checks.register(checks.Tags.caches)
+def check_evictable_caches(app_configs, **kwargs):
+    """
+    The sampling cache is meant to evict its least recently used tables when full. An eviction policy is per Redis
+    server, so the caches that must keep their entries can't live on the same one.
+    """
+    warnings = []
+    sampling_instances = _redis_instances(settings.SAMPLING_TABLE_CACHE)
+
+    for setting, problem in DURABLE_CACHES.items():
+        shared = sampling_instances & _redis_instances(getattr(settings, setting))
+
+        if shared:
+            warnings.append(checks.Warning(
+                '{} shares the Redis server {} with SAMPLING_TABLE_CACHE. Evicting sampling tables under memory '
+                'pressure would evict its entries too, and {}.'.format(setting, ', '.join(sorted(shared)), problem),
+                hint='Give the sampling cache a Redis server of its own with an LRU eviction policy, and keep the '
+                     'others on one with noeviction.',
+                id='complimentapi.W001',
+            ))
+
+    return warnings
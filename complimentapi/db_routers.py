@@ -0,0 +1,126 @@
+import asyncio
+import random
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpRequest, HttpResponse
+from django.utils.decorators import sync_and_async_middleware
+
+
+class _ClientPin:
+    """
+    Replica stickiness of the user making the current request, keyed by their user id, so every token and device of a
+    user that writes is pinned alike. The id is the one StatelessJWTAuthentication validated, see identify_user.
+    Reads before that, and in requests without a valid token, go to default.
+    """
+
+    def __init__(self):
+        self.user_id: Optional[int] = None
+        self.pinned: Optional[bool] = None
+        self.wrote = False
+
+    @property
+    def cache_key(self) -> Optional[str]:
+        return 'replica-pin:{}'.format(self.user_id) if self.user_id is not None else None
+
+    def is_pinned(self) -> bool:
+        if self.cache_key is None:
+            return True
+
+        # Looked up once per request, on the first read
+        if self.pinned is None:
+            self.pinned = bool(caches[settings.REPLICA_PIN_CACHE].get(self.cache_key))
+
+        return self.pinned
+
+    def pin(self) -> None:
+        if not self.wrote and self.cache_key is not None:
+            caches[settings.REPLICA_PIN_CACHE].set(self.cache_key, True, settings.REPLICA_PIN_SECONDS)
+            self.pinned = self.wrote = True
+
+
+# Shared by reference with sync_to_async threads, so a write made there pins the rest of the request too
+_client_pin: ContextVar[Optional[_ClientPin]] = ContextVar('client_pin', default=None)
+
+
+def identify_user(user_id: int) -> None:
+    """
+    Record the authenticated user of the current request, whose pin decides where its reads go.
+    """
+    client_pin = _client_pin.get()
+    if client_pin is not None:
+        client_pin.user_id = user_id
+
+
+def read_from_default() -> None:
+    """
+    Send the rest of the current request's reads to default, without pinning the user for later requests.
+    """
+    client_pin = _client_pin.get()
+    if client_pin is not None:
+        client_pin.pinned = True
+
+
+class ReplicaRouter:
+    """
+    Sends reads to one of DATABASE_REPLICAS at random and writes to default. A user who writes is pinned to
+    default for REPLICA_PIN_SECONDS, so they read their own writes instead of a lagging replica, see
+    replica_pinning_middleware. Reads inside a transaction and reads outside of a request, like the retrieval buffer's,
+    always go to default.
+    """
+
+    def db_for_read(self, model, **hints) -> str:
+        if not settings.DATABASE_REPLICAS or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+
+        client_pin = _client_pin.get()
+        if client_pin is None or client_pin.is_pinned():
+            return DEFAULT_DB_ALIAS
+
+        # Related objects are read from wherever their instance came from, unless the request was pinned since
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints) -> str:
+        client_pin = _client_pin.get()
+        if client_pin is not None:
+            client_pin.pin()
+
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> Optional[bool]:
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+
+        return True if obj1._state.db in databases and obj2._state.db in databases else None
+
+
+@sync_and_async_middleware
+def replica_pinning_middleware(get_response: Callable) -> Callable:
+    """
+    Tracks the requesting user for ReplicaRouter, once authentication identified them. Anonymous requests aren't tracked
+    and read from default.
+    """
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request: HttpRequest) -> HttpResponse:
+            token = _client_pin.set(_ClientPin())
+
+            try:
+                return await get_response(request)
+            finally:
+                _client_pin.reset(token)
+    else:
+        def middleware(request: HttpRequest) -> HttpResponse:
+            token = _client_pin.set(_ClientPin())
+
+            try:
+                return get_response(request)
+            finally:
+                _client_pin.reset(token)
+
+    return middleware
@@ -0,0 +1,49 @@
+import hashlib
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpRequest
+
+# Creating a compliment is idempotent by content already: a retry finds the row the first attempt created through the
+# unique (receiver, text_hash) index and returns it. An Idempotency-Key header also lets a retry skip the database, the
+# first response is kept in IDEMPOTENCY_CACHE for IDEMPOTENCY_KEY_SECONDS and replayed as is. Keys are scoped to the
+# receiver, which belongs to a single user.
+
+
+class IdempotencyKeyReused(Exception):
+    """
+    The Idempotency-Key was already used to create a different compliment.
+    """
+
+
+def idempotency_key(request: HttpRequest, receiver_id: int) -> Optional[str]:
+    key = request.headers.get('Idempotency-Key')
+    if not key:
+        return None
+
+    return 'idempotency:{}:{}'.format(receiver_id, hashlib.sha256(key.encode()).hexdigest())
+
+
+def replayed_response(cache_key: Optional[str], text_hash: str) -> Optional[dict]:
+    """
+    The data of the response first sent for the key, or None if there is none.
+    """
+    if cache_key is None:
+        return None
+
+    recorded = caches[settings.IDEMPOTENCY_CACHE].get(cache_key)
+    if recorded is None:
+        return None
+
+    recorded_hash, data = recorded
+    if recorded_hash != text_hash:
+        raise IdempotencyKeyReused('Idempotency-Key was already used for a different compliment.')
+
+    return data
+
+
+def record_response(cache_key: Optional[str], text_hash: str, data: dict) -> None:
+    if cache_key is not None:
+        # Concurrent first attempts created the same row, whichever is recorded first is replayed
+        caches[settings.IDEMPOTENCY_CACHE].add(cache_key, (text_hash, dict(data)), settings.IDEMPOTENCY_KEY_SECONDS)
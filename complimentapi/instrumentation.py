@@ -0,0 +1,219 @@
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import sync_and_async_middleware
+
+# Prometheus' default buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Phases reported besides the database, timed with `timed`
+PHASES = ('serialize', 'auth')
+
+# Method labels, any other method is recorded as OTHER so clients can't add label values
+METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+
+
+class RequestMetrics:
+    """
+    Time spent by the current request in the database and in each phase, in seconds.
+    """
+
+    __slots__ = ('db_queries', 'db_time', 'phase_times')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.phase_times = dict.fromkeys(PHASES, 0.0)
+
+    def server_timing(self, total: float) -> str:
+        timings = [
+            'total;dur={:.2f}'.format(total * 1000),
+            'db;dur={:.2f};desc="{} queries"'.format(self.db_time * 1000, self.db_queries),
+        ]
+        timings.extend('{};dur={:.2f}'.format(phase, seconds * 1000) for phase, seconds in self.phase_times.items())
+
+        return ', '.join(timings)
+
+
+# Shared by reference with sync_to_async threads, so queries run there are counted for the request too
+_request_metrics: ContextVar[Optional[RequestMetrics]] = ContextVar('request_metrics', default=None)
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    """
+    Count the enclosed block towards `phase` of the current request. Does nothing outside of a request.
+    """
+    metrics = _request_metrics.get()
+    if metrics is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.phase_times[phase] += time.perf_counter() - start
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper installed on every database connection, see complimentapi.signals.
+    """
+    metrics = _request_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - start
+        metrics.db_queries += 1
+
+
+class RouteHistograms:
+    """
+    Per-route latency histograms and totals, exposed in the Prometheus text format. Kept per process, like the
+    Prometheus client's default registry.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[Tuple[str, str], List[int]] = defaultdict(lambda: [0] * (len(DURATION_BUCKETS) + 1))
+        self._totals: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+    def observe(self, route: str, method: str, duration: float, metrics: RequestMetrics) -> None:
+        key = (route, method)
+
+        with self._lock:
+            self._buckets[key][bisect_left(DURATION_BUCKETS, duration)] += 1
+
+            totals = self._totals[key]
+            totals['duration'] += duration
+            totals['db_queries'] += metrics.db_queries
+            totals['db'] += metrics.db_time
+            for phase, seconds in metrics.phase_times.items():
+                totals[phase] += seconds
+
+    def render(self) -> str:
+        with self._lock:
+            buckets = {key: list(counts) for key, counts in self._buckets.items()}
+            totals = {key: dict(values) for key, values in self._totals.items()}
+
+        lines = [
+            '# HELP http_request_duration_seconds Request wall time by route.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+
+        for (route, method), counts in sorted(buckets.items()):
+            labels = 'route="{}",method="{}"'.format(route, method)
+            cumulative = 0
+
+            for bound, count in zip([*DURATION_BUCKETS, '+Inf'], counts):
+                cumulative += count
+                lines.append('http_request_duration_seconds_bucket{{{},le="{}"}} {}'.format(labels, bound, cumulative))
+
+            lines.append('http_request_duration_seconds_sum{{{}}} {}'.format(labels, totals[route, method]['duration']))
+            lines.append('http_request_duration_seconds_count{{{}}} {}'.format(labels, cumulative))
+
+        for name, total, description in [
+            ('http_request_db_queries_total', 'db_queries', 'Database queries by route.'),
+            ('http_request_db_seconds_total', 'db', 'Time spent in the database by route.'),
+            *[
+                ('http_request_{}_seconds_total'.format(phase), phase, 'Time spent in {} by route.'.format(phase))
+                for phase in PHASES
+            ],
+        ]:
+            lines.append('# HELP {} {}'.format(name, description))
+            lines.append('# TYPE {} counter'.format(name))
+
+            for (route, method), values in sorted(totals.items()):
+                lines.append('{}{{route="{}",method="{}"}} {}'.format(name, route, method, values[total]))
+
+        return '\n'.join(lines) + '\n'
+
+
+route_histograms = RouteHistograms()
+
+
+def _route(request: HttpRequest) -> Optional[str]:
+    # The url name, like receivers-random-compliment for the viewset action
+    resolver_match = getattr(request, 'resolver_match', None)
+
+    return resolver_match.url_name or resolver_match.view_name if resolver_match else None
+
+
+def _method(request: HttpRequest) -> str:
+    return request.method if request.method in METHODS else 'OTHER'
+
+
+def _finish(request: HttpRequest, response: HttpResponse, metrics: RequestMetrics, start: float) -> HttpResponse:
+    duration = time.perf_counter() - start
+    route = _route(request)
+
+    response['Server-Timing'] = metrics.server_timing(duration)
+
+    # Requests that matched no route, mostly 404s for arbitrary paths, would all share one label that says nothing
+    if route is not None:
+        route_histograms.observe(route, _method(request), duration, metrics)
+
+    return response
+
+
+@sync_and_async_middleware
+def request_metrics_middleware(get_response: Callable) -> Callable:
+    """
+    Adds a Server-Timing header with the request's wall, database, serialization and auth time, and records them in
+    the route histograms behind /metrics. Streamed response bodies are sent after this and aren't counted.
+    """
+    if not settings.REQUEST_METRICS:
+        return get_response
+
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request: HttpRequest) -> HttpResponse:
+            metrics = RequestMetrics()
+            token = _request_metrics.set(metrics)
+            start = time.perf_counter()
+
+            try:
+                return _finish(request, await get_response(request), metrics, start)
+            finally:
+                _request_metrics.reset(token)
+    else:
+        def middleware(request: HttpRequest) -> HttpResponse:
+            metrics = RequestMetrics()
+            token = _request_metrics.set(metrics)
+            start = time.perf_counter()
+
+            try:
+                return _finish(request, get_response(request), metrics, start)
+            finally:
+                _request_metrics.reset(token)
+
+    return middleware
+
+
+def metrics(request: HttpRequest) -> HttpResponse:
+    """
+    The route histograms in the Prometheus text format, for requests with METRICS_TOKEN as a bearer token. Not served
+    at all without a METRICS_TOKEN.
+    """
+    if not settings.METRICS_TOKEN:
+        return HttpResponse(status=404)
+
+    if not constant_time_compare(
+        request.META.get('HTTP_AUTHORIZATION', ''), 'Bearer {}'.format(settings.METRICS_TOKEN)
+    ):
+        return HttpResponse(status=401)
+
+    return HttpResponse(route_histograms.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import clear_url_caches
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from complimentapi.benchmarking import benchmark_database, seed_receiver, summarize
+from complimentapi.models import User
+
+
+class Command(BaseCommand):
+    help = 'Compare req/s and latency of the sync DRF viewsets under WSGI with the native async views under ASGI.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per endpoint and mode')
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--compliments', type=int, default=100)
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        results = []
+
+        with benchmark_database():
+            user = User.objects.create(email='benchmark@example.com')
+            receiver = seed_receiver(user, options['compliments'])
+            authorization = 'Bearer {}'.format(RefreshToken.for_user(user).access_token)
+
+            paths = [
+                '/receivers',
+                '/receivers/{}'.format(receiver.id),
+                '/receivers/{}/compliments'.format(receiver.id),
+                '/receivers/{}/random-compliment'.format(receiver.id),
+            ]
+
+            for path in paths:
+                for mode, urlconf, run in [
+                    ('wsgi', 'complimentapi.urls', self.run_wsgi),
+                    ('asgi', 'complimentapi.async_urls', self.run_asgi),
+                ]:
+                    with override_settings(ROOT_URLCONF=urlconf):
+                        clear_url_caches()
+                        elapsed, samples = run(path, authorization, options['requests'], options['concurrency'])
+
+                    results.append({
+                        'path': path, 'mode': mode, 'requests_per_second': round(len(samples) / elapsed, 1),
+                        **summarize(samples)
+                    })
+
+        clear_url_caches()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        row = '{:<40} {:>5} {:>10} {:>10} {:>10}'
+        self.stdout.write(row.format('path', 'mode', 'req/s', 'p50_ms', 'p99_ms'))
+        for result in results:
+            self.stdout.write(row.format(
+                result['path'], result['mode'], result['requests_per_second'], result['p50_ms'], result['p99_ms']
+            ))
+
+    def run_wsgi(self, path: str, authorization: str, requests: int, concurrency: int) -> Tuple[float, List[float]]:
+        def worker(count: int) -> List[float]:
+            client = Client(HTTP_AUTHORIZATION=authorization)
+            samples = []
+
+            for _ in range(count):
+                start = time.perf_counter()
+                client.get(path)
+                samples.append((time.perf_counter() - start) * 1000)
+
+            connections.close_all()
+            return samples
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            samples = sum(executor.map(worker, [requests // concurrency] * concurrency), [])
+
+        return time.perf_counter() - start, samples
+
+    def run_asgi(self, path: str, authorization: str, requests: int, concurrency: int) -> Tuple[float, List[float]]:
+        async def worker(count: int) -> List[float]:
+            client = AsyncClient()
+            samples = []
+
+            for _ in range(count):
+                start = time.perf_counter()
+                await client.get(path, AUTHORIZATION=authorization)
+                samples.append((time.perf_counter() - start) * 1000)
+
+            return samples
+
+        async def run_all() -> List[float]:
+            return sum(await asyncio.gather(*[worker(requests // concurrency) for _ in range(concurrency)]), [])
+
+        start = time.perf_counter()
+        samples = asyncio.run(run_all())
+
+        return time.perf_counter() - start, samples
@@ -0,0 +1,325 @@
+import itertools
+import json
+import statistics
+import threading
+import time
+from collections import Counter
+from typing import Callable, List, Optional, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import Client, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from complimentapi.benchmarking import benchmark_database, capture_queries, seed_receiver, summarize
+from complimentapi.models import User, Receiver
+
+# Bodies for the import endpoint, one compliment per line
+BULK_IMPORT_ROWS = 100
+# Ids per request to the bulk delete endpoints
+BULK_DELETE_IDS = 10
+# Run from concurrent clients in rotation mode, whose throughput should scale with the workers
+ROTATION_ENDPOINT = 'GET /receivers/{id}/random-compliment'
+
+
+class Command(BaseCommand):
+    help = 'Measure latency percentiles and query counts of every API endpoint on seeded fixtures.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[10, 1000, 100000],
+            help='Compliment counts of the receivers the per-receiver endpoints run against'
+        )
+        parser.add_argument('--users', type=int, default=100, help='Other users seeded alongside the benchmark user')
+        parser.add_argument('--iterations', type=int, default=50, help='Requests per endpoint, a tenth for exports')
+        parser.add_argument('--endpoints', nargs='+', help='Only run endpoints whose name contains one of these')
+        parser.add_argument(
+            '--workers', type=int, nargs='+', default=[1, 2, 4, 8],
+            help='Concurrent clients of the rotation throughput runs'
+        )
+        parser.add_argument(
+            '--throughput-requests', type=int, default=500, help='Requests per throughput run, split across the workers'
+        )
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        results = []
+
+        with benchmark_database():
+            # Everyone else's rows make owner filters do real work
+            for index in range(options['users']):
+                other = User.objects.create(email='user{}@example.com'.format(index))
+                for size in (10, 100):
+                    seed_receiver(other, size)
+
+            user = User.objects.create(email='benchmark@example.com')
+            receivers = [seed_receiver(user, size) for size in options['sizes']]
+            client = Client(HTTP_AUTHORIZATION='Bearer {}'.format(RefreshToken.for_user(user).access_token))
+
+            for name, size, request, iterations in self.endpoints(client, user, receivers, options['iterations']):
+                if options['endpoints'] and not any(part in name for part in options['endpoints']):
+                    continue
+
+                results.append({'endpoint': name, 'size': size, **self.measure(request, iterations)})
+
+                if not options['json']:
+                    self.stderr.write('{} {}'.format(name, size or ''))
+
+            throughput = []
+            workers_runs = options['workers']
+
+            if not connection.features.has_select_for_update_skip_locked:
+                # Concurrent writers fail with "database table is locked" on SQLite rather than waiting
+                self.stderr.write('{} does not support SKIP LOCKED, running a single worker'.format(connection.vendor))
+                workers_runs = [1]
+
+            if not options['endpoints'] or any(part in ROTATION_ENDPOINT for part in options['endpoints']):
+                for workers in workers_runs:
+                    throughput.append(self.throughput(user, workers, options['throughput_requests']))
+
+        if options['json']:
+            self.stdout.write(json.dumps(results + throughput, indent=2))
+            return
+
+        row = '{:<45} {:>7} {:>10} {:>10} {:>10} {:>10} {:>8}  {}'
+        self.stdout.write(row.format(
+            'endpoint', 'size', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'queries', 'statuses'
+        ))
+        for result in results:
+            statuses = ' '.join('{}x{}'.format(*item) for item in result['statuses'].items())
+            self.stdout.write(row.format(
+                result['endpoint'], result['size'] or '-', result['mean_ms'], result['p50_ms'], result['p95_ms'],
+                result['p99_ms'], result['queries'], statuses
+            ))
+
+        if throughput:
+            row = '{:<50} {:>7} {:>10} {:>12} {:>10}'
+            self.stdout.write('')
+            self.stdout.write(row.format('endpoint', 'workers', 'requests', 'requests/s', 'duplicates'))
+            for result in throughput:
+                self.stdout.write(row.format(
+                    result['endpoint'], result['workers'], result['requests'], result['requests_per_s'],
+                    result['duplicates']
+                ))
+
+    def endpoints(
+        self, client: Client, user: User, receivers: List[Receiver], iterations: int
+    ) -> List[Tuple[str, Optional[int], Callable[[], HttpResponse], int]]:
+        """
+        (name, receiver size, request, iterations) for every route in complimentapi.urls. Skips the OAuth callback,
+        which can't complete without Google.
+        """
+        export_iterations = max(1, iterations // 10)
+        # Creations with a text the receiver already has only look up the existing row, so every request's are new
+        unique = itertools.count()
+
+        def bulk_body() -> str:
+            return ''.join(
+                '{{"text": "Imported compliment {}"}}\n'.format(next(unique)) for _ in range(BULK_IMPORT_ROWS)
+            )
+
+        # Deletes need a fresh row every iteration
+        deletable_receivers = [seed_receiver(user, 10).id for _ in range(iterations)]
+        bulk_deletable_receivers = [seed_receiver(user, 10).id for _ in range(iterations * BULK_DELETE_IDS)]
+
+        endpoints = [
+            ('GET /auth/login', None, lambda: client.get('/auth/login'), iterations),
+            ('GET /auth/me', None, lambda: client.get('/auth/me'), iterations),
+            ('GET /receivers', None, lambda: client.get('/receivers'), iterations),
+            (
+                'POST /receivers', None,
+                lambda: client.post('/receivers', {'name': 'Benchmark'}, content_type='application/json'), iterations
+            ),
+            (
+                'DELETE /receivers/{id}', None,
+                lambda: client.delete('/receivers/{}'.format(deletable_receivers.pop())), iterations
+            ),
+            (
+                'DELETE /receivers/bulk', None,
+                lambda: client.delete('/receivers/bulk', {
+                    'ids': [bulk_deletable_receivers.pop() for _ in range(BULK_DELETE_IDS)]
+                }, content_type='application/json'),
+                iterations
+            ),
+            ('GET /receivers/random-digest', None, lambda: client.get('/receivers/random-digest'), iterations),
+            # A typical client burst: a receiver, a few compliments and a random one of them
+            (
+                'POST /batch', None,
+                lambda: client.post('/batch', {'operations': [
+                    {'method': 'POST', 'path': '/receivers', 'body': {'name': 'Batched'}},
+                    *[
+                        {
+                            'method': 'POST', 'path': '/receivers/{{0.id}}/compliments',
+                            'body': {'text': 'Batched {}'.format(next(unique))}
+                        }
+                        for _ in range(5)
+                    ],
+                    {'method': 'GET', 'path': '/receivers/{{0.id}}/random-compliment'},
+                ]}, content_type='application/json'),
+                iterations
+            ),
+            ('GET /receivers/export', None, lambda: client.get('/receivers/export'), export_iterations),
+            # Seeded texts are "Compliment number <i>", so every compliment has the first term and few have the second
+            ('GET /compliments/search?q=<rare>', None, lambda: client.get('/compliments/search?q=77'), iterations),
+            (
+                'GET /compliments/search?q=<common>', None, lambda: client.get('/compliments/search?q=compliment'),
+                export_iterations
+            ),
+            (
+                'GET /receivers/export?type=csv', None, lambda: client.get('/receivers/export?type=csv'),
+                export_iterations
+            ),
+        ]
+
+        for receiver in receivers:
+            size = receiver.compliments.count()
+            path = '/receivers/{}'.format(receiver.id)
+            compliment_path = '{}/compliments/{}'.format(path, receiver.compliments.first().id)
+            deletable_compliments = list(receiver.compliments.values_list('id', flat=True)[1:iterations + 1])
+            bulk_deletable_compliments = list(receiver.compliments.values_list('id', flat=True)[
+                iterations + 1:iterations + 1 + iterations * BULK_DELETE_IDS
+            ])
+            bulk_deletes = [
+                bulk_deletable_compliments[index:index + BULK_DELETE_IDS]
+                for index in range(0, len(bulk_deletable_compliments), BULK_DELETE_IDS)
+            ]
+
+            def delete_compliment(path=path, deletable_compliments=deletable_compliments) -> HttpResponse:
+                return client.delete('{}/compliments/{}'.format(path, deletable_compliments.pop()))
+
+            def bulk_delete_compliments(path=path, bulk_deletes=bulk_deletes) -> HttpResponse:
+                return client.delete(
+                    path + '/compliments/bulk', {'ids': bulk_deletes.pop()}, content_type='application/json'
+                )
+
+            endpoints += [
+                ('GET /receivers/{id}', size, lambda path=path: client.get(path), iterations),
+                (
+                    'PATCH /receivers/{id}', size,
+                    lambda path=path: client.patch(path, {'name': 'Renamed'}, content_type='application/json'),
+                    iterations
+                ),
+                (
+                    'GET /receivers/{id}/random-compliment', size,
+                    lambda path=path: client.get(path + '/random-compliment'), iterations
+                ),
+                (
+                    'GET /receivers/{id}/random-compliment-list', size,
+                    lambda path=path: client.get(path + '/random-compliment-list?number=5'), iterations
+                ),
+                ('GET /receivers/{id}/stats', size, lambda path=path: client.get(path + '/stats'), iterations),
+                (
+                    'GET /receivers/{id}/compliments', size,
+                    lambda path=path: client.get(path + '/compliments'), iterations
+                ),
+                (
+                    'POST /receivers/{id}/compliments', size,
+                    lambda path=path: client.post(
+                        path + '/compliments', {'text': 'Benchmark {}'.format(next(unique))},
+                        content_type='application/json'
+                    ),
+                    iterations
+                ),
+                (
+                    'POST /receivers/{id}/compliments/bulk', size,
+                    lambda path=path: client.post(
+                        path + '/compliments/bulk', bulk_body(), content_type='application/x-ndjson'
+                    ),
+                    export_iterations
+                ),
+                (
+                    'GET /receivers/{id}/compliments/{id}', size,
+                    lambda compliment_path=compliment_path: client.get(compliment_path), iterations
+                ),
+                (
+                    'PATCH /receivers/{id}/compliments/{id}', size,
+                    lambda compliment_path=compliment_path: client.patch(
+                        compliment_path, {'text': 'Edited'}, content_type='application/json'
+                    ),
+                    iterations
+                ),
+                ('DELETE /receivers/{id}/compliments/{id}', size, delete_compliment, len(deletable_compliments)),
+            ]
+
+            # Small receivers have no compliments left over for it
+            if bulk_deletes:
+                endpoints.append(
+                    ('DELETE /receivers/{id}/compliments/bulk', size, bulk_delete_compliments, len(bulk_deletes))
+                )
+
+        return endpoints
+
+    def throughput(self, user: User, workers: int, requests: int) -> dict:
+        """
+        Requests per second of ROTATION_ENDPOINT from `workers` concurrent clients, each with a connection of its own,
+        and how many compliments were handed out more than once. The receiver has one compliment per request, so a
+        full rotation hands out each exactly once.
+        """
+        receiver = seed_receiver(user, requests)
+        token = RefreshToken.for_user(user).access_token
+        path = '/receivers/{}/random-compliment'.format(receiver.id)
+        handed_out = []
+        errors = []
+
+        def rotate(count: int):
+            client = Client(HTTP_AUTHORIZATION='Bearer {}'.format(token))
+
+            try:
+                for _ in range(count):
+                    response = client.get(path)
+                    if response.status_code != 200:
+                        raise CommandError('{} answered {}'.format(ROTATION_ENDPOINT, response.status_code))
+
+                    handed_out.append(response.json()['id'])
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=rotate, args=(requests // workers,)) for _ in range(workers)]
+
+        with override_settings(COMPLIMENT_SELECTION_MODE='rotation'):
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+
+        if errors:
+            raise CommandError(str(errors[0]))
+
+        return {
+            'endpoint': ROTATION_ENDPOINT + ' (rotation)',
+            'size': requests,
+            'workers': workers,
+            'requests': len(handed_out),
+            'requests_per_s': round(len(handed_out) / elapsed, 1),
+            'duplicates': len(handed_out) - len(set(handed_out)),
+        }
+
+    def measure(self, request: Callable[[], HttpResponse], iterations: int) -> dict:
+        samples = []
+        query_counts = []
+        statuses = Counter()
+
+        for _ in range(iterations):
+            with capture_queries() as captured:
+                start = time.perf_counter()
+                response = request()
+
+                # Streamed responses only run their queries while they are read
+                if response.streaming:
+                    b''.join(response.streaming_content)
+
+                samples.append((time.perf_counter() - start) * 1000)
+
+            query_counts.append(len(captured))
+            statuses[response.status_code] += 1
+
+        return {
+            **summarize(samples),
+            'queries': round(statistics.fmean(query_counts), 1),
+            'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        }
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from complimentapi.benchmarking import benchmark_database, seed_receiver, summarize, time_calls
+from complimentapi.models import User
+
+
+class Command(BaseCommand):
+    help = 'Measure Receiver.get_random_compliment latency for receivers of increasing size.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000, 100000])
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            user = User.objects.create(email='benchmark@example.com')
+
+            row = '{:>10} {:>10} {:>10} {:>10} {:>10}'
+            self.stdout.write(row.format('size', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms'))
+
+            for size in options['sizes']:
+                receiver = seed_receiver(user, size)
+                stats = summarize(time_calls(receiver.get_random_compliment, options['iterations']))
+
+                self.stdout.write(row.format(size, *stats.values()))
@@ -0,0 +1,61 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from complimentapi.benchmarking import benchmark_database, seed_receiver
+from complimentapi.models import User
+
+
+class Command(BaseCommand):
+    help = 'Call Receiver.rotate_compliments from concurrent threads and check no compliment is handed out twice.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+        parser.add_argument('--requests', type=int, default=500, help='Rotations per run, split across the workers')
+
+    def handle(self, *args, **options):
+        workers_runs = options['workers']
+
+        if not connection.features.has_select_for_update_skip_locked:
+            # Concurrent writers fail with "database table is locked" on SQLite rather than waiting
+            self.stderr.write('{} does not support SKIP LOCKED, running a single worker'.format(connection.vendor))
+            workers_runs = [1]
+
+        with benchmark_database():
+            user = User.objects.create(email='benchmark@example.com')
+
+            self.stdout.write('{:>8} {:>10} {:>12} {:>11}'.format('workers', 'requests', 'requests/s', 'duplicates'))
+
+            for workers in workers_runs:
+                # One full rotation per run, so every compliment should be handed out exactly once
+                receiver = seed_receiver(user, options['requests'])
+                handed_out = []
+                errors = []
+
+                def rotate(count: int):
+                    try:
+                        for _ in range(count):
+                            handed_out.extend(compliment.id for compliment in receiver.rotate_compliments(1))
+                    except Exception as e:
+                        errors.append(e)
+                    finally:
+                        connections.close_all()
+
+                per_worker = options['requests'] // workers
+                threads = [threading.Thread(target=rotate, args=(per_worker,)) for _ in range(workers)]
+
+                start = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - start
+
+                if errors:
+                    raise CommandError(str(errors[0]))
+
+                self.stdout.write('{:>8} {:>10} {:>12.1f} {:>11}'.format(
+                    workers, len(handed_out), len(handed_out) / elapsed, len(handed_out) - len(set(handed_out))
+                ))
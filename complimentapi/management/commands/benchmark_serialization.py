@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from complimentapi.benchmarking import benchmark_database, seed_receiver, summarize, time_calls
+from complimentapi.models import User
+from complimentapi.renderers import FastJSONRenderer
+from complimentapi.serializers import ComplimentSerializer, get_values_serializer
+
+
+class Command(BaseCommand):
+    help = 'Compare ComplimentSerializer + JSONRenderer with the ValuesSerializer + FastJSONRenderer fast path.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=10000)
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            user = User.objects.create(email='benchmark@example.com')
+            queryset = seed_receiver(user, options['size']).compliments.order_by('id')
+            values_serializer = get_values_serializer(ComplimentSerializer)
+
+            def drf():
+                return JSONRenderer().render(ComplimentSerializer(queryset.all(), many=True).data)
+
+            def fast():
+                rows = values_serializer.values(queryset)
+                return FastJSONRenderer().render(values_serializer.to_representation(rows))
+
+            if drf() != fast():
+                raise CommandError('Fast path output differs from ComplimentSerializer + JSONRenderer')
+
+            row = '{:>10} {:>10} {:>10} {:>10} {:>10}'
+            self.stdout.write(row.format('path', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms'))
+
+            for name, func in [('drf', drf), ('fast', fast)]:
+                self.stdout.write(row.format(name, *summarize(time_calls(func, options['iterations'])).values()))
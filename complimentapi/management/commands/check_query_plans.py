@@ -0,0 +1,171 @@
+import json
+from typing import Callable, List, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.http import HttpResponse
+from django.test import Client, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from complimentapi.benchmarking import benchmark_database, capture_queries, seed_receiver
+from complimentapi.models import User
+
+# Statements worth explaining, inserts and savepoints have no access path to check
+EXPLAINED_STATEMENTS = ('SELECT', 'UPDATE', 'DELETE')
+
+
+def plan_problems(vendor: str, plan) -> List[str]:
+    """
+    Sequential scans and sorts in an EXPLAIN result, for PostgreSQL's JSON format and SQLite's query plan rows.
+    """
+    if vendor == 'postgresql':
+        problems = []
+        nodes = [entry['Plan'] for entry in (json.loads(plan[0][0]) if isinstance(plan[0][0], str) else plan[0][0])]
+
+        while nodes:
+            node = nodes.pop()
+            if node['Node Type'] in ('Seq Scan', 'Sort', 'Incremental Sort'):
+                problems.append(' '.join(filter(None, [node['Node Type'], node.get('Relation Name')])))
+            nodes.extend(node.get('Plans', []))
+
+        return problems
+
+    if vendor == 'sqlite':
+        # SCAN of a subquery's rows is fine, full scans of a table are not
+        return [
+            row[-1] for row in plan
+            if row[-1].startswith('SCAN complimentapi_') or row[-1].startswith('USE TEMP B-TREE')
+        ]
+
+    raise CommandError('Query plans can\'t be checked on {}'.format(vendor))
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN every query behind the hot endpoints and fail if any of them scans a whole table or sorts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=2000, help='Compliments per seeded receiver')
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            problems = self.check_plans(options['size'], options['verbosity'])
+
+        if problems:
+            raise CommandError('Query plans regressed:\n' + '\n'.join(problems))
+
+        self.stdout.write('All query plans use indexes.')
+
+    def check_plans(self, size: int, verbosity: int = 1) -> List[str]:
+        """
+        Seeds receivers of `size` compliments into the current database and returns the plan problems of the hot
+        endpoints' queries, printing the offending queries, or every query with a verbosity above 1.
+        """
+        user = User.objects.create(email='benchmark@example.com')
+        receiver = seed_receiver(user, size)
+        seed_receiver(user, 10)
+        # Another user's rows, so filtering by owner actually has to rule something out
+        seed_receiver(User.objects.create(email='other@example.com'), size)
+        compliment = receiver.compliments.last()
+        # One per pass, a deleted compliment would just 404 the second time
+        deletable_ids = list(receiver.compliments.values_list('id', flat=True)[:2])
+
+        client = Client(HTTP_AUTHORIZATION='Bearer {}'.format(RefreshToken.for_user(user).access_token))
+
+        def second_page(path: str) -> Callable[[], HttpResponse]:
+            return lambda: client.get(client.get(path).json()['next'])
+
+        # (name, request, whether sorting is expected)
+        hot_paths: List[Tuple[str, Callable[[], HttpResponse], bool]] = [
+            ('receiver list', lambda: client.get('/receivers?page_size=1'), False),
+            ('receiver list, next page', second_page('/receivers?page_size=1'), False),
+            ('receiver detail', lambda: client.get('/receivers/{}'.format(receiver.id)), False),
+            ('compliment list', lambda: client.get('/receivers/{}/compliments'.format(receiver.id)), False),
+            (
+                'compliment list, next page',
+                second_page('/receivers/{}/compliments'.format(receiver.id)),
+                False
+            ),
+            (
+                'compliment detail',
+                lambda: client.get('/receivers/{}/compliments/{}'.format(receiver.id, compliment.id)),
+                False
+            ),
+            ('random compliment', lambda: client.get('/receivers/{}/random-compliment'.format(receiver.id)), False),
+            (
+                'random compliment list',
+                lambda: client.get('/receivers/{}/random-compliment-list?number=5'.format(receiver.id)),
+                False
+            ),
+            # Buckets are grouped, after the random compliments above counted some
+            ('stats', lambda: client.get('/receivers/{}/stats'.format(receiver.id)), True),
+            # Rows for several receivers at once come back sorted by receiver
+            ('random digest', lambda: client.get('/receivers/random-digest'), True),
+            ('export', lambda: client.get('/receivers/export'), False),
+            # Matches are ranked by score, which no index can provide
+            ('search', lambda: client.get('/compliments/search?q=compliment number 77'), True),
+            (
+                'compliment delete',
+                lambda: client.delete('/receivers/{}/compliments/{}'.format(receiver.id, deletable_ids.pop())),
+                False
+            ),
+        ]
+
+        problems = []
+
+        for uncached in (False, True):
+            # Receivers too large for a sampling table are sampled from the database
+            with override_settings(RETRIEVAL_FLUSH_INTERVAL=0, SAMPLING_TABLE_MAX_SIZE=0 if uncached else 50000):
+                for name, request, sorts in hot_paths:
+                    if uncached:
+                        name += ', uncached'
+
+                    for alias, sql, plan_problems_found in self.explain(request, sorts):
+                        if plan_problems_found or verbosity > 1:
+                            self.stdout.write('{} [{}]: {}'.format(name, alias, sql))
+
+                        for problem in plan_problems_found:
+                            self.stdout.write('    ' + problem)
+                            problems.append('{}: {}'.format(name, problem))
+
+        return problems
+
+    def explain(self, request: Callable[[], HttpResponse], sorts: bool) -> List[Tuple[str, str, List[str]]]:
+        caches[settings.SAMPLING_TABLE_CACHE].clear()
+
+        with capture_queries() as captured:
+            response = request()
+
+            # Streamed responses only run their queries while they are read
+            if response.streaming:
+                b''.join(response.streaming_content)
+
+        results = []
+
+        for alias, sql, params in captured:
+            if not sql.lstrip().upper().startswith(EXPLAINED_STATEMENTS):
+                continue
+
+            connection = connections[alias]
+
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    # Only an access path that can't use an index still scans or sorts with these off
+                    cursor.execute('SET enable_seqscan = off; SET enable_sort = off')
+                    cursor.execute(connection.ops.explain_query_prefix(format='json') + ' ' + sql, params)
+                    plan = cursor.fetchall()
+                    # The connection outlives the check when it runs in a test
+                    cursor.execute('RESET enable_seqscan; RESET enable_sort')
+                else:
+                    cursor.execute(connection.ops.explain_query_prefix() + ' ' + sql, params)
+                    plan = cursor.fetchall()
+
+                problems = plan_problems(connection.vendor, plan)
+
+            if sorts:
+                problems = [problem for problem in problems if 'Sort' not in problem and 'B-TREE' not in problem]
+
+            results.append((alias, sql, problems))
+
+        return results
@@ -0,0 +1,87 @@
+from typing import Callable, List
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpResponse
+from django.test import Client, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from complimentapi.benchmarking import benchmark_database, capture_cache_calls, capture_queries, seed_receiver
+from complimentapi.models import User
+
+# Requests a bucket lets through before throttling, for every route checked
+LIMIT = 3
+
+
+class Command(BaseCommand):
+    help = 'Exhaust token buckets and check that a throttled request costs one cache round trip and no queries.'
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            problems = self.check_routes()
+
+        if problems:
+            raise CommandError('Throttling regressed:\n' + '\n'.join(problems))
+
+        self.stdout.write('Throttled requests cost one cache round trip and no queries.')
+
+    def check_routes(self) -> List[str]:
+        """
+        Exhausts the buckets of a few routes, per user and per IP, in the current database and returns what's wrong
+        with their throttling.
+        """
+        user = User.objects.create(email='benchmark@example.com')
+        receiver = seed_receiver(user, 10)
+        client = Client(HTTP_AUTHORIZATION='Bearer {}'.format(RefreshToken.for_user(user).access_token))
+        anonymous = Client(REMOTE_ADDR='192.0.2.1')
+
+        # (route name, request), per user and per IP
+        routes = [
+            (
+                'receivers-random-compliment-list',
+                lambda: client.get('/receivers/{}/random-compliment-list'.format(receiver.id))
+            ),
+            ('compliments-list', lambda: client.get('/receivers/{}/compliments'.format(receiver.id))),
+            ('auth-login', lambda: anonymous.get('/auth/login')),
+            ('auth-oauth-callback', lambda: anonymous.get('/auth/oauth_callback')),
+        ]
+
+        problems = []
+
+        for route, request in routes:
+            # The benchmark user's id is reused by every run, and the cache may be a shared one
+            for client_key in ('user:{}'.format(user.id), 'ip:192.0.2.1'):
+                caches[settings.THROTTLE_CACHE].delete('throttle:{}:{}'.format(route, client_key))
+
+            with override_settings(THROTTLE_RATES={route: '{}/min'.format(LIMIT)}):
+                problems += ['{}: {}'.format(route, problem) for problem in self.check_route(request)]
+
+        return problems
+
+    def check_route(self, request: Callable[[], HttpResponse]) -> List[str]:
+        problems = []
+
+        for remaining in reversed(range(LIMIT)):
+            response = request()
+
+            if response.status_code == 429:
+                problems.append('throttled with {} tokens left'.format(remaining + 1))
+            elif response.get('X-RateLimit-Remaining') != str(remaining):
+                problems.append('X-RateLimit-Remaining {}, expected {}'.format(
+                    response.get('X-RateLimit-Remaining'), remaining
+                ))
+
+        with capture_queries() as queries, capture_cache_calls(settings.THROTTLE_CACHE) as cache_calls:
+            response = request()
+
+        if response.status_code != 429:
+            problems.append('not throttled once the bucket was empty, got {}'.format(response.status_code))
+        if not response.get('Retry-After') or response.get('X-RateLimit-Limit') != str(LIMIT):
+            problems.append('missing Retry-After or X-RateLimit headers')
+        if len(cache_calls) > 1:
+            problems.append('{} cache round trips: {}'.format(len(cache_calls), ', '.join(cache_calls)))
+        if queries:
+            problems.append('{} queries'.format(len(queries)))
+
+        return problems
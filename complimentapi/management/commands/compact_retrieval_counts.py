@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from complimentapi.retrievals import compact_retrieval_counts
+
+
+class Command(BaseCommand):
+    help = 'Merge old hourly retrieval counts into daily ones and drop daily ones past retention. Run it daily.'
+
+    def handle(self, *args, **options):
+        compacted, dropped = compact_retrieval_counts()
+
+        self.stdout.write('Merged {} hourly buckets into daily ones, dropped {} expired daily buckets.'.format(
+            compacted, dropped
+        ))
@@ -0,0 +1,23 @@
+# Generated by Django 4.1 on 2026-10-18 09:16
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complimentapi', '0004_compliment_last_retrieved_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='compliment',
+            name='last_retrieved_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='compliment',
+            index=models.Index(fields=['receiver', 'last_retrieved_at', 'id'], name='compliment_rotation_idx'),
+        ),
+    ]
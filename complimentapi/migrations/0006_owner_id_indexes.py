@@ -0,0 +1,21 @@
+# Generated by Django 4.1 on 2026-10-18 09:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complimentapi', '0005_compliment_rotation_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='compliment',
+            index=models.Index(fields=['receiver', 'id'], name='compliment_receiver_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receiver',
+            index=models.Index(fields=['user', 'id'], name='receiver_user_id_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.1 on 2026-10-18 09:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complimentapi', '0006_owner_id_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='compliment',
+            name='receiver',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='compliments', to='complimentapi.receiver'),
+        ),
+        migrations.AlterField(
+            model_name='receiver',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='receivers', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.1 on 2026-10-18 09:42
+
+import re
+import unicodedata
+from collections import Counter
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# complimentapi.search.tokenize as of this migration, so later changes to it don't change what migrating does
+TERM_PATTERN = re.compile(r'\w+')
+TERM_MAX_LENGTH = 64
+
+
+def tokenize(text: str) -> Counter:
+    return Counter(
+        term[:TERM_MAX_LENGTH] for term in TERM_PATTERN.findall(unicodedata.normalize('NFKC', text).casefold())
+        if len(term) > 1
+    )
+
+
+def index_existing_compliments(apps, schema_editor):
+    Compliment = apps.get_model('complimentapi', 'Compliment')
+    ComplimentTerm = apps.get_model('complimentapi', 'ComplimentTerm')
+    database = schema_editor.connection.alias
+
+    rows = Compliment.objects.using(database).values_list('id', 'receiver__user_id', 'text').iterator(chunk_size=2000)
+    postings = []
+
+    for compliment_id, user_id, text in rows:
+        postings.extend(
+            ComplimentTerm(user_id=user_id, term=term, compliment_id=compliment_id, count=count)
+            for term, count in tokenize(text).items()
+        )
+
+        if len(postings) >= 5000:
+            ComplimentTerm.objects.using(database).bulk_create(postings)
+            postings = []
+
+    ComplimentTerm.objects.using(database).bulk_create(postings)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complimentapi', '0007_drop_redundant_fk_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComplimentTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('count', models.PositiveSmallIntegerField()),
+                ('compliment', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='complimentapi.compliment')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='complimentterm',
+            index=models.Index(fields=['compliment'], name='compliment_term_compliment_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='complimentterm',
+            constraint=models.UniqueConstraint(fields=('user', 'term', 'compliment'), name='compliment_term_postings'),
+        ),
+        migrations.RunPython(index_existing_compliments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.1 on 2026-10-18 09:46
+
+import hashlib
+import unicodedata
+
+from django.db import migrations, models
+
+
+# complimentapi.models.compliment_text_hash as of this migration, so later changes to it don't change what migrating
+# does
+def compliment_text_hash(text: str) -> str:
+    normalized = ' '.join(unicodedata.normalize('NFKC', text).casefold().split())
+
+    return hashlib.blake2b(normalized.encode(), digest_size=16).hexdigest()
+
+
+def hash_existing_compliments(apps, schema_editor):
+    Compliment = apps.get_model('complimentapi', 'Compliment')
+    database = schema_editor.connection.alias
+
+    # The oldest copy of a duplicate gets the hash, later copies keep NULL, which the unique constraint allows
+    rows = Compliment.objects.using(database).order_by('id').values_list('id', 'receiver_id', 'text')
+    seen = set()
+    hashed = []
+
+    for compliment_id, receiver_id, text in rows.iterator(chunk_size=2000):
+        text_hash = compliment_text_hash(text)
+        if (receiver_id, text_hash) in seen:
+            continue
+
+        seen.add((receiver_id, text_hash))
+        hashed.append(Compliment(id=compliment_id, text_hash=text_hash))
+
+        if len(hashed) >= 5000:
+            Compliment.objects.using(database).bulk_update(hashed, ['text_hash'])
+            hashed = []
+
+    Compliment.objects.using(database).bulk_update(hashed, ['text_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complimentapi', '0008_compliment_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='compliment',
+            name='text_hash',
+            field=models.CharField(editable=False, max_length=32, null=True),
+        ),
+        migrations.RunPython(hash_existing_compliments, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='compliment',
+            constraint=models.UniqueConstraint(fields=('receiver', 'text_hash'), name='compliment_receiver_text_hash'),
+        ),
+    ]
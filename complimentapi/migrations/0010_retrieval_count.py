@@ -0,0 +1,37 @@
+# Generated by Django 4.1 on 2026-10-18 09:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complimentapi', '0009_compliment_text_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RetrievalCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('starts_at', models.DateTimeField()),
+                ('count', models.PositiveIntegerField()),
+                ('compliment', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='retrieval_counts', to='complimentapi.compliment')),
+                ('receiver', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='complimentapi.receiver')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='retrievalcount',
+            index=models.Index(fields=['receiver', 'starts_at'], name='retrieval_count_receiver_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='retrievalcount',
+            index=models.Index(fields=['period', 'starts_at'], name='retrieval_count_period_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='retrievalcount',
+            constraint=models.UniqueConstraint(fields=('compliment', 'period', 'starts_at'), name='retrieval_count_bucket'),
+        ),
+    ]
@@ -1,7 +1,21 @@
-import random
-import datetime
-from typing import List
-from django.db import models
+import hashlib
+import unicodedata
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from django.conf import settings
+from django.db import connections, models, router, transaction
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from complimentapi.sampling import (
+    RankIndex, get_rank_indexes, get_sampling_table, get_sampling_tables, invalidate_sampling_table, move_to_back,
+    sample_few_ranks, sample_rank
+)
+from complimentapi.validators import compliments_changed
+
+# Most rank lookups UNION ALLed into one query, SQLite allows 500 compound SELECTs
+RANK_LOOKUPS_PER_QUERY = 100
 
 
 class User(models.Model):
@@ -34,39 +48,406 @@ class User(models.Model):
 
 
 class Receiver(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='receivers')
+    # Indexed by receiver_user_id_idx, which leads with user_id
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='receivers', db_index=False)
     name = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True, null=True)
     updated_at = models.DateTimeField(auto_now=True, null=True)
 
-    def get_random_compliment(self):
-        compliments = self.compliments.all().order_by('last_retrieved_at')
-        weights = [i + 1 for i, _ in enumerate(compliments)]
-        weights.reverse()
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='receiver_user_id_idx'),
+        ]
+
+    def _ordered_compliment_ids(self, limit: Optional[int] = None) -> List[int]:
+        # Answered from compliment_rotation_idx without loading any compliment rows
+        return list(self.compliments.order_by('last_retrieved_at', 'id').values_list('id', flat=True)[:limit])
+
+    @staticmethod
+    def _ordered_compliment_ids_by_receiver(receiver_ids: List[int], limit: int) -> Dict[int, Optional[List[int]]]:
+        # Counted first, so receivers too large to cache are never read
+        counts = dict(
+            Compliment.objects.filter(receiver_id__in=receiver_ids).order_by().values_list('receiver_id')
+            .annotate(Count('id'))
+        )
+        compliment_ids = {
+            receiver_id: [] if counts.get(receiver_id, 0) <= limit else None for receiver_id in receiver_ids
+        }
+
+        rows = Compliment.objects.filter(
+            receiver_id__in=[receiver_id for receiver_id, ids in compliment_ids.items() if ids is not None]
+        ).order_by('receiver_id', 'last_retrieved_at', 'id').values_list('receiver_id', 'id')
+
+        for receiver_id, compliment_id in rows:
+            compliment_ids[receiver_id].append(compliment_id)
 
-        return random.choices(compliments, weights=weights, k=1).pop()
+        return compliment_ids
 
-    def get_random_compliments(self, number: int) -> List:
-        compliments = self.compliments.all().order_by('last_retrieved_at')
-        selected_compliments = []
+    @staticmethod
+    def _rank_indexes(receiver_ids: List[int], step: int) -> Dict[int, RankIndex]:
+        counts = dict(
+            Compliment.objects.filter(receiver_id__in=receiver_ids).order_by().values_list('receiver_id')
+            .annotate(Count('id'))
+        )
+        receiver_keys: Dict[int, list] = {receiver_id: [] for receiver_id in receiver_ids}
 
-        number = number if number > 0 or number < len(compliments) else len(compliments)
+        if counts:
+            # Ranked on the database in one pass over compliment_rotation_idx, only every step-th key is sent back
+            ranked = Compliment.objects.filter(receiver_id__in=counts).annotate(compliment_rank=Window(
+                RowNumber(), partition_by=[F('receiver_id')], order_by=[F('last_retrieved_at').asc(), F('id').asc()]
+            )).order_by().values_list('id', 'receiver_id', 'last_retrieved_at', 'compliment_rank')
+            sql, params = ranked.query.sql_with_params()
 
-        weights = [i + 1 for i, _ in enumerate(compliments)]
-        weights.reverse()
+            # Django can't filter on a window function yet, so the ranked query is wrapped by hand. A raw queryset
+            # still converts last_retrieved_at like the ORM does
+            keys = Compliment.objects.raw(
+                'SELECT id, receiver_id, last_retrieved_at, compliment_rank FROM ({}) ranked '
+                'WHERE (compliment_rank - 1) %% %s = 0'.format(sql),
+                [*params, step], using=ranked.db
+            )
+
+            for key in sorted(keys, key=lambda key: key.compliment_rank):
+                receiver_keys[key.receiver_id].append((key.last_retrieved_at, key.id))
+
+        return {
+            receiver_id: RankIndex.build(counts.get(receiver_id, 0), step, ordered_keys)
+            for receiver_id, ordered_keys in receiver_keys.items()
+        }
+
+    @staticmethod
+    def _sample_uncached_compliment_ids(numbers: Dict[int, int]) -> Dict[int, List[int]]:
+        """
+        `number` distinct weighted random compliment ids for each receiver too large to have a sampling table, in
+        selection order. Ranks are drawn from the cached rank indexes, then looked up together in a single query of
+        index seeks, so neither the count nor the lookups grow with the receivers' sizes.
+        """
+        selected_ids: Dict[int, List[int]] = {}
+        pending = dict(numbers)
 
-        while len(selected_compliments) < number:
-            random_compliment = random.choices(compliments, weights=weights, k=1).pop()
+        # Ranks past the end of a stale index find nothing, those receivers are sampled again from a rebuilt one
+        for _ in range(2):
+            indexes = get_rank_indexes(pending, Receiver._rank_indexes)
+            seeks = {
+                receiver_id: [
+                    indexes[receiver_id].seek(rank) for rank in sample_few_ranks(indexes[receiver_id].count, number)
+                ]
+                for receiver_id, number in pending.items()
+            }
+            selected_ids.update(Receiver._look_up_ranks(seeks))
 
-            if random_compliment.id not in [compliment.id for compliment in selected_compliments]:
-                selected_compliments.append(random_compliment)
+            stale = [receiver_id for receiver_id in seeks if len(selected_ids[receiver_id]) < len(seeks[receiver_id])]
+            for receiver_id in stale:
+                invalidate_sampling_table(receiver_id)
 
-        return selected_compliments
+            pending = {receiver_id: pending[receiver_id] for receiver_id in stale}
+            if not pending:
+                break
+
+        return selected_ids
+
+    @staticmethod
+    def _look_up_ranks(seeks: Dict[int, List[Tuple[datetime, int, int]]]) -> Dict[int, List[int]]:
+        # The compliment ids at RankIndex.seek results, in the same order
+        ranks = [(receiver_id, seek) for receiver_id, receiver_seeks in seeks.items() for seek in receiver_seeks]
+        selected_ids: Dict[int, List[int]] = {receiver_id: [] for receiver_id in seeks}
+
+        if not ranks:
+            return selected_ids
+
+        database = router.db_for_read(Compliment)
+        db_connection = connections[database]
+        quote_name = db_connection.ops.quote_name
+        last_retrieved_at_field = Compliment._meta.get_field('last_retrieved_at')
+
+        # One LIMIT 1 OFFSET < step lookup per rank, seeking on compliment_rotation_idx with a row comparison. The
+        # lookups are subqueries so each keeps its own ORDER BY and LIMIT inside the UNION ALL, their positions are
+        # sorted here rather than by the database
+        lookup = (
+            'SELECT {receiver}, {id}, {{position}} AS position FROM ('
+            'SELECT {receiver}, {id} FROM {table} WHERE {receiver} = %s AND ({last_retrieved_at}, {id}) >= (%s, %s) '
+            'ORDER BY {last_retrieved_at}, {id} LIMIT 1 OFFSET %s) rank_{{position}}'
+        ).format(
+            table=quote_name(Compliment._meta.db_table), receiver=quote_name('receiver_id'), id=quote_name('id'),
+            last_retrieved_at=quote_name('last_retrieved_at')
+        )
+
+        with db_connection.cursor() as cursor:
+            for start in range(0, len(ranks), RANK_LOOKUPS_PER_QUERY):
+                batch = ranks[start:start + RANK_LOOKUPS_PER_QUERY]
+                cursor.execute(
+                    ' UNION ALL '.join(lookup.format(position=position) for position in range(len(batch))),
+                    [
+                        value
+                        for receiver_id, (last_retrieved_at, compliment_id, offset) in batch
+                        for value in (
+                            receiver_id, last_retrieved_at_field.get_db_prep_value(last_retrieved_at, db_connection),
+                            compliment_id, offset
+                        )
+                    ]
+                )
+
+                for receiver_id, compliment_id, _ in sorted(cursor.fetchall(), key=lambda row: row[2]):
+                    selected_ids[receiver_id].append(compliment_id)
+
+        return selected_ids
+
+    @classmethod
+    def get_random_digest(cls, user_id: int) -> List['Compliment']:
+        """
+        One random compliment, weighted like get_random_compliment, for each of the user's receivers that has any, in
+        receiver order. Takes the same handful of queries however many receivers the user has.
+        """
+        receiver_ids = list(cls.objects.filter(user_id=user_id).order_by('id').values_list('id', flat=True))
+        tables = get_sampling_tables(receiver_ids, cls._ordered_compliment_ids_by_receiver)
+
+        selected_ids = {
+            receiver_id: table[sample_rank(len(table))] for receiver_id, table in tables.items() if table
+        }
+        selected_ids.update(
+            (receiver_id, compliment_ids[0])
+            for receiver_id, compliment_ids in cls._sample_uncached_compliment_ids(
+                {receiver_id: 1 for receiver_id, table in tables.items() if table is None}
+            ).items()
+            if compliment_ids
+        )
+
+        compliments = Compliment.objects.in_bulk(selected_ids.values())
+        digest = []
+
+        for receiver_id in receiver_ids:
+            if receiver_id not in selected_ids:
+                continue
+
+            if selected_ids[receiver_id] in compliments:
+                digest.append(compliments[selected_ids[receiver_id]])
+            else:
+                # A stale table, this receiver is left out once and sampled from a fresh table next time
+                invalidate_sampling_table(receiver_id)
+
+        return digest
+
+    def _sample_compliment_ids(self, number: int) -> List[int]:
+        # From the cached sampling table, or through the rank index for receivers too large to have one
+        table = get_sampling_table(self.id, self._ordered_compliment_ids)
+
+        if table is None:
+            return self._sample_uncached_compliment_ids({self.id: number})[self.id]
+
+        return [table[rank] for rank in sample_few_ranks(len(table), number)]
+
+    def get_random_compliment(self) -> Optional['Compliment']:
+        # Tried again with a table rebuilt from the database if the cached one was stale
+        for _ in range(2):
+            compliment_ids = self._sample_compliment_ids(1)
+            if not compliment_ids:
+                return None
+
+            compliment = self.compliments.filter(id=compliment_ids[0]).first()
+            if compliment is not None:
+                return compliment
+
+            invalidate_sampling_table(self.id)
+
+        return None
+
+    def get_random_compliments(self, number: int) -> List['Compliment']:
+        # At most RANDOM_COMPLIMENT_LIST_MAX_SIZE, so no number makes a request load a whole large receiver
+        number = min(number, settings.RANDOM_COMPLIMENT_LIST_MAX_SIZE)
+        if number <= 0:
+            return []
+
+        selected_ids = self._sample_compliment_ids(number)
+        compliments = self.compliments.in_bulk(selected_ids)
+
+        if len(compliments) < len(selected_ids):
+            # A stale table or index, the missing ones are left out once and sampled from a fresh one next time
+            invalidate_sampling_table(self.id)
+
+        return [compliments[compliment_id] for compliment_id in selected_ids if compliment_id in compliments]
+
+    def rotate_compliments(self, number: int) -> List['Compliment']:
+        """
+        Hand out the least recently retrieved compliments and mark them retrieved.
+
+        Rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so concurrent callers each get different compliments
+        instead of racing for the same ones. Backends without row locking (SQLite) fall back to a plain ordered read.
+        """
+        # Capped like get_random_compliments, every row handed out stays locked until the transaction ends
+        number = min(number, settings.RANDOM_COMPLIMENT_LIST_MAX_SIZE)
+        if number <= 0:
+            return []
+
+        with transaction.atomic():
+            compliments = self.compliments.select_for_update(skip_locked=True).order_by('last_retrieved_at', 'id')
+            compliments = list(compliments[:number])
+            now = timezone.now()
+
+            for compliment in compliments:
+                compliment.last_retrieved_at = now
+
+            self.compliments.filter(id__in=[compliment.id for compliment in compliments]).update(last_retrieved_at=now)
+            compliments_changed(self.id)
+
+        move_to_back(self.id, [compliment.id for compliment in compliments])
+
+        return compliments
+
+    def delete_compliments(self, compliment_ids: Optional[Iterable[int]] = None) -> int:
+        """
+        Delete the receiver's compliments, or the ones among compliment_ids, with their search postings and retrieval
+        counts. Returns how many were deleted.
+
+        Django's collector would load every compliment to send post_delete. Instead ids are read in batches of
+        COMPLIMENT_DELETE_BATCH_SIZE on the (receiver, id) index and deleted with plain DELETEs, one transaction per
+        batch, so memory and lock time stay bounded however many compliments there are. What post_delete would have
+        done is done once at the end.
+        """
+        database = router.db_for_write(Compliment)
+        quote_name = connections[database].ops.quote_name
+        compliments = Compliment.objects.using(database).filter(receiver_id=self.id)
+        if compliment_ids is not None:
+            compliments = compliments.filter(id__in=compliment_ids)
+
+        # (table, column) pairs a batch is deleted from by id, the postings and retrieval counts referencing the
+        # compliments first
+        tables = [
+            (quote_name(model._meta.db_table), quote_name(model._meta.get_field(field).column))
+            for model, field in ((ComplimentTerm, 'compliment'), (RetrievalCount, 'compliment'), (Compliment, 'id'))
+        ]
+
+        deleted = 0
+        last_id = 0
+
+        while True:
+            ids = list(
+                compliments.filter(id__gt=last_id).order_by('id')
+                .values_list('id', flat=True)[:settings.COMPLIMENT_DELETE_BATCH_SIZE]
+            )
+            if not ids:
+                break
+
+            with transaction.atomic(using=database), connections[database].cursor() as cursor:
+                for table, column in tables:
+                    cursor.execute(
+                        'DELETE FROM {} WHERE {} IN ({})'.format(table, column, ', '.join(['%s'] * len(ids))), ids
+                    )
+
+                # Of the compliments' DELETE, which ran last
+                deleted += cursor.rowcount
+
+            last_id = ids[-1]
+
+        invalidate_sampling_table(self.id)
+        compliments_changed(self.id)
+
+        return deleted
+
+    def delete(self, *args, **kwargs):
+        # Leaves the collector no compliments to load. Deleting again finishes the job if this is interrupted
+        self.delete_compliments()
+
+        return super().delete(*args, **kwargs)
+
+
+def compliment_text_hash(text: str) -> str:
+    """
+    Hash of a compliment's text ignoring case and whitespace, so texts that only differ in those are duplicates.
+    """
+    normalized = ' '.join(unicodedata.normalize('NFKC', text).casefold().split())
+
+    return hashlib.blake2b(normalized.encode(), digest_size=16).hexdigest()
 
 
 class Compliment(models.Model):
-    receiver = models.ForeignKey(Receiver, on_delete=models.CASCADE, related_name='compliments')
+    # Indexed by compliment_rotation_idx and compliment_receiver_id_idx, which lead with receiver_id
+    receiver = models.ForeignKey(Receiver, on_delete=models.CASCADE, related_name='compliments', db_index=False)
     text = models.CharField(max_length=255)
+    # Set by save, bulk_create callers set it themselves. Null for duplicates that predate it
+    text_hash = models.CharField(max_length=32, null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True, null=True)
     updated_at = models.DateTimeField(auto_now=True, null=True)
-    last_retrieved_at = models.DateTimeField(default=datetime.datetime.now())
+    last_retrieved_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['receiver', 'text_hash'], name='compliment_receiver_text_hash'),
+        ]
+        indexes = [
+            models.Index(fields=['receiver', 'last_retrieved_at', 'id'], name='compliment_rotation_idx'),
+            models.Index(fields=['receiver', 'id'], name='compliment_receiver_id_idx'),
+        ]
+
+    # The text as loaded from the database, None for new compliments
+    _loaded_text: Optional[str] = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_text = instance.__dict__.get('text')
+
+        return instance
+
+    def save(self, *args, **kwargs) -> None:
+        # Rehashed only when the text changed, saving a legacy duplicate keeps its null hash instead of conflicting
+        update_fields = kwargs.get('update_fields')
+        if self.text != self._loaded_text and (update_fields is None or 'text' in update_fields):
+            self.text_hash = compliment_text_hash(self.text)
+
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'text_hash'}
+
+        super().save(*args, **kwargs)
+
+        if update_fields is None or 'text' in update_fields:
+            self._loaded_text = self.text
+
+
+class ComplimentTerm(models.Model):
+    """
+    One row per distinct term of a compliment's text, the inverted index behind compliment search. Kept in sync by
+    complimentapi.search.
+    """
+
+    # The owner is copied from the receiver so a user's postings for a term are one index range
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+', db_index=False)
+    term = models.CharField(max_length=64)
+    compliment = models.ForeignKey(Compliment, on_delete=models.CASCADE, related_name='terms', db_index=False)
+    # How often the term occurs in the compliment
+    count = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'term', 'compliment'], name='compliment_term_postings'),
+        ]
+        indexes = [
+            models.Index(fields=['compliment'], name='compliment_term_compliment_idx'),
+        ]
+
+
+class RetrievalCount(models.Model):
+    """
+    How often a compliment was retrieved in an hour or a day, the history behind GET /receivers/{id}/stats. Written
+    by complimentapi.retrievals, which adds to hourly buckets and compacts old ones into daily ones.
+    """
+
+    class Period(models.TextChoices):
+        HOUR = 'hour'
+        DAY = 'day'
+
+    # The receiver is copied from the compliment so a receiver's buckets are one index range
+    receiver = models.ForeignKey(Receiver, on_delete=models.CASCADE, related_name='+', db_index=False)
+    compliment = models.ForeignKey(
+        Compliment, on_delete=models.CASCADE, related_name='retrieval_counts', db_index=False
+    )
+    period = models.CharField(max_length=4, choices=Period.choices)
+    starts_at = models.DateTimeField()
+    count = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['compliment', 'period', 'starts_at'], name='retrieval_count_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['receiver', 'starts_at'], name='retrieval_count_receiver_idx'),
+            models.Index(fields=['period', 'starts_at'], name='retrieval_count_period_idx'),
+        ]
@@ -0,0 +1,155 @@
+import asyncio
+import atexit
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import httpx
+import jwt
+from django.conf import settings
+
+_signing_keys: Dict[str, jwt.PyJWK] = {}
+_signing_keys_expire_at: float = 0
+
+
+class OAuthError(Exception):
+    """
+    The provider turned the login down, like an invalid or expired code.
+    """
+
+
+class ProviderError(Exception):
+    """
+    The provider answered with an error status or a body that isn't the expected JSON.
+    """
+
+
+class ProviderClient:
+    """
+    One pooled keep-alive httpx.AsyncClient for the whole process, running on an event loop of its own in a daemon
+    thread. Requests made from any other loop, the ASGI server's or the one WSGI creates for every request, are handed
+    to it, so connections are reused across requests either way, and the caller's loop only waits.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _start(self) -> Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._client = httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=settings.GOOGLE_OAUTH_MAX_CONNECTIONS)
+                )
+                threading.Thread(target=self._loop.run_forever, name='oauth-client', daemon=True).start()
+
+            return self._loop, self._client
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        loop, client = self._start()
+        request = client.request(method, url, timeout=settings.GOOGLE_OAUTH_TIMEOUT, **kwargs)
+
+        # Cancelling the caller, when its client disconnects, cancels the request too
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(request, loop))
+
+    def close(self) -> None:
+        with self._lock:
+            loop, client, self._loop, self._client = self._loop, self._client, None, None
+
+        if loop is None:
+            return
+
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(settings.GOOGLE_OAUTH_TIMEOUT)
+        loop.call_soon_threadsafe(loop.stop)
+
+
+provider_client = ProviderClient()
+
+# Close the pooled connections when the worker shuts down
+atexit.register(provider_client.close)
+
+
+def _json(response: httpx.Response) -> dict:
+    """
+    The JSON object of a provider response. Raises OAuthError when it reports an OAuth error, and ProviderError when
+    the provider failed or answered with something else.
+    """
+    try:
+        data = response.json()
+    except ValueError:
+        data = None
+
+    # Errors like invalid_grant come with a 400, an error from a failing provider is still its failure
+    if not response.is_server_error and isinstance(data, dict) and data.get('error'):
+        error = data['error']
+        raise OAuthError(data.get('error_description', error) if isinstance(error, str) else str(error))
+
+    if response.is_error or not isinstance(data, dict):
+        raise ProviderError('{} answered {} {}'.format(
+            response.request.url, response.status_code, response.headers.get('Content-Type', '')
+        ))
+
+    return data
+
+
+async def exchange_code(code: str, client_id: str, client_secret: str, redirect_uri: str) -> dict:
+    return _json(await provider_client.request('POST', settings.GOOGLE_OAUTH_TOKEN_URL, data={
+        'client_id': client_id,
+        'client_secret': client_secret,
+        'code': code,
+        'grant_type': 'authorization_code',
+        'redirect_uri': redirect_uri
+    }))
+
+
+async def fetch_user_info(access_token: str) -> dict:
+    return _json(await provider_client.request(
+        'GET', settings.GOOGLE_OAUTH_USERINFO_URL, headers={'Authorization': 'Bearer {}'.format(access_token)}
+    ))
+
+
+async def get_signing_key(key_id: Optional[str]) -> jwt.PyJWK:
+    global _signing_keys, _signing_keys_expire_at
+
+    # Refetch when the cached keys expire, or when the token was signed with a key we haven't seen (Google rotates them)
+    if key_id not in _signing_keys or time.monotonic() > _signing_keys_expire_at:
+        response = await provider_client.request('GET', settings.GOOGLE_OAUTH_CERTS_URL)
+
+        _signing_keys = {key.key_id: key for key in jwt.PyJWKSet.from_dict(_json(response)).keys}
+        _signing_keys_expire_at = time.monotonic() + _max_age(response, default=settings.GOOGLE_OAUTH_CERTS_TIMEOUT)
+
+    if key_id not in _signing_keys:
+        raise OAuthError('id_token was signed with unknown key {}'.format(key_id))
+
+    return _signing_keys[key_id]
+
+
+async def verify_id_token(id_token: str, audience: str) -> dict:
+    """
+    Verify an OpenID Connect id_token against the provider's published signing keys and return its claims, which
+    carry the same email and name fields as the userinfo endpoint.
+    """
+    try:
+        key = await get_signing_key(jwt.get_unverified_header(id_token).get('kid'))
+        claims = jwt.decode(
+            id_token, key=key.key, algorithms=['RS256'], audience=audience, options={'verify_iss': False}
+        )
+    except jwt.PyJWTError as e:
+        raise OAuthError(str(e)) from e
+
+    if claims.get('iss') not in settings.GOOGLE_OAUTH_ISSUERS:
+        raise OAuthError('id_token has unexpected issuer {}'.format(claims.get('iss')))
+
+    return claims
+
+
+def _max_age(response: httpx.Response, default: int) -> int:
+    for directive in response.headers.get('Cache-Control', '').split(','):
+        name, _, value = directive.strip().partition('=')
+
+        if name == 'max-age' and value.isdigit():
+            return int(value)
+
+    return default
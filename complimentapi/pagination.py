@@ -0,0 +1,50 @@
+from typing import Type
+
+from django.conf import settings
+from django.db.models import QuerySet
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.serializers import ModelSerializer
+
+from complimentapi.serializers import get_values_serializer
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Keyset pagination on id with an opaque cursor. Pages are read with WHERE id > ? ORDER BY id LIMIT n on the
+    (owner, id) indexes, so deep pages cost the same as the first one.
+    """
+
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class SearchPagination(PageNumberPagination):
+    """
+    Search results are ordered by score rather than a unique key, so they are paged by number instead of by cursor.
+    """
+
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+def paginated_response(
+    queryset: QuerySet, serializer_class: Type[ModelSerializer], request: Request, view=None
+) -> Response:
+    """
+    A page of `queryset` serialized with `serializer_class`. With FAST_SERIALIZATION on, the page is read as .values()
+    and serialized by a ValuesSerializer instead, with the same output.
+    """
+    paginator = IdCursorPagination()
+
+    if settings.FAST_SERIALIZATION:
+        values_serializer = get_values_serializer(serializer_class)
+        page = paginator.paginate_queryset(values_serializer.values(queryset), request, view=view)
+        data = values_serializer.to_representation(page)
+    else:
+        page = paginator.paginate_queryset(queryset, request, view=view)
+        data = serializer_class(page, many=True).data
+
+    return paginator.get_paginated_response(data)
@@ -16,11 +16,19 @@ class OwnsReceiver(BasePermission):
 
         receiver = get_object_or_404(Receiver, id=request_context.get('receiver_pk', request_context.get('pk')))
 
-        return request.user.id == receiver.user.id
+        # Views reuse the loaded receiver instead of fetching it again
+        request.receiver = receiver
+
+        return request.user.id == receiver.user_id
 
 
 class OwnsCompliment(BasePermission):
     def has_permission(self, request: Request, view: ViewSet) -> bool:
-        compliment = get_object_or_404(Compliment, id=request.parser_context.get('kwargs', {}).get('pk'))
+        compliment = get_object_or_404(
+            Compliment.objects.select_related('receiver'), id=request.parser_context.get('kwargs', {}).get('pk')
+        )
+
+        # Views reuse the loaded compliment instead of fetching it again
+        request.compliment = compliment
 
-        return compliment.receiver.user.id == request.user.id
+        return compliment.receiver.user_id == request.user.id
@@ -0,0 +1,275 @@
+import atexit
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import connection, connections, router, transaction
+from django.db.models import Case, DateTimeField, Sum, Value, When
+from django.utils import timezone
+
+from complimentapi.models import Receiver, Compliment, RetrievalCount
+from complimentapi.sampling import move_to_back
+from complimentapi.validators import compliments_changed
+
+import logging
+logger = logging.getLogger('django')
+
+
+# Retrieval counts keyed by (receiver id, compliment id, start of the bucket)
+Counts = Dict[Tuple[int, int, datetime], int]
+
+
+def add_retrieval_counts(counts: Counts, period: str) -> None:
+    """
+    Add counts to the period's buckets, with one INSERT ... ON CONFLICT DO UPDATE per RETRIEVAL_FLUSH_SIZE buckets.
+    The database adds to existing buckets itself, so workers counting the same bucket can't lose each other's counts.
+    """
+    database = router.db_for_write(RetrievalCount)
+    db_connection = connections[database]
+    quote_name = db_connection.ops.quote_name
+    starts_at_field = RetrievalCount._meta.get_field('starts_at')
+    rows = list(counts.items())
+
+    # Django's bulk_create(update_conflicts=True) can only overwrite the count, not add to it
+    sql = (
+        'INSERT INTO {table} ({receiver}, {compliment}, {period}, {starts_at}, {count}) VALUES {{}} '
+        'ON CONFLICT ({compliment}, {period}, {starts_at}) DO UPDATE SET {count} = {table}.{count} + EXCLUDED.{count}'
+    ).format(
+        table=quote_name(RetrievalCount._meta.db_table), receiver=quote_name('receiver_id'),
+        compliment=quote_name('compliment_id'), period=quote_name('period'), starts_at=quote_name('starts_at'),
+        count=quote_name('count')
+    )
+
+    with db_connection.cursor() as cursor:
+        for index in range(0, len(rows), settings.RETRIEVAL_FLUSH_SIZE):
+            batch = rows[index:index + settings.RETRIEVAL_FLUSH_SIZE]
+            cursor.execute(sql.format(', '.join(['(%s, %s, %s, %s, %s)'] * len(batch))), [
+                value
+                for (receiver_id, compliment_id, starts_at), count in batch
+                for value in (
+                    receiver_id, compliment_id, period, starts_at_field.get_db_prep_value(starts_at, db_connection),
+                    count
+                )
+            ])
+
+
+class RetrievalBuffer:
+    """
+    Write-behind buffer for Compliment.last_retrieved_at and the hourly RetrievalCounts.
+
+    Retrievals are recorded in memory, coalesced per compliment and hour, and written by a background thread as one
+    UPDATE and one upsert every RETRIEVAL_FLUSH_INTERVAL seconds, or as soon as RETRIEVAL_FLUSH_SIZE compliments are
+    pending. An interval of 0 writes every retrieval immediately.
+    """
+
+    def __init__(self):
+        self._pending: Dict[int, datetime] = {}
+        self._pending_receivers: Set[int] = set()
+        self._counts: Counts = Counter()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, compliments: Iterable[Compliment]) -> None:
+        now = timezone.now()
+        retrieved = defaultdict(list)
+
+        with self._lock:
+            for compliment in compliments:
+                compliment.last_retrieved_at = now
+                self._pending[compliment.id] = now
+                retrieved[compliment.receiver_id].append(compliment.id)
+
+            self._pending_receivers.update(retrieved)
+            self._count(retrieved, now)
+            pending_count = max(len(self._pending), len(self._counts))
+
+        # The cached sampling tables are patched right away, so selection sees retrievals before they are written
+        for receiver_id, compliment_ids in retrieved.items():
+            move_to_back(receiver_id, compliment_ids)
+
+        self._schedule_flush(pending_count)
+
+    def count(self, compliments: Iterable[Compliment]) -> None:
+        """
+        Only count retrievals, for compliments whose last_retrieved_at was already written.
+        """
+        retrieved = defaultdict(list)
+        for compliment in compliments:
+            retrieved[compliment.receiver_id].append(compliment.id)
+
+        with self._lock:
+            self._count(retrieved, timezone.now())
+            pending_count = max(len(self._pending), len(self._counts))
+
+        self._schedule_flush(pending_count)
+
+    def _count(self, retrieved: Dict[int, List[int]], now: datetime) -> None:
+        hour = now.replace(minute=0, second=0, microsecond=0)
+
+        for receiver_id, compliment_ids in retrieved.items():
+            for compliment_id in compliment_ids:
+                self._counts[receiver_id, compliment_id, hour] += 1
+
+    def _schedule_flush(self, pending_count: int) -> None:
+        if settings.RETRIEVAL_FLUSH_INTERVAL <= 0:
+            self.flush()
+        elif pending_count >= settings.RETRIEVAL_FLUSH_SIZE:
+            self._wake.set()
+
+        self._ensure_thread()
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            receiver_ids, self._pending_receivers = self._pending_receivers, set()
+            counts, self._counts = self._counts, Counter()
+
+        if pending:
+            try:
+                Compliment.objects.filter(id__in=pending.keys()).update(last_retrieved_at=Case(
+                    *[
+                        When(id=compliment_id, then=Value(retrieved_at))
+                        for compliment_id, retrieved_at in pending.items()
+                    ],
+                    output_field=DateTimeField()
+                ))
+            except Exception as e:
+                logger.error(str(e), exc_info=True)
+
+            # last_retrieved_at is part of the compliments' representation
+            compliments_changed(*receiver_ids)
+
+        if counts:
+            try:
+                # Compliments deleted since they were retrieved would fail the whole upsert on their foreign key. Read
+                # from the primary, a replica may not have the newest compliments yet
+                existing = set(Compliment.objects.using(router.db_for_write(Compliment)).filter(
+                    id__in={compliment_id for _, compliment_id, _ in counts}
+                ).values_list('id', flat=True))
+
+                add_retrieval_counts(
+                    {key: count for key, count in counts.items() if key[1] in existing}, RetrievalCount.Period.HOUR
+                )
+            except Exception as e:
+                logger.error(str(e), exc_info=True)
+
+    def _ensure_thread(self) -> None:
+        if settings.RETRIEVAL_FLUSH_INTERVAL <= 0 or (self._thread and self._thread.is_alive()):
+            return
+
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+
+            self._thread = threading.Thread(target=self._run, name='retrieval-buffer', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(settings.RETRIEVAL_FLUSH_INTERVAL)
+            self._wake.clear()
+            self.flush()
+            connection.close_if_unusable_or_obsolete()
+
+
+retrieval_buffer = RetrievalBuffer()
+
+# Drain whatever is still pending when the worker shuts down
+atexit.register(retrieval_buffer.flush)
+
+
+def select_compliments(receiver: Receiver, number: Optional[int] = None) -> List[Compliment]:
+    """
+    Pick compliments for the random compliment endpoints, a single one when number is None, and mark them retrieved.
+    """
+    if settings.COMPLIMENT_SELECTION_MODE == 'rotation':
+        compliments = receiver.rotate_compliments(1 if number is None else number)
+        retrieval_buffer.count(compliments)
+
+        return compliments
+
+    if number is None:
+        compliments = [compliment for compliment in [receiver.get_random_compliment()] if compliment is not None]
+    else:
+        compliments = receiver.get_random_compliments(number)
+
+    retrieval_buffer.record(compliments)
+
+    return compliments
+
+
+def select_digest(user_id: int) -> List[Compliment]:
+    """
+    Pick one compliment for each of the user's receivers and mark them all retrieved in one batch.
+    """
+    compliments = Receiver.get_random_digest(user_id)
+    retrieval_buffer.record(compliments)
+
+    return compliments
+
+
+def retrieval_stats(receiver_id: int, days: int) -> dict:
+    """
+    Retrievals of the receiver's compliments over the last `days` UTC days, today included: in total, per compliment,
+    most retrieved first, and per hourly or daily bucket. Sums the counts on the receiver's buckets, so it costs the
+    same however often the compliments were retrieved. Retrievals still in the buffer aren't counted yet.
+    """
+    since = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days - 1)
+    counts = RetrievalCount.objects.filter(receiver_id=receiver_id, starts_at__gte=since).order_by()
+
+    buckets = list(
+        counts.values('starts_at', 'period').annotate(retrievals=Sum('count')).order_by('starts_at', 'period')
+    )
+    compliments = [
+        {'compliment': compliment_id, 'retrievals': retrievals}
+        for compliment_id, retrievals in counts.values_list('compliment_id').annotate(Sum('count'))
+        .order_by('-count__sum', 'compliment_id')
+    ]
+
+    return {
+        'since': since,
+        'retrievals': sum(bucket['retrievals'] for bucket in buckets),
+        'compliments': compliments,
+        'buckets': buckets,
+    }
+
+
+def compact_retrieval_counts(now: Optional[datetime] = None) -> Tuple[int, int]:
+    """
+    Merge hourly RetrievalCounts older than RETRIEVAL_HOURLY_DAYS into daily ones, one day per transaction, and drop
+    daily ones older than RETRIEVAL_DAILY_DAYS. Returns how many hourly and daily buckets were removed.
+    """
+    database = router.db_for_write(RetrievalCount)
+    today = (now or timezone.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    hourly_before = today - timedelta(days=settings.RETRIEVAL_HOURLY_DAYS)
+    # Read from where the counts are written, not from a replica that may be behind
+    hourly = RetrievalCount.objects.using(database).filter(period=RetrievalCount.Period.HOUR)
+    compacted = 0
+
+    while True:
+        # Buckets are in UTC, the day of an hour is its date
+        oldest = hourly.filter(starts_at__lt=hourly_before).order_by('starts_at').values_list('starts_at', flat=True)
+        day = next(iter(oldest[:1]), None)
+        if day is None:
+            break
+
+        day = day.replace(hour=0)
+        day_counts = hourly.filter(starts_at__gte=day, starts_at__lt=day + timedelta(days=1))
+
+        with transaction.atomic(using=database):
+            add_retrieval_counts({
+                (receiver_id, compliment_id, day): count
+                for receiver_id, compliment_id, count in day_counts.values_list('receiver_id', 'compliment_id')
+                .annotate(Sum('count')).order_by()
+            }, RetrievalCount.Period.DAY)
+
+            compacted += day_counts.delete()[0]
+
+    dropped = RetrievalCount.objects.using(database).filter(
+        period=RetrievalCount.Period.DAY, starts_at__lt=today - timedelta(days=settings.RETRIEVAL_DAILY_DAYS)
+    ).delete()[0]
+
+    return compacted, dropped
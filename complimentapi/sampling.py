@@ -0,0 +1,189 @@
+import heapq
+import math
+import random
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def sample_rank(size: int) -> int:
+    """
+    Pick a rank in [0, size) where rank r has weight (size - r), so the first rank is the most likely.
+
+    Choosing two distinct values out of [0, size] and keeping the smaller one gives exactly that distribution: there
+    are (size - r) pairs whose minimum is r, out of size * (size + 1) / 2 pairs in total.
+    """
+    if size < 1:
+        raise ValueError('Cannot sample a rank from an empty set')
+
+    return min(random.sample(range(size + 1), 2))
+
+
+def sample_ranks(size: int, number: int) -> List[int]:
+    """
+    Pick `number` distinct ranks in [0, size) without replacement, with the same weights as `sample_rank`.
+
+    Uses Efraimidis-Spirakis keys: every rank gets the key log(u) / weight for a uniform u, and the ranks with the
+    largest keys win. This is a single pass over the ranks, and the result is in selection order.
+    """
+    number = max(0, min(number, size))
+
+    return heapq.nlargest(number, range(size), key=lambda rank: math.log(1.0 - random.random()) / (size - rank))
+
+
+def sample_few_ranks(size: int, number: int) -> List[int]:
+    """
+    `sample_ranks` for a number much smaller than size, in O(number) instead of O(size). Ranks are drawn one at a time
+    with `sample_rank` and repeats are drawn again, which picks every next rank with the same weights among the ranks
+    left as `sample_ranks` does.
+    """
+    number = max(0, min(number, size))
+
+    # Repeats get likely once a good part of the ranks is taken
+    if number * 2 > size:
+        return sample_ranks(size, number)
+
+    ranks: Dict[int, None] = {}
+    while len(ranks) < number:
+        ranks.setdefault(sample_rank(size))
+
+    return list(ranks)
+
+
+# Sampling tables are arrays of a receiver's compliment ids ordered from least to most recently retrieved, so a
+# compliment's rank is its index. Receivers with more than SAMPLING_TABLE_MAX_SIZE compliments are cached as False and
+# sampled through a rank index instead, see below.
+
+def _sampling_table_key(receiver_id: int) -> str:
+    return 'sampling-table:{}'.format(receiver_id)
+
+
+def get_sampling_table(receiver_id: int, load_ids: Callable[[int], Iterable[int]]) -> Optional[array]:
+    """
+    Return the cached sampling table for a receiver, building it with `load_ids(limit)` on a miss. Returns None when
+    the receiver is too large to cache.
+    """
+    cache = caches[settings.SAMPLING_TABLE_CACHE]
+    table = cache.get(_sampling_table_key(receiver_id))
+
+    if table is None:
+        table = array('q', load_ids(settings.SAMPLING_TABLE_MAX_SIZE + 1))
+
+        if len(table) > settings.SAMPLING_TABLE_MAX_SIZE:
+            table = False
+
+        cache.set(_sampling_table_key(receiver_id), table, settings.SAMPLING_TABLE_TIMEOUT)
+
+    return None if table is False else table
+
+
+def get_sampling_tables(
+    receiver_ids: Iterable[int], load_ids: Callable[[List[int], int], Dict[int, Optional[Iterable[int]]]]
+) -> Dict[int, Optional[array]]:
+    """
+    `get_sampling_table` for many receivers with a single cache round trip. Every missing table is built by one
+    `load_ids(receiver_ids, limit)` call, which returns each receiver's ordered ids, or None when it has more than
+    `limit` compliments.
+    """
+    cache = caches[settings.SAMPLING_TABLE_CACHE]
+    keys = {_sampling_table_key(receiver_id): receiver_id for receiver_id in receiver_ids}
+    tables = {keys[key]: table for key, table in cache.get_many(keys).items()}
+    missing = [receiver_id for receiver_id in keys.values() if receiver_id not in tables]
+
+    if missing:
+        loaded = {
+            receiver_id: False if compliment_ids is None else array('q', compliment_ids)
+            for receiver_id, compliment_ids in load_ids(missing, settings.SAMPLING_TABLE_MAX_SIZE).items()
+        }
+        cache.set_many(
+            {_sampling_table_key(receiver_id): table for receiver_id, table in loaded.items()},
+            settings.SAMPLING_TABLE_TIMEOUT
+        )
+        tables.update(loaded)
+
+    return {receiver_id: None if table is False else table for receiver_id, table in tables.items()}
+
+
+def move_to_back(receiver_id: int, compliment_ids: Iterable[int]) -> None:
+    """
+    Patch a cached sampling table after compliments were retrieved, making them the least likely to be picked next.
+    """
+    cache = caches[settings.SAMPLING_TABLE_CACHE]
+    table = cache.get(_sampling_table_key(receiver_id))
+
+    if not table:
+        return
+
+    moved = set(compliment_ids)
+    patched = array('q', (compliment_id for compliment_id in table if compliment_id not in moved))
+    patched.extend(compliment_id for compliment_id in table if compliment_id in moved)
+
+    cache.set(_sampling_table_key(receiver_id), patched, settings.SAMPLING_TABLE_TIMEOUT)
+
+
+def invalidate_sampling_table(receiver_id: int) -> None:
+    caches[settings.SAMPLING_TABLE_CACHE].delete_many([_sampling_table_key(receiver_id), _rank_index_key(receiver_id)])
+
+
+# Receivers too large for a sampling table are sampled through a rank index instead: the (last_retrieved_at, id) key of
+# every SAMPLING_RANK_INDEX_STEP-th compliment in table order. A rank is found by seeking to the key at or before it on
+# compliment_rotation_idx and skipping less than a step of rows, so sampling costs the same however large the receiver
+# is. Retrievals move compliments behind the keys without patching them, which shifts ranks by up to the number of
+# retrievals since the index was built, so it is only kept for SAMPLING_RANK_INDEX_TIMEOUT.
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class RankIndex(NamedTuple):
+    count: int
+    step: int
+    # last_retrieved_at in microseconds since the epoch and id of the compliments at ranks 0, step, 2 * step, ...
+    times: array
+    ids: array
+
+    @classmethod
+    def build(cls, count: int, step: int, keys: Iterable[Tuple[datetime, int]]) -> 'RankIndex':
+        index = cls(count, step, array('q'), array('q'))
+
+        for last_retrieved_at, compliment_id in keys:
+            index.times.append((last_retrieved_at - _EPOCH) // timedelta(microseconds=1))
+            index.ids.append(compliment_id)
+
+        return index
+
+    def seek(self, rank: int) -> Tuple[datetime, int, int]:
+        """
+        The key to seek to for a rank, and how many rows after it the rank is.
+        """
+        position = rank // self.step
+        return _EPOCH + timedelta(microseconds=self.times[position]), self.ids[position], rank % self.step
+
+
+def _rank_index_key(receiver_id: int) -> str:
+    return 'rank-index:{}'.format(receiver_id)
+
+
+def get_rank_indexes(
+    receiver_ids: Iterable[int], load_indexes: Callable[[List[int], int], Dict[int, RankIndex]]
+) -> Dict[int, RankIndex]:
+    """
+    The cached rank indexes of receivers, with a single cache round trip. Every missing index is built by one
+    `load_indexes(receiver_ids, step)` call.
+    """
+    cache = caches[settings.SAMPLING_TABLE_CACHE]
+    keys = {_rank_index_key(receiver_id): receiver_id for receiver_id in receiver_ids}
+    indexes = {keys[key]: index for key, index in cache.get_many(keys).items()}
+    missing = [receiver_id for receiver_id in keys.values() if receiver_id not in indexes]
+
+    if missing:
+        loaded = load_indexes(missing, settings.SAMPLING_RANK_INDEX_STEP)
+        cache.set_many(
+            {_rank_index_key(receiver_id): index for receiver_id, index in loaded.items()},
+            settings.SAMPLING_RANK_INDEX_TIMEOUT
+        )
+        indexes.update(loaded)
+
+    return indexes
@@ -0,0 +1,81 @@
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List
+
+from django.conf import settings
+from django.db.models import Case, Count, F, FloatField, QuerySet, Sum, Value, When
+
+from complimentapi.models import Receiver, Compliment, ComplimentTerm
+
+TERM_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> Counter:
+    """
+    Terms of a text with their counts. Terms are case folded words of at least two characters, longer ones are cut to
+    fit ComplimentTerm.term.
+    """
+    max_length = ComplimentTerm._meta.get_field('term').max_length
+
+    return Counter(
+        term[:max_length] for term in TERM_PATTERN.findall(unicodedata.normalize('NFKC', text).casefold())
+        if len(term) > 1
+    )
+
+
+def index_compliments(compliments: Iterable[Compliment]) -> None:
+    """
+    Replace the postings of the given compliments. Called on save, and explicitly after bulk_create, which doesn't
+    send post_save.
+    """
+    compliments = list(compliments)
+    if not compliments:
+        return
+
+    user_ids: Dict[int, int] = dict(
+        Receiver.objects.filter(id__in={compliment.receiver_id for compliment in compliments})
+        .values_list('id', 'user_id')
+    )
+
+    ComplimentTerm.objects.filter(compliment__in=compliments).delete()
+    ComplimentTerm.objects.bulk_create([
+        ComplimentTerm(user_id=user_ids[compliment.receiver_id], term=term, compliment_id=compliment.id, count=count)
+        for compliment in compliments
+        for term, count in tokenize(compliment.text).items()
+    ], batch_size=settings.COMPLIMENT_IMPORT_BATCH_SIZE)
+
+
+def search_compliments(user_id: int, query: str) -> QuerySet:
+    """
+    Rows of {'compliment_id', 'score'} for the user's compliments containing every term of the query, best first.
+
+    Only the postings of the query's terms are read, through compliment_term_postings, so the cost depends on how
+    often the terms occur and not on how many compliments the user has. A term's weight is the inverse of the number
+    of compliments containing it, so rare terms count the most.
+    """
+    terms = list(tokenize(query))[:settings.SEARCH_MAX_TERMS]
+    postings = ComplimentTerm.objects.filter(user_id=user_id, term__in=terms)
+
+    document_frequencies = dict(postings.order_by().values_list('term').annotate(Count('id')))
+    if not terms or len(document_frequencies) < len(terms):
+        return ComplimentTerm.objects.none().values('compliment_id')
+
+    score = Sum(Case(
+        *[
+            When(term=term, then=F('count') / Value(float(frequency)))
+            for term, frequency in document_frequencies.items()
+        ],
+        output_field=FloatField()
+    ))
+
+    return postings.values('compliment_id').annotate(matched=Count('id'), score=score).filter(
+        matched=len(terms)
+    ).order_by('-score', '-compliment_id')
+
+
+def ranked_compliments(rows: Iterable[dict]) -> List[Compliment]:
+    rows = list(rows)
+    compliments = Compliment.objects.in_bulk([row['compliment_id'] for row in rows])
+
+    return [compliments[row['compliment_id']] for row in rows if row['compliment_id'] in compliments]
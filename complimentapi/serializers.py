@@ -1,23 +1,141 @@
-from rest_framework import serializers
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Type
 
+from django.conf import settings
+from django.db.models import QuerySet
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from complimentapi.instrumentation import timed
 from complimentapi.models import User, Receiver, Compliment
 
 
-class UserSerializer(serializers.ModelSerializer):
+class TimedModelSerializer(serializers.ModelSerializer):
+    """
+    Counts the time spent representing instances towards the request's serialization time.
+    """
+
+    def to_representation(self, instance):
+        with timed('serialize'):
+            return super().to_representation(instance)
+
+
+class UserSerializer(TimedModelSerializer):
     class Meta:
         model = User
         fields = '__all__'
 
 
-class ReceiverSerializer(serializers.ModelSerializer):
+class ReceiverSerializer(TimedModelSerializer):
     class Meta:
         model = Receiver
         fields = '__all__'
-        read_only_fields = ['id, user', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'user', 'created_at', 'updated_at']
+
 
+# Errors of an edit that would duplicate another compliment of the same receiver, see Compliment.text_hash
+DUPLICATE_TEXT_ERRORS = {'text': ['This receiver already has this compliment.']}
 
-class ComplimentSerializer(serializers.ModelSerializer):
+
+class ComplimentSerializer(TimedModelSerializer):
     class Meta:
         model = Compliment
-        fields = '__all__'
-        read_only_fields = ['id, receiver', 'created_at', 'updated_at']
+        exclude = ['text_hash']
+        read_only_fields = ['id', 'receiver', 'created_at', 'updated_at']
+
+
+class BulkDeleteSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), min_length=1, max_length=settings.BULK_DELETE_MAX_IDS
+    )
+
+
+class RetrievalStatsSerializer(serializers.Serializer):
+    days = serializers.IntegerField(min_value=1, max_value=settings.RETRIEVAL_DAILY_DAYS, default=7)
+
+
+class BatchOperationSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(['GET', 'POST', 'PATCH', 'DELETE'])
+    # A path of complimentapi.urls with its query string, like /receivers/1/compliments?page_size=10
+    path = serializers.RegexField(r'^/', max_length=2000)
+    body = serializers.JSONField(required=False)
+
+
+class BatchSerializer(serializers.Serializer):
+    operations = serializers.ListField(
+        child=BatchOperationSerializer(), min_length=1, max_length=settings.BATCH_MAX_OPERATIONS
+    )
+    # Roll back every operation if one of them fails
+    atomic = serializers.BooleanField(default=False)
+
+
+class ValuesSerializer:
+    """
+    Read-only fast path for a ModelSerializer's output. Rows are read with .values() and only datetimes are converted,
+    once per value, instead of going through every field's to_representation. Produces the same data as the
+    ModelSerializer for serializers made of plain columns, foreign keys and datetimes.
+    """
+
+    supported_fields = (
+        serializers.IntegerField, serializers.CharField, serializers.BooleanField, serializers.DateTimeField,
+        serializers.PrimaryKeyRelatedField
+    )
+
+    def __init__(self, serializer_class: Type[serializers.ModelSerializer]):
+        fields = serializer_class().fields
+        opts = serializer_class.Meta.model._meta
+
+        for name, field in fields.items():
+            if not isinstance(field, self.supported_fields) or field.source != name:
+                raise TypeError('ValuesSerializer can\'t serialize {}.{}'.format(serializer_class.__name__, name))
+
+        self.field_names: List[str] = list(fields)
+        # Foreign keys are read from their column, so receiver comes from receiver_id without a join
+        self.columns: List[str] = [opts.get_field(name).attname for name in fields]
+        self.datetime_fields: Dict[str, serializers.DateTimeField] = {
+            column: field for column, field in zip(self.columns, fields.values())
+            if isinstance(field, serializers.DateTimeField)
+        }
+
+    def values(self, queryset: QuerySet) -> QuerySet:
+        return queryset.values(*self.columns)
+
+    def to_representation(self, rows: Iterable[dict]) -> List[dict]:
+        with timed('serialize'):
+            return self._to_representation(rows)
+
+    def _to_representation(self, rows: Iterable[dict]) -> List[dict]:
+        formatters = {column: self.datetime_formatter(field) for column, field in self.datetime_fields.items()}
+        data = []
+
+        for row in rows:
+            for column, formatter in formatters.items():
+                row[column] = formatter(row[column])
+
+            data.append(dict(zip(self.field_names, map(row.__getitem__, self.columns))))
+
+        return data
+
+    @staticmethod
+    def datetime_formatter(field: serializers.DateTimeField) -> Callable[[Optional[datetime]], Optional[str]]:
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        field_timezone = getattr(field, 'timezone', field.default_timezone())
+
+        if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+            return field.to_representation
+
+        # DateTimeField.to_representation for ISO 8601 with an active timezone, with the settings looked up once
+        def format_datetime(value: Optional[datetime]) -> Optional[str]:
+            if not value:
+                return None
+
+            value = value.astimezone(field_timezone).isoformat() if value.tzinfo else field.to_representation(value)
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+        return format_datetime
+
+
+@lru_cache(maxsize=None)
+def get_values_serializer(serializer_class: Type[serializers.ModelSerializer]) -> ValuesSerializer:
+    return ValuesSerializer(serializer_class)
@@ -42,15 +42,26 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so it times everything else
+    'complimentapi.instrumentation.request_metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'complimentapi.db_routers.replica_pinning_middleware',
 ]
 
-ROOT_URLCONF = 'complimentapi.urls'
+# Server-Timing headers and the per-route histograms behind /metrics. /metrics is only served with METRICS_TOKEN set,
+# to requests with it as a bearer token.
+REQUEST_METRICS = os.environ.get('REQUEST_METRICS', '1') == '1'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# The ASGI entrypoint turns this on by default, serving receivers and compliments from native async views
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', '0') == '1'
+
+ROOT_URLCONF = 'complimentapi.async_urls' if ASYNC_VIEWS else 'complimentapi.urls'
 
 TEMPLATES = [
     {
@@ -85,6 +96,121 @@ DATABASES = {
     }
 }
 
+# Read replicas, one alias per host in DATABASE_REPLICA_HOSTS, configured like default. Reads are spread over them by
+# ReplicaRouter, and a user who writes reads from default for the next REPLICA_PIN_SECONDS, which should be longer
+# than the replication lag.
+DATABASE_REPLICAS = []
+
+for index, host in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_HOSTS', '').split(','))):
+    DATABASES['replica{}'.format(index + 1)] = {**DATABASES['default'], 'HOST': host, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append('replica{}'.format(index + 1))
+
+# Never routed to unless listed in DATABASE_REPLICAS. Tests list it to check the routing, with a mirror of default.
+DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['complimentapi.db_routers.ReplicaRouter']
+
+REPLICA_PIN_CACHE = 'default'
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 10))
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+# Every worker process has to see the same entries: an invalidated sampling table must be gone for all of them. Redis
+# by default, with docker-compose's cache and sampling-cache services. Only the sampling cache evicts entries when it
+# is full, the default cache holds throttle buckets, replica pins, validators and idempotency records, which must stay.
+# A process-local backend like LocMemCache fails the complimentapi.E001 check, silence it only for a single process
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.redis.RedisCache')
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://cache:6379')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get('CACHE_LOCATION', REDIS_URL + '/0'),
+    },
+    # A Redis instance of its own, whose eviction policy can't drop any of the default cache's entries
+    'sampling': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get('SAMPLING_CACHE_LOCATION', 'redis://sampling-cache:6379'),
+        'KEY_PREFIX': 'sampling',
+    },
+}
+
+# Holds the ETag/Last-Modified validators of the receiver and compliment endpoints, see complimentapi.validators
+VALIDATOR_CACHE = 'default'
+
+# Holds the responses replayed for retried compliment creations with an Idempotency-Key, see complimentapi.idempotency
+IDEMPOTENCY_CACHE = 'default'
+IDEMPOTENCY_KEY_SECONDS = 24 * 60 * 60
+
+# Token bucket rates per route name for each user, or IP address when anonymous, see complimentapi.throttling. Routes
+# not listed use 'default', without it they aren't throttled
+THROTTLE_RATES = {
+    'default': '600/min',
+    'auth-login': '30/min',
+    'auth-oauth-callback': '10/min',
+    'receivers-random-compliment': '120/min',
+    'receivers-random-compliment-list': '60/min',
+    'receivers-random-digest': '60/min',
+    'receivers-export': '10/hour',
+    'receivers-bulk': '30/hour',
+    'receivers-stats': '120/min',
+    'compliments-bulk': '30/hour',
+    'compliments-search': '120/min',
+    'batch': '120/min',
+}
+THROTTLE_CACHE = 'default'
+# Refill periods after which an idle bucket is dropped
+THROTTLE_BUCKET_PERIODS = 10
+
+SAMPLING_TABLE_CACHE = 'sampling'
+SAMPLING_TABLE_TIMEOUT = 60 * 60
+# Every random compliment reads its receiver's whole table from the cache, 8 bytes per compliment, so larger receivers
+# are sampled from the database instead
+SAMPLING_TABLE_MAX_SIZE = 5000
+# Those are sampled through a rank index, the key of every SAMPLING_RANK_INDEX_STEP-th compliment at 16 bytes per key.
+# A random compliment skips less than a step of rows after the key. Indexes aren't patched on retrievals, so they are
+# rebuilt more often than sampling tables
+SAMPLING_RANK_INDEX_STEP = 100
+SAMPLING_RANK_INDEX_TIMEOUT = 5 * 60
+
+# 'weighted' picks compliments at random, favouring the least recently retrieved ones. 'rotation' always hands out the
+# least recently retrieved compliments, locking them so concurrent requests get different ones.
+COMPLIMENT_SELECTION_MODE = os.environ.get('COMPLIMENT_SELECTION_MODE', 'weighted')
+# Most compliments a single random-compliment-list request returns
+RANDOM_COMPLIMENT_LIST_MAX_SIZE = 100
+
+# List endpoints serialize pages from .values() rows instead of model instances, see complimentapi.serializers
+FAST_SERIALIZATION = os.environ.get('FAST_SERIALIZATION', '1') == '1'
+
+# Rows per INSERT, and at most how many invalid rows are reported, for POST /receivers/{id}/compliments/bulk
+COMPLIMENT_IMPORT_BATCH_SIZE = 500
+COMPLIMENT_IMPORT_MAX_ERRORS = 100
+
+# Compliments deleted per statement and transaction when deleting receivers or in bulk, and at most how many ids a
+# bulk DELETE takes
+COMPLIMENT_DELETE_BATCH_SIZE = 1000
+BULK_DELETE_MAX_IDS = 1000
+
+# Operations a single POST /batch can run
+BATCH_MAX_OPERATIONS = 25
+
+# Query terms GET /compliments/search looks up, the rest are ignored
+SEARCH_MAX_TERMS = 10
+
+# Rows fetched per round trip by GET /receivers/export, and lines sent per hop to the worker thread under ASGI
+EXPORT_CHUNK_SIZE = 2000
+
+# Compliment retrievals are written behind, see complimentapi.retrievals
+RETRIEVAL_FLUSH_INTERVAL = float(os.environ.get('RETRIEVAL_FLUSH_INTERVAL', 5))
+RETRIEVAL_FLUSH_SIZE = int(os.environ.get('RETRIEVAL_FLUSH_SIZE', 500))
+# Retrievals are also counted per compliment and hour. compact_retrieval_counts merges hourly counts older than
+# RETRIEVAL_HOURLY_DAYS into daily ones and drops daily ones older than RETRIEVAL_DAILY_DAYS, which is as far back as
+# GET /receivers/{id}/stats goes
+RETRIEVAL_HOURLY_DAYS = int(os.environ.get('RETRIEVAL_HOURLY_DAYS', 7))
+RETRIEVAL_DAILY_DAYS = int(os.environ.get('RETRIEVAL_DAILY_DAYS', 365))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -150,8 +276,20 @@ LOGGING = {
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'complimentapi.authentication.StatelessJWTAuthentication',
+    ),
+    # orjson-backed when installed, with the same output as JSONRenderer
+    'DEFAULT_RENDERER_CLASSES': (
+        'complimentapi.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'complimentapi.pagination.IdCursorPagination',
+    # Token buckets per route, see THROTTLE_RATES
+    'DEFAULT_THROTTLE_CLASSES': (
+        'complimentapi.throttling.TokenBucketThrottle',
+    ),
+    # Clients can ask for up to 1000 with the page_size query param
+    'PAGE_SIZE': 100,
 }
 
 SIMPLE_JWT = {
@@ -177,7 +315,7 @@ SIMPLE_JWT = {
 
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
-    'TOKEN_USER_CLASS': 'rest_framework_simplejwt.models.TokenUser',
+    'TOKEN_USER_CLASS': 'complimentapi.authentication.LazyTokenUser',
 
     'JTI_CLAIM': 'jti',
 
@@ -186,6 +324,20 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# How long users loaded by LazyTokenUser stay cached, 0 disables the cache
+TOKEN_USER_CACHE_TIMEOUT = 60
+
+GOOGLE_OAUTH_TOKEN_URL = os.environ.get('GOOGLE_OAUTH_TOKEN_URL', 'https://oauth2.googleapis.com/token')
+GOOGLE_OAUTH_USERINFO_URL = os.environ.get('GOOGLE_OAUTH_USERINFO_URL', 'https://www.googleapis.com/userinfo/v2/me')
+GOOGLE_OAUTH_CERTS_URL = os.environ.get('GOOGLE_OAUTH_CERTS_URL', 'https://www.googleapis.com/oauth2/v3/certs')
+GOOGLE_OAUTH_ISSUERS = ['https://accounts.google.com', 'accounts.google.com']
+GOOGLE_OAUTH_VERIFY_ID_TOKEN = True
+# Seconds, for every request made to Google
+GOOGLE_OAUTH_TIMEOUT = 5
+GOOGLE_OAUTH_MAX_CONNECTIONS = 20
+# How long signing keys are kept when Google's response has no max-age
+GOOGLE_OAUTH_CERTS_TIMEOUT = 60 * 60
+
 REST_AUTH_SERIALIZERS = {
     'USER_DETAILS_SERIALIZER': 'complimentapi.serializers.UserSerializer',
 }
@@ -0,0 +1,47 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from complimentapi.authentication import forget_token_user
+from complimentapi.instrumentation import record_query
+from complimentapi.models import Receiver, Compliment, User
+from complimentapi.sampling import invalidate_sampling_table, move_to_back
+from complimentapi.search import index_compliments
+from complimentapi.validators import compliments_changed, receivers_changed
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance: User, **kwargs):
+    forget_token_user(instance.id)
+
+
+@receiver(post_save, sender=Receiver)
+@receiver(post_delete, sender=Receiver)
+def receiver_changed(sender, instance: Receiver, **kwargs):
+    receivers_changed(instance.user_id)
+
+
+@receiver(post_save, sender=Compliment)
+def compliment_saved(sender, instance: Compliment, created: bool, update_fields=None, **kwargs):
+    if not created and update_fields is not None and set(update_fields) == {'last_retrieved_at'}:
+        move_to_back(instance.receiver_id, [instance.id])
+    else:
+        invalidate_sampling_table(instance.receiver_id)
+        index_compliments([instance])
+
+    compliments_changed(instance.receiver_id)
+
+
+@receiver(post_delete, sender=Compliment)
+def compliment_deleted(sender, instance: Compliment, **kwargs):
+    invalidate_sampling_table(instance.receiver_id)
+    compliments_changed(instance.receiver_id)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # First in line, so wrappers pushed and popped around it by execute_wrapper() stay balanced. Reconnects reuse the
+    # same wrapper object.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
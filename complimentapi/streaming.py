@@ -0,0 +1,98 @@
+import csv
+import itertools
+import json
+from datetime import datetime
+from typing import IO, AsyncIterator, Iterable, Iterator, Optional, Sequence, Set, Tuple
+
+from asgiref.sync import sync_to_async
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def read_rows(stream: Optional[IO[bytes]], content_type: str) -> Iterator[Tuple[int, Optional[dict]]]:
+    """
+    Lazily read an uploaded NDJSON or CSV (with a header row) body, yielding (line number, row) pairs. Rows that can't
+    be parsed, or that aren't valid UTF-8, are yielded as None, so the caller can report them and carry on.
+    """
+    if stream is None:
+        return
+
+    invalid_lines: Set[int] = set()
+    lines = _decode_lines(stream, invalid_lines)
+
+    if content_type.startswith('text/csv'):
+        reader = csv.DictReader(lines)
+        last_line = 1
+        for row in reader:
+            # A quoted value can span lines, the row is invalid if any of them is
+            invalid = any(line in invalid_lines for line in range(last_line + 1, reader.line_num + 1))
+            last_line = reader.line_num
+            yield reader.line_num, None if invalid else row
+        return
+
+    for line_number, line in enumerate(lines, start=1):
+        if line_number in invalid_lines:
+            yield line_number, None
+            continue
+
+        if not line.strip():
+            continue
+
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+
+        yield line_number, row if isinstance(row, dict) else None
+
+
+def _decode_lines(stream: IO[bytes], invalid_lines: Set[int]) -> Iterator[str]:
+    # Decoded line by line, so a bad byte only spoils its own line. Those are still passed on, with replacement
+    # characters, for the CSV reader to keep counting lines, and their numbers are added to invalid_lines
+    for line_number, line in enumerate(stream, start=1):
+        try:
+            yield line.decode('utf-8')
+        except UnicodeDecodeError:
+            invalid_lines.add(line_number)
+            yield line.decode('utf-8', errors='replace')
+
+
+class _Echo:
+    """
+    A file-like object for csv.writer that hands each written line back instead of buffering it.
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def csv_lines(header: Sequence[str], rows: Iterable[Sequence]) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(['' if value is None else _format(value) for value in row])
+
+
+def ndjson_lines(records: Iterable[dict]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps(record, cls=JSONEncoder, ensure_ascii=False) + '\n'
+
+
+async def async_chunks(lines: Iterator[str], size: int) -> AsyncIterator[str]:
+    """
+    Serve `lines` from an ASGI response, `size` lines at a time. They are produced in the thread the request's sync
+    code runs in, where the ORM can run and the cursors opened by the view live.
+    """
+    next_chunk = sync_to_async(lambda: ''.join(itertools.islice(lines, size)), thread_sensitive=True)
+
+    while True:
+        chunk = await next_chunk()
+        if not chunk:
+            return
+
+        yield chunk
+
+
+def _format(value):
+    # Same datetime format as the API responses
+    return JSONEncoder().default(value) if isinstance(value, datetime) else value
@@ -0,0 +1,49 @@
+from django.test import Client, override_settings
+from django.urls import clear_url_caches
+
+from complimentapi.tests.utils import APITestCase
+
+
+class AsyncViewParityTests(APITestCase):
+    """
+    Error responses of the async views byte for byte against the DRF viewsets they stand in for.
+    """
+
+    def responses(self, client: Client, method: str, path: str):
+        responses = []
+
+        for urlconf in ('complimentapi.urls', 'complimentapi.async_urls'):
+            with override_settings(ROOT_URLCONF=urlconf):
+                clear_url_caches()
+                responses.append(getattr(client, method)(path))
+
+        clear_url_caches()
+        return responses
+
+    def assertSameResponse(self, client: Client, method: str, path: str, status: int, *headers: str):
+        drf, asynchronous = self.responses(client, method, path)
+        name = '{} {}'.format(method.upper(), path)
+
+        self.assertEqual(drf.status_code, status, name)
+        self.assertEqual(asynchronous.status_code, status, name)
+        self.assertEqual(asynchronous.content, drf.content, name)
+
+        for header in headers:
+            self.assertEqual(asynchronous[header], drf[header], name)
+
+    def test_method_not_allowed(self):
+        receiver = self.user.receivers.create(name='receiver')
+        path = '/receivers/{}'.format(receiver.id)
+
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertSameResponse(self.client, 'put', path, 405, 'Allow')
+            self.assertSameResponse(self.client, 'post', path, 405, 'Allow')
+            self.assertSameResponse(self.client, 'delete', '/receivers', 405, 'Allow')
+            self.assertSameResponse(self.client, 'put', path + '/compliments', 405, 'Allow')
+
+    def test_unauthorized(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertSameResponse(Client(), 'get', '/receivers', 401, 'WWW-Authenticate')
+            self.assertSameResponse(
+                Client(HTTP_AUTHORIZATION='Bearer invalid'), 'get', '/receivers', 401, 'WWW-Authenticate'
+            )
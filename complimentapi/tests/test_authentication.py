@@ -0,0 +1,73 @@
+from unittest import mock
+
+from django.test import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from complimentapi.authentication import LazyTokenUser
+from complimentapi.models import User
+from complimentapi.tests.utils import APITestCase, token_client
+
+
+class StatelessAuthenticationTests(APITestCase):
+    def test_authenticates_without_loading_the_user(self):
+        # The receivers query only
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/receivers').status_code, 200)
+
+    def test_user_is_loaded_once_and_cached(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/auth/me').json()['email'], 'test@example.com')
+
+        # Another token of the same user
+        with self.assertNumQueries(0):
+            self.assertEqual(token_client(self.user).get('/auth/me').json()['email'], 'test@example.com')
+
+    @override_settings(TOKEN_USER_CACHE_TIMEOUT=0)
+    def test_user_cache_can_be_turned_off(self):
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                self.client.get('/auth/me')
+
+    def test_token_user_loads_only_for_other_attributes(self):
+        user = LazyTokenUser(AccessToken.for_user(self.user))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(user.id, self.user.id)
+            self.assertTrue(user.is_authenticated)
+            self.assertFalse(hasattr(user, '_private'))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'test@example.com')
+            self.assertEqual(user.email, 'test@example.com')
+
+    def test_saving_the_user_drops_the_cached_one(self):
+        self.client.get('/auth/me')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Renamed'
+            self.user.save()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/auth/me').json()['first_name'], 'Renamed')
+
+    def test_deleted_users_fail_authentication(self):
+        self.client.get('/auth/me')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.client.get('/auth/me')
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['detail'], 'User not found')
+
+    def test_inactive_users_fail_authentication(self):
+        # Also when the user was cached while still active
+        self.client.get('/auth/me')
+
+        with mock.patch.object(User, 'is_active', False), self.assertLogs('django.request', 'WARNING'):
+            response = self.client.get('/auth/me')
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['detail'], 'User is inactive')
@@ -0,0 +1,149 @@
+from django.conf import settings
+from django.test import override_settings
+
+from complimentapi.models import Receiver, User
+from complimentapi.tests.utils import APITestCase
+
+
+class BatchTests(APITestCase):
+    def batch(self, *operations: dict, atomic: bool = False, **headers) -> dict:
+        response = self.client.post(
+            '/batch', {'operations': list(operations), 'atomic': atomic}, content_type='application/json', **headers
+        )
+        self.assertEqual(response.status_code, 200)
+
+        return response.json()
+
+    @staticmethod
+    def statuses(batch: dict):
+        return [result['status'] for result in batch['results']]
+
+    def test_operations_refer_to_earlier_results(self):
+        batch = self.batch(
+            {'method': 'POST', 'path': '/receivers', 'body': {'name': 'Batched'}},
+            {'method': 'POST', 'path': '/receivers/{{0.id}}/compliments', 'body': {'text': 'Created for {{0.name}}'}},
+            {'method': 'GET', 'path': '/receivers/{{0.id}}/random-compliment'},
+            {'method': 'PATCH', 'path': '/receivers/{{0.id}}', 'body': {'name': 'Renamed {{1.id}}'}},
+        )
+        receiver, compliment, random_compliment, renamed = [result['body'] for result in batch['results']]
+
+        self.assertEqual(self.statuses(batch), [200, 200, 200, 200])
+        self.assertFalse(batch['rolled_back'])
+        self.assertEqual(compliment['receiver'], receiver['id'])
+        self.assertEqual(compliment['text'], 'Created for Batched')
+        self.assertEqual(random_compliment['id'], compliment['id'])
+        self.assertEqual(renamed['name'], 'Renamed {}'.format(compliment['id']))
+
+    def test_unresolvable_references_fail_their_operation(self):
+        batch = self.batch(
+            {'method': 'GET', 'path': '/receivers/{{1.id}}'},
+            {'method': 'POST', 'path': '/receivers', 'body': {}},
+            {'method': 'GET', 'path': '/receivers/{{1.id}}'},
+            {'method': 'GET', 'path': '/receivers/{{3.missing}}'},
+            {'method': 'GET', 'path': '/receivers'},
+            {'method': 'GET', 'path': '/receivers/{{4.missing}}'},
+        )
+
+        self.assertEqual(self.statuses(batch), [424, 400, 424, 424, 200, 424])
+
+    def test_failures_end_an_atomic_batch_and_roll_it_back(self):
+        batch = self.batch(
+            {'method': 'POST', 'path': '/receivers', 'body': {'name': 'Rolled back'}},
+            {'method': 'GET', 'path': '/receivers/0'},
+            {'method': 'POST', 'path': '/receivers', 'body': {'name': 'Never created'}},
+            atomic=True,
+        )
+
+        self.assertEqual(self.statuses(batch), [200, 404])
+        self.assertTrue(batch['rolled_back'])
+        self.assertFalse(Receiver.objects.exists())
+
+    def test_failures_dont_end_a_batch_that_isnt_atomic(self):
+        batch = self.batch(
+            {'method': 'GET', 'path': '/receivers/0'},
+            {'method': 'POST', 'path': '/receivers', 'body': {'name': 'Created'}},
+        )
+
+        self.assertEqual(self.statuses(batch), [404, 200])
+        self.assertFalse(batch['rolled_back'])
+        self.assertEqual(list(Receiver.objects.values_list('name', flat=True)), ['Created'])
+
+    def test_errors_in_views_fail_their_operation(self):
+        with self.assertLogs('django', 'ERROR'):
+            batch = self.batch(
+                {'method': 'POST', 'path': '/receivers', 'body': {'name': 'Created'}},
+                {'method': 'GET', 'path': '/receivers/abc'},
+                {'method': 'GET', 'path': '/receivers/{{0.id}}'},
+            )
+
+        self.assertEqual(self.statuses(batch), [200, 500, 200])
+        self.assertEqual(batch['results'][1]['body'], {'detail': 'A server error occurred.'})
+        self.assertEqual(list(Receiver.objects.values_list('name', flat=True)), ['Created'])
+
+    def test_errors_in_views_roll_back_an_atomic_batch(self):
+        with self.assertLogs('django', 'ERROR'):
+            batch = self.batch(
+                {'method': 'POST', 'path': '/receivers', 'body': {'name': 'Rolled back'}},
+                {'method': 'GET', 'path': '/receivers/abc'},
+                {'method': 'POST', 'path': '/receivers', 'body': {'name': 'Never created'}},
+                atomic=True,
+            )
+
+        self.assertEqual(self.statuses(batch), [200, 500])
+        self.assertTrue(batch['rolled_back'])
+        self.assertFalse(Receiver.objects.exists())
+
+    def test_bodies_must_be_objects(self):
+        batch = self.batch(
+            {'method': 'POST', 'path': '/receivers', 'body': ['name']},
+            {'method': 'POST', 'path': '/receivers', 'body': 'name'},
+            {'method': 'GET', 'path': '/receivers'},
+            {'method': 'POST', 'path': '/receivers', 'body': '{{2.results}}'},
+            {'method': 'POST', 'path': '/receivers', 'body': {'name': 'Created'}},
+        )
+
+        self.assertEqual(self.statuses(batch), [400, 400, 200, 400, 200])
+        self.assertEqual(list(Receiver.objects.values_list('name', flat=True)), ['Created'])
+
+    def test_operations_are_authorized_like_requests(self):
+        other_receiver = User.objects.create(email='other@example.com').receivers.create(name='other')
+
+        batch = self.batch({'method': 'GET', 'path': '/receivers/{}'.format(other_receiver.id)})
+
+        self.assertEqual(self.statuses(batch), [403])
+
+    def test_only_api_views_can_be_batched(self):
+        batch = self.batch(
+            {'method': 'POST', 'path': '/batch', 'body': {'operations': []}},
+            {'method': 'GET', 'path': '/metrics'},
+            {'method': 'GET', 'path': '/unknown'},
+            {'method': 'GET', 'path': '/receivers/export'},
+        )
+
+        self.assertEqual(self.statuses(batch), [404, 404, 404, 400])
+
+    def test_the_batch_idempotency_key_is_not_passed_on(self):
+        receiver = self.user.receivers.create(name='receiver')
+        path = '/receivers/{}/compliments'.format(receiver.id)
+
+        batch = self.batch(
+            {'method': 'POST', 'path': path, 'body': {'text': 'First'}},
+            {'method': 'POST', 'path': path, 'body': {'text': 'Second'}},
+            HTTP_IDEMPOTENCY_KEY='key',
+        )
+
+        self.assertEqual(self.statuses(batch), [200, 200])
+        self.assertEqual(receiver.compliments.count(), 2)
+
+    def test_operation_count_is_limited(self):
+        operations = [{'method': 'GET', 'path': '/receivers'}] * (settings.BATCH_MAX_OPERATIONS + 1)
+
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.client.post('/batch', {'operations': operations}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(ROOT_URLCONF='complimentapi.async_urls')
+class AsyncBatchTests(BatchTests):
+    pass
@@ -0,0 +1,37 @@
+from django.core.cache import caches
+from django.test import TransactionTestCase, override_settings
+
+from complimentapi.benchmarking import seed_receiver
+from complimentapi.management.commands.benchmark_endpoints import BULK_DELETE_IDS, Command
+from complimentapi.models import User
+from complimentapi.tests.utils import APITestCase
+
+
+class BenchmarkEndpointTests(APITestCase):
+    def test_every_endpoint_succeeds(self):
+        command = Command()
+        # Large enough for a bulk delete of the compliments after the single deletes
+        receivers = [seed_receiver(self.user, 10), seed_receiver(self.user, 2 + 2 * BULK_DELETE_IDS)]
+
+        for name, size, request, iterations in command.endpoints(self.client, self.user, receivers, 2):
+            with self.subTest(name, size=size):
+                statuses = command.measure(request, iterations)['statuses']
+
+                self.assertEqual(sum(statuses.values()), iterations)
+                self.assertTrue(all(int(status) < 400 for status in statuses), statuses)
+
+
+# The workers' connections only see committed rows
+@override_settings(THROTTLE_RATES={'default': '1000000/s'})
+class BenchmarkThroughputTests(TransactionTestCase):
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def test_a_rotation_hands_out_every_compliment_once(self):
+        # One worker, concurrent writers need SKIP LOCKED, see ConcurrentRotationTests
+        result = Command().throughput(User.objects.create(email='test@example.com'), 1, 20)
+
+        self.assertEqual(result['requests'], 20)
+        self.assertEqual(result['duplicates'], 0)
+        self.assertGreater(result['requests_per_s'], 0)
@@ -0,0 +1,104 @@
+from unittest import mock
+
+from django.db import IntegrityError, connection
+from django.test import override_settings
+
+from complimentapi.models import Compliment, ComplimentTerm
+from complimentapi.tests.utils import APITestCase
+
+
+class BulkImportTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.receiver = self.user.receivers.create(name='receiver')
+        self.receiver.compliments.create(text='Existing')
+        self.path = '/receivers/{}/compliments/bulk'.format(self.receiver.id)
+
+    def post(self, *texts: str):
+        body = ''.join('{{"text": "{}"}}\n'.format(text) for text in texts)
+        return self.client.post(self.path, body, content_type='application/x-ndjson')
+
+    def texts(self):
+        return sorted(self.receiver.compliments.values_list('text', flat=True))
+
+    @override_settings(COMPLIMENT_IMPORT_BATCH_SIZE=2)
+    def test_imports_new_compliments_in_batches(self):
+        response = self.post('First', 'existing', 'Second', 'first ', 'Third')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'created': 3, 'duplicate_count': 2, 'error_count': 0, 'errors': []})
+        self.assertEqual(self.texts(), ['Existing', 'First', 'Second', 'Third'])
+        self.assertTrue(ComplimentTerm.objects.filter(term='third').exists())
+
+    def test_imports_csv(self):
+        body = 'text,ignored\nFirst,x\n"Second, with a comma",y\nExisting,z\n'
+        response = self.client.post(self.path, body, content_type='text/csv')
+
+        self.assertEqual(response.json(), {'created': 2, 'duplicate_count': 1, 'error_count': 0, 'errors': []})
+        self.assertEqual(self.texts(), ['Existing', 'First', 'Second, with a comma'])
+
+    @override_settings(COMPLIMENT_IMPORT_MAX_ERRORS=2)
+    def test_invalid_rows_are_reported_and_skipped(self):
+        body = '{"text": "First"}\nnot json\n\n["text"]\n{"text": ""}\n{"text": "Second"}\n'
+        response = self.client.post(self.path, body, content_type='application/x-ndjson')
+        result = response.json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((result['created'], result['duplicate_count'], result['error_count']), (2, 0, 3))
+        # Only the first COMPLIMENT_IMPORT_MAX_ERRORS are listed, by line, blank lines counting
+        self.assertEqual([error['line'] for error in result['errors']], [2, 4])
+        self.assertEqual(self.texts(), ['Existing', 'First', 'Second'])
+
+    def test_lines_that_arent_utf8_are_reported_and_skipped(self):
+        body = b'{"text": "First"}\n{"text": "Caf\xe9"}\n{"text": "Second"}\n'
+        response = self.client.post(self.path, body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'created': 2, 'duplicate_count': 0, 'error_count': 1, 'errors': [{'line': 2, 'errors': ['Invalid row']}]
+        })
+        self.assertEqual(self.texts(), ['Existing', 'First', 'Second'])
+
+    def test_csv_lines_that_arent_utf8_are_reported_and_skipped(self):
+        body = b'text\nFirst\n"Caf\xe9,\nspanning lines"\nSecond\n'
+        response = self.client.post(self.path, body, content_type='text/csv')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'created': 2, 'duplicate_count': 0, 'error_count': 1, 'errors': [{'line': 4, 'errors': ['Invalid row']}]
+        })
+        self.assertEqual(self.texts(), ['Existing', 'First', 'Second'])
+
+    def test_empty_body_imports_nothing(self):
+        response = self.client.post(self.path, '', content_type='application/x-ndjson')
+
+        self.assertEqual(response.json(), {'created': 0, 'duplicate_count': 0, 'error_count': 0, 'errors': []})
+
+    def test_compliments_created_concurrently_are_duplicates(self):
+        raced = False
+
+        def race(execute, sql, params, many, context):
+            nonlocal raced
+            result = execute(sql, params, many, context)
+
+            # Another request creates one of the batch right after the import looked up which ones exist
+            if not raced and '"text_hash" IN' in sql:
+                raced = True
+                self.receiver.compliments.create(text='Second')
+
+            return result
+
+        with connection.execute_wrapper(race):
+            response = self.post('First', 'Second', 'Third')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'created': 2, 'duplicate_count': 1, 'error_count': 0, 'errors': []})
+        self.assertEqual(self.texts(), ['Existing', 'First', 'Second', 'Third'])
+        self.assertEqual(ComplimentTerm.objects.filter(term='first').count(), 1)
+
+    def test_other_conflicts_are_raised(self):
+        with mock.patch.object(Compliment.objects, 'bulk_create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError), self.assertLogs('django.request', 'ERROR'):
+                self.post('First')
+
+        self.assertEqual(self.texts(), ['Existing'])
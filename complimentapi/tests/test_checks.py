@@ -0,0 +1,65 @@
+from django.test import SimpleTestCase, override_settings
+
+from complimentapi.checks import check_evictable_caches, check_shared_caches
+
+LOCAL = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+SHARED = {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379'}
+SAMPLING = {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://sampling-cache:6379'}
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    @override_settings(CACHES={'default': SHARED, 'sampling': LOCAL})
+    def test_process_local_sampling_cache_is_an_error(self):
+        errors = check_shared_caches(None)
+
+        self.assertEqual([error.id for error in errors], ['complimentapi.E001'])
+        self.assertIn('SAMPLING_TABLE_CACHE', errors[0].msg)
+
+    @override_settings(CACHES={'default': SHARED, 'sampling': SHARED})
+    def test_shared_caches_pass(self):
+        self.assertEqual(check_shared_caches(None), [])
+
+    @override_settings(CACHES={'default': LOCAL, 'sampling': SHARED})
+    def test_process_local_replica_pin_cache_is_an_error(self):
+        errors = check_shared_caches(None)
+
+        self.assertIn('complimentapi.E001', [error.id for error in errors])
+        self.assertTrue(any('REPLICA_PIN_CACHE' in error.msg for error in errors))
+
+    @override_settings(CACHES={'default': LOCAL, 'sampling': SHARED}, REPLICA_PIN_CACHE='sampling')
+    def test_process_local_throttle_cache_is_an_error(self):
+        errors = check_shared_caches(None)
+
+        self.assertEqual([error.id for error in errors], ['complimentapi.E001'])
+        self.assertIn('THROTTLE_CACHE', errors[0].msg)
+
+
+class EvictableCacheCheckTests(SimpleTestCase):
+    @override_settings(CACHES={'default': SHARED, 'sampling': SAMPLING})
+    def test_sampling_cache_on_its_own_server_passes(self):
+        self.assertEqual(check_evictable_caches(None), [])
+
+    @override_settings(CACHES={
+        'default': {**SHARED, 'LOCATION': 'redis://localhost:6379/0'},
+        'sampling': {**SHARED, 'LOCATION': 'redis://localhost:6379/1'},
+    })
+    def test_sampling_cache_in_another_database_of_the_same_server_is_a_warning(self):
+        warnings = check_evictable_caches(None)
+
+        self.assertEqual({warning.id for warning in warnings}, {'complimentapi.W001'})
+        self.assertEqual(
+            [warning.msg.split()[0] for warning in warnings],
+            ['THROTTLE_CACHE', 'REPLICA_PIN_CACHE', 'IDEMPOTENCY_CACHE']
+        )
+
+    @override_settings(
+        CACHES={'default': SHARED, 'sampling': SAMPLING, 'durable': {**SAMPLING, 'LOCATION': [SHARED['LOCATION']]}},
+        SAMPLING_TABLE_CACHE='durable', THROTTLE_CACHE='default', REPLICA_PIN_CACHE='sampling',
+        IDEMPOTENCY_CACHE='sampling',
+    )
+    def test_servers_are_compared_across_lists_of_locations(self):
+        self.assertEqual([warning.msg.split()[0] for warning in check_evictable_caches(None)], ['THROTTLE_CACHE'])
+
+    @override_settings(CACHES={'default': LOCAL, 'sampling': LOCAL})
+    def test_other_backends_are_not_checked(self):
+        self.assertEqual(check_evictable_caches(None), [])
@@ -0,0 +1,88 @@
+from django.test import override_settings
+
+from complimentapi.benchmarking import seed_receiver
+from complimentapi.models import User
+from complimentapi.tests.utils import APITestCase, token_client
+
+
+class ConditionalRequestTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.receiver = seed_receiver(self.user, 3)
+        self.path = '/receivers/{}'.format(self.receiver.id)
+        self.compliment_path = '{}/compliments/{}'.format(self.path, self.receiver.compliments.first().id)
+
+    def assertNotModified(self, path: str, etag: str):
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def assertModified(self, path: str, etag: str) -> str:
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        return response['ETag']
+
+    def write(self, method: str, path: str, data=None):
+        # Validators are replaced once the write commits
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(path, data, content_type='application/json')
+
+        self.assertLess(response.status_code, 400)
+
+    def test_unchanged_lists_are_not_modified_without_queries(self):
+        for path in ('/receivers', self.path + '/compliments'):
+            with self.subTest(path):
+                response = self.client.get(path)
+                self.assertIn('Last-Modified', response)
+
+                # The compliment list still checks that the receiver is the user's
+                with self.assertNumQueries(0 if path == '/receivers' else 1):
+                    self.assertNotModified(path, response['ETag'])
+
+    def test_unchanged_objects_are_not_modified(self):
+        for path in (self.path, self.compliment_path):
+            with self.subTest(path):
+                self.assertNotModified(path, self.client.get(path)['ETag'])
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get(self.path)['Last-Modified']
+
+        self.assertEqual(self.client.get(self.path, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_writes_change_the_validators(self):
+        receivers_etag = self.client.get('/receivers')['ETag']
+        compliments_etag = self.client.get(self.path + '/compliments')['ETag']
+        compliment_etag = self.client.get(self.compliment_path)['ETag']
+
+        self.write('post', self.path + '/compliments', {'text': 'A new one'})
+        compliments_etag = self.assertModified(self.path + '/compliments', compliments_etag)
+        self.assertNotModified('/receivers', receivers_etag)
+
+        self.write('patch', self.compliment_path, {'text': 'Edited'})
+        self.assertModified(self.compliment_path, compliment_etag)
+        compliments_etag = self.assertModified(self.path + '/compliments', compliments_etag)
+
+        self.write('patch', self.path, {'name': 'Renamed'})
+        receivers_etag = self.assertModified('/receivers', receivers_etag)
+
+        self.write('delete', self.compliment_path)
+        self.assertModified(self.path + '/compliments', compliments_etag)
+
+    def test_other_users_writes_keep_the_validators(self):
+        etag = self.client.get('/receivers')['ETag']
+
+        other_client = token_client(User.objects.create(email='other@example.com'))
+        with self.captureOnCommitCallbacks(execute=True):
+            other_client.post('/receivers', {'name': 'Other'}, content_type='application/json')
+
+        self.assertNotModified('/receivers', etag)
+
+
+@override_settings(ROOT_URLCONF='complimentapi.async_urls')
+class AsyncConditionalRequestTests(ConditionalRequestTests):
+    pass
@@ -0,0 +1,149 @@
+from unittest import mock
+
+from django.core.cache import caches
+from django.db import connections
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+from complimentapi.authentication import StatelessJWTAuthentication
+from complimentapi.benchmarking import seed_receiver
+from complimentapi.db_routers import ReplicaRouter, replica_pinning_middleware
+from complimentapi.models import Receiver, User
+from complimentapi.tests.utils import token_client
+from complimentapi.validators import compliments_changed
+
+
+# Outside a TestCase transaction, whose atomic block would send every read to default
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaPinningTests(SimpleTestCase):
+    router = ReplicaRouter()
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def request(self, authorization: str = None, write: bool = False) -> str:
+        """
+        Runs a request through replica_pinning_middleware, optionally writing, and returns where a read after that
+        went.
+        """
+        def get_response(request):
+            try:
+                StatelessJWTAuthentication().authenticate(request)
+            except AuthenticationFailed:
+                pass
+
+            if write:
+                self.router.db_for_write(Receiver)
+
+            return self.router.db_for_read(Receiver)
+
+        headers = {'HTTP_AUTHORIZATION': authorization} if authorization else {}
+        return replica_pinning_middleware(get_response)(RequestFactory().get('/receivers', **headers))
+
+    @staticmethod
+    def bearer(user_id: int) -> str:
+        return 'Bearer {}'.format(AccessToken.for_user(User(id=user_id)))
+
+    def test_reads_go_to_replicas(self):
+        self.assertEqual(self.request(self.bearer(1)), 'replica1')
+
+    def test_a_write_pins_the_rest_of_the_request(self):
+        self.assertEqual(self.request(self.bearer(1), write=True), 'default')
+
+    def test_a_write_pins_every_token_of_the_user(self):
+        self.request(self.bearer(1), write=True)
+
+        self.assertEqual(self.request(self.bearer(1)), 'default')
+        self.assertEqual(self.request(self.bearer(2)), 'replica1')
+
+    @override_settings(REPLICA_PIN_SECONDS=0)
+    def test_pins_expire(self):
+        self.request(self.bearer(1), write=True)
+
+        self.assertEqual(self.request(self.bearer(1)), 'replica1')
+
+    def test_requests_without_a_valid_token_read_from_default(self):
+        self.assertEqual(self.request(), 'default')
+        self.assertEqual(self.request('Bearer invalid'), 'default')
+        self.assertEqual(self.request('Bearer two parts'), 'default')
+
+
+# The replica alias mirrors default in tests, so both connections see the same rows, and committed ones at that
+@override_settings(DATABASE_REPLICAS=['replica'], THROTTLE_RATES={'default': '1000000/s'})
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+        # Validators issued long ago, which don't send reads to default on their own
+        self.old_validators = mock.patch('complimentapi.validators._new_validator', return_value=('old', 0.0))
+        self.old_validators.start()
+        self.addCleanup(mock.patch.stopall)
+
+        self.user = User.objects.create(email='test@example.com')
+        self.receiver = seed_receiver(self.user, 3)
+
+        self.client = token_client(self.user)
+        self.path = '/receivers/{}/compliments'.format(self.receiver.id)
+
+    def get(self, client, path: str):
+        """
+        Returns the queries a GET ran on default and on the replica.
+        """
+        with CaptureQueriesContext(connections['default']) as default, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            self.assertEqual(client.get(path).status_code, 200)
+
+        return default.captured_queries, replica.captured_queries
+
+    def test_reads_go_to_the_replica(self):
+        default, replica = self.get(self.client, self.path)
+
+        self.assertEqual(default, [])
+        self.assertNotEqual(replica, [])
+
+    def test_reads_after_a_write_go_to_default(self):
+        other_user = User.objects.create(email='other@example.com')
+        other_path = '/receivers/{}/compliments'.format(seed_receiver(other_user, 1).id)
+
+        response = self.client.post(self.path, {'text': 'New'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        default, replica = self.get(self.client, '/receivers')
+        self.assertNotEqual(default, [])
+        self.assertEqual(replica, [])
+
+        # Only the user who wrote is pinned
+        default, replica = self.get(token_client(other_user), other_path)
+        self.assertEqual(default, [])
+        self.assertNotEqual(replica, [])
+
+    def test_lists_with_rotated_validators_read_from_default(self):
+        # Like the retrieval counts flushed in the background, which pin no one
+        self.old_validators.stop()
+        compliments_changed(self.receiver.id)
+
+        default, replica = self.get(self.client, self.path)
+
+        # The receiver was looked up before the validator was read, the compliments after
+        self.assertTrue(any('"complimentapi_compliment"' in query['sql'] for query in default))
+        self.assertFalse(any('"complimentapi_compliment"' in query['sql'] for query in replica))
+
+    @override_settings(REPLICA_PIN_SECONDS=0)
+    def test_rotated_validators_stop_reading_from_default(self):
+        self.old_validators.stop()
+        compliments_changed(self.receiver.id)
+
+        default, replica = self.get(self.client, self.path)
+
+        self.assertEqual(default, [])
+        self.assertNotEqual(replica, [])
+
+
+@override_settings(ROOT_URLCONF='complimentapi.async_urls')
+class AsyncReplicaRoutingTests(ReplicaRoutingTests):
+    pass
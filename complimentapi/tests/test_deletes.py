@@ -0,0 +1,79 @@
+from django.test import override_settings
+from django.utils import timezone
+
+from complimentapi.models import Compliment, ComplimentTerm, Receiver, RetrievalCount, User
+from complimentapi.tests.utils import APITestCase
+
+
+# Small batches, so deletes span several of them
+@override_settings(COMPLIMENT_DELETE_BATCH_SIZE=2)
+class DeleteTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.receiver = self.create_receiver(self.user, 5)
+        self.other_receiver = self.create_receiver(self.user, 2)
+        self.others_receiver = self.create_receiver(User.objects.create(email='other@example.com'), 2)
+
+    @staticmethod
+    def create_receiver(user: User, compliment_count: int) -> Receiver:
+        receiver = user.receivers.create(name='receiver')
+
+        for index in range(compliment_count):
+            compliment = receiver.compliments.create(text='Compliment number {}'.format(index))
+            RetrievalCount.objects.create(
+                receiver=receiver, compliment=compliment, period=RetrievalCount.Period.HOUR,
+                starts_at=timezone.now().replace(minute=0, second=0, microsecond=0), count=1
+            )
+
+        return receiver
+
+    def assertRemaining(self, *receivers: Receiver):
+        """
+        Only the compliments of `receivers` are left, with their postings and retrieval counts.
+        """
+        compliment_ids = set(Compliment.objects.filter(receiver__in=receivers).values_list('id', flat=True))
+
+        self.assertEqual(set(Compliment.objects.values_list('id', flat=True)), compliment_ids)
+        self.assertEqual(set(ComplimentTerm.objects.values_list('compliment_id', flat=True)), compliment_ids)
+        self.assertEqual(set(RetrievalCount.objects.values_list('compliment_id', flat=True)), compliment_ids)
+
+    def test_delete_receiver(self):
+        response = self.client.delete('/receivers/{}'.format(self.receiver.id))
+
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Receiver.objects.filter(id=self.receiver.id).exists())
+        self.assertRemaining(self.other_receiver, self.others_receiver)
+
+    def test_bulk_delete_receivers_ignores_other_users_receivers(self):
+        response = self.client.delete('/receivers/bulk', {
+            'ids': [self.receiver.id, self.others_receiver.id, 0]
+        }, content_type='application/json')
+
+        self.assertEqual(response.json(), {'deleted': 1})
+        self.assertRemaining(self.other_receiver, self.others_receiver)
+
+    def test_bulk_delete_compliments_ignores_other_receivers_compliments(self):
+        ids = list(self.receiver.compliments.values_list('id', flat=True)[:3])
+        other_id = self.other_receiver.compliments.first().id
+
+        response = self.client.delete('/receivers/{}/compliments/bulk'.format(self.receiver.id), {
+            'ids': [*ids, other_id, 0]
+        }, content_type='application/json')
+
+        self.assertEqual(response.json(), {'deleted': 3})
+        self.assertEqual(self.receiver.compliments.count(), 2)
+        self.assertFalse(Compliment.objects.filter(id__in=ids).exists())
+        self.assertFalse(ComplimentTerm.objects.filter(compliment_id__in=ids).exists())
+        self.assertFalse(RetrievalCount.objects.filter(compliment_id__in=ids).exists())
+        self.assertTrue(Compliment.objects.filter(id=other_id).exists())
+
+    def test_deleted_compliments_are_no_longer_sampled(self):
+        path = '/receivers/{}'.format(self.receiver.id)
+        # Builds the receiver's sampling table
+        self.client.get(path + '/random-compliment-list?number=5')
+
+        ids = list(self.receiver.compliments.values_list('id', flat=True)[:4])
+        self.client.delete(path + '/compliments/bulk', {'ids': ids}, content_type='application/json')
+
+        sampled = [compliment['id'] for compliment in self.client.get(path + '/random-compliment-list?number=5').json()]
+        self.assertEqual(sampled, list(self.receiver.compliments.values_list('id', flat=True)))
@@ -0,0 +1,62 @@
+from django.core.cache import caches
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.dateparse import parse_datetime
+
+from complimentapi.benchmarking import seed_receiver
+from complimentapi.models import User
+from complimentapi.tests.utils import APITestCase
+
+
+class RandomDigestTests(APITestCase):
+    path = '/receivers/random-digest'
+
+    def setUp(self):
+        super().setUp()
+        self.receivers = [seed_receiver(self.user, size) for size in (3, 8)]
+        self.user.receivers.create(name='empty')
+        seed_receiver(User.objects.create(email='other@example.com'), 3)
+
+    def assertOnePerReceiver(self, compliments):
+        self.assertEqual([compliment['receiver'] for compliment in compliments], [r.id for r in self.receivers])
+
+    def cold_query_count(self) -> int:
+        for cache in caches.all():
+            cache.clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(self.path).status_code, 200)
+
+        return len(queries)
+
+    def test_one_compliment_per_receiver_with_compliments(self):
+        self.assertOnePerReceiver(self.client.get(self.path).json())
+
+    @override_settings(SAMPLING_TABLE_MAX_SIZE=5)
+    def test_receivers_without_a_sampling_table_are_included(self):
+        self.assertOnePerReceiver(self.client.get(self.path).json())
+
+    def test_user_without_receivers_gets_an_empty_digest(self):
+        self.user.receivers.all().delete()
+
+        self.assertEqual(self.client.get(self.path).json(), [])
+
+    def test_query_count_does_not_grow_with_receivers(self):
+        for sampling_table_max_size in (5, 5000):
+            with self.subTest(sampling_table_max_size=sampling_table_max_size):
+                with override_settings(SAMPLING_TABLE_MAX_SIZE=sampling_table_max_size):
+                    query_count = self.cold_query_count()
+                    self.receivers += [seed_receiver(self.user, 8) for _ in range(5)]
+
+                    self.assertEqual(self.cold_query_count(), query_count)
+
+    def test_retrievals_are_recorded(self):
+        before = {r.id: set(r.compliments.values_list('last_retrieved_at', flat=True)) for r in self.receivers}
+
+        for compliment in self.client.get(self.path).json():
+            path = '/receivers/{}/compliments/{}'.format(compliment['receiver'], compliment['id'])
+            last_retrieved_at = self.client.get(path).json()['last_retrieved_at']
+
+            self.assertEqual(last_retrieved_at, compliment['last_retrieved_at'])
+            self.assertNotIn(parse_datetime(last_retrieved_at), before[compliment['receiver']])
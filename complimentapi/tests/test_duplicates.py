@@ -0,0 +1,97 @@
+from django.test import SimpleTestCase, override_settings
+
+from complimentapi.models import Compliment, compliment_text_hash
+from complimentapi.serializers import DUPLICATE_TEXT_ERRORS
+from complimentapi.tests.utils import APITestCase
+
+
+class ComplimentTextHashTests(SimpleTestCase):
+    def test_case_and_whitespace_are_ignored(self):
+        self.assertEqual(compliment_text_hash('You are  GREAT\n'), compliment_text_hash('you are great'))
+        self.assertEqual(compliment_text_hash('ﬁne'), compliment_text_hash('FINE'))
+        self.assertNotEqual(compliment_text_hash('You are great'), compliment_text_hash('You are great!'))
+
+
+class DuplicateComplimentTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.receiver = self.user.receivers.create(name='receiver')
+        self.path = '/receivers/{}/compliments'.format(self.receiver.id)
+
+    def post(self, text: str, **headers):
+        response = self.client.post(self.path, {'text': text}, content_type='application/json', **headers)
+        self.assertLess(response.status_code, 300)
+
+        return response.json()
+
+    def test_creating_a_duplicate_returns_the_existing_compliment(self):
+        first = self.post('You are great')
+
+        self.assertEqual(self.post('  you ARE great ')['id'], first['id'])
+        self.assertEqual(self.receiver.compliments.count(), 1)
+
+    def test_other_receivers_can_have_the_same_text(self):
+        other_receiver = self.user.receivers.create(name='other')
+        self.post('You are great')
+
+        response = self.client.post(
+            '/receivers/{}/compliments'.format(other_receiver.id), {'text': 'You are great'},
+            content_type='application/json'
+        )
+
+        self.assertEqual(other_receiver.compliments.count(), 1)
+        self.assertEqual(response.json()['receiver'], other_receiver.id)
+
+    def test_editing_into_a_duplicate_is_rejected(self):
+        self.post('You are great')
+        other = self.post('You are kind')
+
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.client.patch(
+                '{}/{}'.format(self.path, other['id']), {'text': 'YOU ARE GREAT'}, content_type='application/json'
+            )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), DUPLICATE_TEXT_ERRORS)
+
+    def test_retries_with_an_idempotency_key_replay_the_first_response(self):
+        first = self.post('You are great', HTTP_IDEMPOTENCY_KEY='key')
+        self.client.patch('{}/{}'.format(self.path, first['id']), {'text': 'Edited'}, content_type='application/json')
+
+        self.assertEqual(self.post('You are great', HTTP_IDEMPOTENCY_KEY='key'), first)
+
+    def test_reusing_an_idempotency_key_for_another_text_is_rejected(self):
+        self.post('You are great', HTTP_IDEMPOTENCY_KEY='key')
+
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.client.post(
+                self.path, {'text': 'You are kind'}, content_type='application/json', HTTP_IDEMPOTENCY_KEY='key'
+            )
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.receiver.compliments.count(), 1)
+
+    def test_legacy_duplicates_can_be_edited(self):
+        # As migrated, the oldest copy of a duplicate got the hash and later copies kept a null one
+        self.post('You are great')
+        duplicate, = Compliment.objects.bulk_create([Compliment(receiver=self.receiver, text='You are great')])
+
+        response = self.client.patch(
+            '{}/{}'.format(self.path, duplicate.id), {'last_retrieved_at': '2022-01-01T00:00:00Z'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        duplicate.refresh_from_db()
+        self.assertIsNone(duplicate.text_hash)
+
+        response = self.client.patch(
+            '{}/{}'.format(self.path, duplicate.id), {'text': 'You are kind'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        duplicate.refresh_from_db()
+        self.assertEqual(duplicate.text_hash, compliment_text_hash('You are kind'))
+
+
+@override_settings(ROOT_URLCONF='complimentapi.async_urls')
+class AsyncDuplicateComplimentTests(DuplicateComplimentTests):
+    pass
@@ -0,0 +1,79 @@
+import csv
+import json
+from io import StringIO
+from typing import List
+
+from django.test import override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from complimentapi.models import User
+from complimentapi.serializers import ComplimentSerializer, ReceiverSerializer
+from complimentapi.tests.utils import APITestCase
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.receiver = self.user.receivers.create(name='receiver')
+        self.compliments = [self.receiver.compliments.create(text=text) for text in ('First', 'Second, "quoted"')]
+        self.empty_receiver = self.user.receivers.create(name='empty')
+        User.objects.create(email='other@example.com').receivers.create(name='other').compliments.create(text='Other')
+
+    def expected_records(self):
+        receiver, empty_receiver = (
+            {'type': 'receiver', **{key: value for key, value in ReceiverSerializer(r).data.items() if key != 'user'}}
+            for r in (self.receiver, self.empty_receiver)
+        )
+
+        return [
+            receiver,
+            *[{'type': 'compliment', **ComplimentSerializer(compliment).data} for compliment in self.compliments],
+            empty_receiver,
+        ]
+
+    def test_exports_receivers_and_compliments_as_ndjson(self):
+        response = self.client.get('/receivers/export')
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(records, self.expected_records())
+
+    def test_exports_csv(self):
+        response = self.client.get('/receivers/export?type=csv')
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(
+            [(row['receiver_id'], row['compliment_id'], row['compliment_text']) for row in rows],
+            [
+                (str(self.receiver.id), str(self.compliments[0].id), 'First'),
+                (str(self.receiver.id), str(self.compliments[1].id), 'Second, "quoted"'),
+                (str(self.empty_receiver.id), '', ''),
+            ]
+        )
+
+    async def get_under_asgi(self, path: str) -> List[bytes]:
+        token = RefreshToken.for_user(self.user).access_token
+        response = await self.async_client.get(path, AUTHORIZATION='Bearer {}'.format(token))
+
+        # Streamed from an async iterator, the ORM can't run where ASGI iterates the response
+        self.assertTrue(response.is_async)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+        return [chunk async for chunk in response.streaming_content]
+
+    async def test_exports_under_asgi(self):
+        chunks = await self.get_under_asgi('/receivers/export')
+
+        records = [json.loads(line) for line in b''.join(chunks).decode().splitlines()]
+        self.assertEqual(records, self.expected_records())
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    async def test_exports_under_asgi_in_chunks(self):
+        chunks = await self.get_under_asgi('/receivers/export')
+
+        # Two lines per chunk, the export isn't read in full before the first is sent
+        self.assertEqual([chunk.decode().count('\n') for chunk in chunks], [2, 2])
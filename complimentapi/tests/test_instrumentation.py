@@ -0,0 +1,95 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from complimentapi.benchmarking import seed_receiver
+from complimentapi.instrumentation import RequestMetrics, RouteHistograms
+from complimentapi.tests.utils import APITestCase
+
+
+class RouteHistogramTests(SimpleTestCase):
+    def test_renders_cumulative_buckets_and_totals(self):
+        histograms = RouteHistograms()
+        metrics = RequestMetrics()
+        metrics.db_queries = 2
+
+        for duration in (0.003, 0.02, 0.02, 20):
+            histograms.observe('receivers-list', 'GET', duration, metrics)
+
+        lines = histograms.render().splitlines()
+        labels = 'route="receivers-list",method="GET"'
+
+        self.assertIn('http_request_duration_seconds_bucket{{{},le="0.005"}} 1'.format(labels), lines)
+        self.assertIn('http_request_duration_seconds_bucket{{{},le="0.025"}} 3'.format(labels), lines)
+        self.assertIn('http_request_duration_seconds_bucket{{{},le="10.0"}} 3'.format(labels), lines)
+        self.assertIn('http_request_duration_seconds_bucket{{{},le="+Inf"}} 4'.format(labels), lines)
+        self.assertIn('http_request_duration_seconds_count{{{}}} 4'.format(labels), lines)
+        self.assertIn('http_request_db_queries_total{{{}}} 8.0'.format(labels), lines)
+
+
+@override_settings(METRICS_TOKEN='secret')
+class RequestMetricsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.receiver = seed_receiver(self.user, 5)
+
+        patcher = mock.patch('complimentapi.instrumentation.route_histograms', RouteHistograms())
+        self.histograms = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_server_timing_counts_the_requests_queries(self):
+        for path in ('/receivers', '/receivers/{}/random-compliment-list'.format(self.receiver.id)):
+            with self.subTest(path), CaptureQueriesContext(connection) as queries:
+                server_timing = self.client.get(path)['Server-Timing']
+
+                self.assertIn('db;dur=', server_timing)
+                self.assertIn('desc="{} queries"'.format(len(queries)), server_timing)
+                self.assertRegex(server_timing, r'^total;dur=[\d.]+, .*serialize;dur=[\d.]+, auth;dur=[\d.]+$')
+
+    def metrics(self) -> str:
+        return self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').content.decode()
+
+    def test_requests_are_recorded_by_route(self):
+        self.client.get('/receivers')
+        self.client.get('/receivers/{}'.format(self.receiver.id))
+
+        body = self.metrics()
+
+        self.assertIn('http_request_duration_seconds_count{route="receivers-list",method="GET"} 1', body)
+        self.assertIn('http_request_duration_seconds_count{route="receivers-detail",method="GET"} 1', body)
+
+    def test_unknown_methods_are_recorded_as_other(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            self.client.generic('PROPFIND', '/receivers')
+            self.client.generic('MADE-UP', '/receivers')
+
+        body = self.metrics()
+
+        self.assertIn('http_request_duration_seconds_count{route="receivers-list",method="OTHER"} 2', body)
+        self.assertNotIn('PROPFIND', body)
+
+    def test_requests_without_a_route_are_not_recorded(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.client.get('/unknown')
+
+        self.assertIn('Server-Timing', response)
+        self.assertNotIn('http_request_duration_seconds_count', self.metrics())
+
+    def test_metrics_token(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer other').status_code, 401)
+
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_metrics_are_not_served_without_a_token(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+
+@override_settings(ROOT_URLCONF='complimentapi.async_urls')
+class AsyncRequestMetricsTests(RequestMetricsTests):
+    pass
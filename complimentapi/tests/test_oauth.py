@@ -0,0 +1,171 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from unittest import mock
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.test import override_settings
+
+from complimentapi import oauth
+from complimentapi.models import User
+from complimentapi.tests.utils import APITestCase
+
+# (status, content type, body) per path, or a callable returning one
+Route = Tuple[int, str, bytes]
+
+
+class StubProvider(ThreadingHTTPServer):
+    """
+    A local stand-in for Google's token, userinfo and certs endpoints. Records the client port of every request, so
+    tests can tell whether connections were reused.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.routes: Dict[str, Callable[[], Route]] = {}
+        self.client_ports: List[int] = []
+
+    def url(self, path: str) -> str:
+        return 'http://127.0.0.1:{}{}'.format(self.server_address[1], path)
+
+    def handle_error(self, request, client_address):
+        # Clients that timed out hang up before slow responses are written
+        pass
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Keep-alive, like Google
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.respond()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.respond()
+
+    def respond(self):
+        self.server.client_ports.append(self.client_address[1])
+        status, content_type, body = self.server.routes[self.path]()
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def json_route(data, status: int = 200) -> Callable[[], Route]:
+    return lambda: (status, 'application/json', json.dumps(data).encode())
+
+
+class OAuthCallbackTests(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.provider = StubProvider()
+        threading.Thread(target=cls.provider.serve_forever, daemon=True).start()
+
+        cls.provider_settings = override_settings(
+            GOOGLE_OAUTH_TOKEN_URL=cls.provider.url('/token'),
+            GOOGLE_OAUTH_USERINFO_URL=cls.provider.url('/userinfo'),
+            GOOGLE_OAUTH_CERTS_URL=cls.provider.url('/certs'),
+            GOOGLE_OAUTH_TIMEOUT=1,
+        )
+        cls.provider_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.provider_settings.disable()
+        cls.provider.shutdown()
+        cls.provider.server_close()
+        oauth.provider_client.close()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.provider.client_ports.clear()
+        self.provider.routes = {
+            '/token': json_route({'access_token': 'access', 'token_type': 'Bearer'}),
+            '/userinfo': json_route({'email': 'login@example.com', 'given_name': 'Log', 'family_name': 'In'}),
+        }
+        oauth._signing_keys = {}
+        oauth._signing_keys_expire_at = 0
+
+    def callback(self, code: Optional[str] = 'code'):
+        return self.client.get('/auth/oauth_callback', {'code': code} if code else {})
+
+    def test_logs_in_with_user_info(self):
+        response = self.callback()
+
+        self.assertEqual(response.status_code, 200)
+        user = User.objects.get(email='login@example.com')
+        self.assertEqual((user.first_name, user.last_name), ('Log', 'In'))
+        self.assertIn('access', response.json())
+
+    def test_reuses_one_pooled_connection_across_logins(self):
+        for _ in range(3):
+            self.assertEqual(self.callback().status_code, 200)
+
+        # Token and userinfo requests of three logins, each one run in its own event loop by the WSGI test client
+        self.assertEqual(len(self.provider.client_ports), 6)
+        self.assertEqual(len(set(self.provider.client_ports)), 1)
+
+    @mock.patch('complimentapi.views.oauth_client_id', 'client-id')
+    def test_verifies_id_token_without_user_info(self):
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(key.public_key()))
+        id_token = jwt.encode({
+            'iss': 'https://accounts.google.com', 'aud': 'client-id', 'exp': int(time.time()) + 60,
+            'email': 'token@example.com', 'given_name': 'Id',
+        }, key, algorithm='RS256', headers={'kid': 'stub'})
+
+        self.provider.routes['/token'] = json_route({'access_token': 'access', 'id_token': id_token})
+        self.provider.routes['/certs'] = json_route({'keys': [{**jwk, 'kid': 'stub', 'use': 'sig', 'alg': 'RS256'}]})
+        del self.provider.routes['/userinfo']
+
+        self.assertEqual(self.callback().status_code, 200)
+        self.assertTrue(User.objects.filter(email='token@example.com', first_name='Id').exists())
+
+    def test_rejected_code_is_unauthorized(self):
+        self.provider.routes['/token'] = json_route(
+            {'error': 'invalid_grant', 'error_description': 'Bad Request'}, status=400
+        )
+
+        with self.assertLogs('django', 'INFO'):
+            self.assertEqual(self.callback().status_code, 401)
+
+    def test_missing_code_is_unauthorized(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.callback(code=None).status_code, 401)
+        self.assertEqual(self.provider.client_ports, [])
+
+    def test_provider_error_page_is_bad_gateway(self):
+        self.provider.routes['/token'] = lambda: (500, 'text/html', b'<html>Server Error</html>')
+
+        with self.assertLogs('django', 'ERROR'):
+            self.assertEqual(self.callback().status_code, 502)
+
+    def test_provider_error_status_is_bad_gateway(self):
+        self.provider.routes['/userinfo'] = json_route({'error': 'backend_error'}, status=503)
+
+        with self.assertLogs('django', 'ERROR'):
+            self.assertEqual(self.callback().status_code, 502)
+
+    def test_slow_provider_is_gateway_timeout(self):
+        def slow_token() -> Route:
+            time.sleep(1.5)
+            return json_route({'access_token': 'access'})()
+
+        self.provider.routes['/token'] = slow_token
+
+        with self.assertLogs('django', 'ERROR'):
+            self.assertEqual(self.callback().status_code, 504)
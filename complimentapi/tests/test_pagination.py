@@ -0,0 +1,70 @@
+from django.test import override_settings
+
+from complimentapi.benchmarking import seed_receiver
+from complimentapi.tests.utils import APITestCase
+
+
+class PaginationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.receiver = seed_receiver(self.user, 20)
+        self.path = '/receivers/{}/compliments'.format(self.receiver.id)
+        self.ids = list(self.receiver.compliments.order_by('id').values_list('id', flat=True))
+
+    def walk(self, url: str):
+        """
+        The ids on every page from `url` on, following the next links.
+        """
+        pages = []
+
+        while url:
+            body = self.client.get(url).json()
+            pages.append([compliment['id'] for compliment in body['results']])
+            url = body['next']
+
+        return pages
+
+    def test_pages_cover_every_compliment_once_in_id_order(self):
+        pages = self.walk(self.path + '?page_size=7')
+
+        self.assertEqual([len(page) for page in pages], [7, 7, 6])
+        self.assertEqual([compliment_id for page in pages for compliment_id in page], self.ids)
+
+    def test_previous_link_returns_the_previous_page(self):
+        first = self.client.get(self.path + '?page_size=7').json()
+        second = self.client.get(first['next']).json()
+
+        previous = self.client.get(second['previous']).json()
+
+        self.assertEqual(previous['results'], first['results'])
+
+    def test_deleting_seen_compliments_does_not_shift_pages(self):
+        first = self.client.get(self.path + '?page_size=7').json()
+        self.receiver.compliments.filter(id__in=self.ids[:3]).delete()
+
+        self.assertEqual(
+            [compliment_id for page in self.walk(first['next']) for compliment_id in page], self.ids[7:]
+        )
+
+    def test_deep_pages_cost_the_same_queries(self):
+        first = self.client.get(self.path + '?page_size=2').json()
+        url = first['next']
+
+        for _ in range(5):
+            url = self.client.get(url).json()['next']
+
+        # The ownership check and the page
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self.client.get(url).json()['results']), 2)
+
+    def test_receivers_are_paginated_too(self):
+        receiver_ids = [self.receiver.id] + [self.user.receivers.create(name=str(index)).id for index in range(4)]
+
+        pages = self.walk('/receivers?page_size=2')
+
+        self.assertEqual([receiver_id for page in pages for receiver_id in page], receiver_ids)
+
+
+@override_settings(ROOT_URLCONF='complimentapi.async_urls')
+class AsyncPaginationTests(PaginationTests):
+    pass
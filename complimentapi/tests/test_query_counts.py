@@ -0,0 +1,92 @@
+from typing import Dict
+
+from django.test import override_settings
+
+from complimentapi.benchmarking import seed_receiver
+from complimentapi.tests.utils import APITestCase
+
+
+class QueryCountTests(APITestCase):
+    """
+    Every endpoint's query count, savepoints included, starting from cold caches. Requests run in order against the
+    same receiver, the deletes last.
+    """
+
+    # Per endpoint where the async views differ
+    query_counts: Dict[str, int] = {}
+
+    def setUp(self):
+        super().setUp()
+        self.receiver = seed_receiver(self.user, 20)
+        self.other_receiver = seed_receiver(self.user, 3)
+
+    def test_query_counts(self):
+        path = '/receivers/{}'.format(self.receiver.id)
+        compliment_ids = list(self.receiver.compliments.values_list('id', flat=True))
+        compliment_path = '{}/compliments/{}'.format(path, compliment_ids[0])
+        json = 'application/json'
+
+        endpoints = [
+            ('GET /auth/login', 0, 'get', '/auth/login', {}),
+            ('GET /auth/me', 1, 'get', '/auth/me', {}),
+            ('GET /receivers', 1, 'get', '/receivers', {}),
+            ('POST /receivers', 1, 'post', '/receivers', {'data': {'name': 'New'}, 'content_type': json}),
+            ('GET /receivers/{id}', 1, 'get', path, {}),
+            ('PATCH /receivers/{id}', 2, 'patch', path, {'data': {'name': 'Renamed'}, 'content_type': json}),
+            # Sampling tables for both receivers, the compliments, and the flushed retrievals
+            ('GET /receivers/random-digest', 7, 'get', '/receivers/random-digest', {}),
+            ('GET /receivers/export', 1, 'get', '/receivers/export', {}),
+            ('GET /receivers/export?type=csv', 1, 'get', '/receivers/export?type=csv', {}),
+            ('GET /receivers/{id}/random-compliment', 5, 'get', path + '/random-compliment', {}),
+            ('GET /receivers/{id}/random-compliment-list', 5, 'get', path + '/random-compliment-list?number=3', {}),
+            ('GET /receivers/{id}/stats', 3, 'get', path + '/stats', {}),
+            ('GET /receivers/{id}/compliments', 2, 'get', path + '/compliments', {}),
+            (
+                'POST /receivers/{id}/compliments', 8, 'post', path + '/compliments',
+                {'data': {'text': 'A new one'}, 'content_type': json}
+            ),
+            (
+                'POST /receivers/{id}/compliments/bulk', 10, 'post', path + '/compliments/bulk',
+                {'data': '{"text": "Imported"}\n{"text": "Also imported"}\n', 'content_type': 'application/x-ndjson'}
+            ),
+            ('GET /receivers/{id}/compliments/{id}', 1, 'get', compliment_path, {}),
+            (
+                'PATCH /receivers/{id}/compliments/{id}', 7, 'patch', compliment_path,
+                {'data': {'text': 'Edited'}, 'content_type': json}
+            ),
+            (
+                'DELETE /receivers/{id}/compliments/{id}', 4, 'delete',
+                '{}/compliments/{}'.format(path, compliment_ids[1]), {}
+            ),
+            (
+                'DELETE /receivers/{id}/compliments/bulk', 8, 'delete', path + '/compliments/bulk',
+                {'data': {'ids': compliment_ids[2:5]}, 'content_type': json}
+            ),
+            ('GET /compliments/search', 4, 'get', '/compliments/search?q=number 7', {}),
+            (
+                'POST /batch', 1, 'post', '/batch',
+                {'data': {'operations': [{'method': 'GET', 'path': path}]}, 'content_type': json}
+            ),
+            ('DELETE /receivers/{id}', 11, 'delete', '/receivers/{}'.format(self.other_receiver.id), {}),
+            (
+                'DELETE /receivers/bulk', 11, 'delete', '/receivers/bulk',
+                {'data': {'ids': [self.receiver.id]}, 'content_type': json}
+            ),
+        ]
+
+        for name, query_count, method, request_path, kwargs in endpoints:
+            with self.subTest(name), self.assertNumQueries(self.query_counts.get(name, query_count)):
+                response = getattr(self.client, method)(request_path, **kwargs)
+                # Streamed responses query as they are read
+                if response.streaming:
+                    b''.join(response.streaming_content)
+
+            self.assertLess(response.status_code, 400, name)
+
+
+@override_settings(ROOT_URLCONF='complimentapi.async_urls')
+class AsyncQueryCountTests(QueryCountTests):
+    query_counts = {
+        # Loads the compliment before deleting it by id
+        'DELETE /receivers/{id}/compliments/{id}': 5,
+    }
@@ -0,0 +1,60 @@
+import re
+from io import StringIO
+
+from django.http import HttpResponse
+
+from complimentapi.management.commands.check_query_plans import Command
+from complimentapi.models import Compliment, User
+from complimentapi.tests.utils import APITestCase
+
+# The hot paths check_query_plans explains, every one of them runs at least one query
+HOT_PATHS = (
+    'receiver list', 'receiver list, next page', 'receiver detail', 'compliment list', 'compliment list, next page',
+    'compliment detail', 'random compliment', 'random compliment list', 'stats', 'random digest', 'export', 'search',
+    'compliment delete',
+)
+
+
+class QueryPlanTests(APITestCase):
+    def test_hot_endpoints_use_indexes(self):
+        stdout = StringIO()
+
+        # More compliments than a page, so the next pages are checked too. Every explained query is printed
+        problems = Command(stdout=stdout).check_plans(size=150, verbosity=2)
+
+        self.assertEqual(problems, [], stdout.getvalue())
+
+        explained = set(re.findall(r'^(.+) \[\w+\]: ', stdout.getvalue(), re.MULTILINE))
+        for name in HOT_PATHS:
+            self.assertIn(name, explained)
+            self.assertIn(name + ', uncached', explained)
+
+    def test_scans_and_sorts_are_reported(self):
+        def request() -> HttpResponse:
+            list(Compliment.objects.filter(text='You are great').order_by('created_at'))
+            return HttpResponse()
+
+        (alias, sql, problems), = Command().explain(request, sorts=False)
+
+        self.assertTrue(any('complimentapi_compliment' in problem for problem in problems), problems)
+        self.assertTrue(any('Sort' in problem or 'B-TREE' in problem for problem in problems), problems)
+
+        # Unless the path is expected to sort
+        (alias, sql, problems), = Command().explain(request, sorts=True)
+        self.assertFalse(any('Sort' in problem or 'B-TREE' in problem for problem in problems), problems)
+
+    def test_lookups_by_receiver_use_indexes(self):
+        receiver = User.objects.create(email='other@example.com').receivers.create(name='receiver')
+        compliments = Compliment.objects.filter(receiver=receiver)
+
+        for name, queryset in [
+            ('page', compliments.order_by('id')[:100]),
+            ('next page', compliments.filter(id__gt=100).order_by('id')[:100]),
+            ('rotation', compliments.order_by('last_retrieved_at', 'id')[:5]),
+            ('duplicate', compliments.filter(text_hash='0' * 32)),
+            ('receivers', receiver.user.receivers.order_by('id')),
+        ]:
+            with self.subTest(name):
+                (alias, sql, problems), = Command().explain(lambda: HttpResponse(list(queryset)), sorts=False)
+
+                self.assertEqual(problems, [], sql)
@@ -0,0 +1,108 @@
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import override_settings
+
+from complimentapi.benchmarking import seed_receiver
+from complimentapi.tests.utils import APITestCase
+
+
+class RandomComplimentListTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.receiver = seed_receiver(self.user, 10)
+        self.path = '/receivers/{}/random-compliment-list'.format(self.receiver.id)
+
+    def test_returns_distinct_compliments_of_the_receiver(self):
+        compliments = self.client.get(self.path + '?number=5').json()
+
+        self.assertEqual(len({compliment['id'] for compliment in compliments}), 5)
+        self.assertTrue(all(compliment['receiver'] == self.receiver.id for compliment in compliments))
+
+    def test_number_larger_than_the_receiver_returns_all_of_them(self):
+        self.assertEqual(len(self.client.get(self.path + '?number=50').json()), 10)
+
+    def test_number_zero_or_negative_returns_nothing(self):
+        for number in (0, -1):
+            with self.subTest(number=number):
+                self.assertEqual(self.client.get(self.path + '?number={}'.format(number)).json(), [])
+
+    @override_settings(RANDOM_COMPLIMENT_LIST_MAX_SIZE=4)
+    def test_number_is_capped(self):
+        self.assertEqual(len(self.client.get(self.path + '?number=8').json()), 4)
+
+    @override_settings(SAMPLING_TABLE_MAX_SIZE=5)
+    def test_number_zero_or_negative_returns_nothing_without_a_sampling_table(self):
+        for number in (0, -1):
+            with self.subTest(number=number):
+                self.assertEqual(self.client.get(self.path + '?number={}'.format(number)).json(), [])
+
+
+@override_settings(SAMPLING_TABLE_MAX_SIZE=5, SAMPLING_RANK_INDEX_STEP=3)
+class UncachedRandomComplimentListTests(APITestCase):
+    """
+    Receivers too large for a sampling table, sampled through their rank index.
+    """
+
+    def setUp(self):
+        super().setUp()
+        for cache in caches.all():
+            cache.clear()
+
+        self.receiver = seed_receiver(self.user, 10)
+        # Ties on last_retrieved_at are ordered by id, like the table
+        self.receiver.compliments.filter(id__in=self.receiver._ordered_compliment_ids(4)).update(
+            last_retrieved_at=self.receiver.compliments.earliest('last_retrieved_at').last_retrieved_at
+        )
+
+    def test_ranks_are_looked_up_in_table_order(self):
+        ranks = [9, 0, 3, 2, 4, 8]
+
+        with mock.patch('complimentapi.models.sample_few_ranks', return_value=ranks):
+            compliments = self.receiver.get_random_compliments(len(ranks))
+
+        table = self.receiver._ordered_compliment_ids()
+        self.assertEqual([compliment.id for compliment in compliments], [table[rank] for rank in ranks])
+
+    def test_returns_distinct_compliments_of_the_receiver(self):
+        compliments = self.receiver.get_random_compliments(5)
+
+        self.assertEqual(len({compliment.id for compliment in compliments}), 5)
+        self.assertTrue(all(compliment.receiver_id == self.receiver.id for compliment in compliments))
+
+    def test_number_larger_than_the_receiver_returns_all_of_them(self):
+        self.assertEqual(len(self.receiver.get_random_compliments(50)), 10)
+
+    def test_query_count_does_not_grow_with_the_receiver(self):
+        large_receiver = seed_receiver(self.user, 100)
+
+        for receiver in (self.receiver, large_receiver):
+            with self.subTest(size=receiver.compliments.count()):
+                receiver.get_random_compliments(5)
+
+                # The rank index is cached, the ranks are looked up and their compliments loaded
+                with self.assertNumQueries(2):
+                    self.assertEqual(len(receiver.get_random_compliments(5)), 5)
+
+    def test_stale_index_is_rebuilt_and_sampled_again(self):
+        self.receiver.get_random_compliments(5)
+        table = self.receiver._ordered_compliment_ids()
+
+        # Without the invalidation post_delete would have done, so the cached index still counts 10
+        with mock.patch('complimentapi.signals.invalidate_sampling_table'):
+            for compliment in self.receiver.compliments.filter(id__in=table[7:]):
+                compliment.delete()
+
+        # The last rank is past the end now, the second draw is from an index of the 7 left
+        with mock.patch('complimentapi.models.sample_few_ranks', side_effect=[[9, 0], [6, 0]]) as sample_few_ranks:
+            compliments = self.receiver.get_random_compliments(2)
+
+        self.assertEqual([compliment.id for compliment in compliments], [table[6], table[0]])
+        self.assertEqual([call.args for call in sample_few_ranks.call_args_list], [(10, 2), (7, 2)])
+
+    def test_deleted_compliments_are_not_returned(self):
+        self.receiver.get_random_compliments(5)
+        kept_id = self.receiver._ordered_compliment_ids()[-1]
+        self.receiver.compliments.exclude(id=kept_id).delete()
+
+        self.assertEqual([compliment.id for compliment in self.receiver.get_random_compliments(5)], [kept_id])
@@ -0,0 +1,121 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.utils import timezone
+
+from complimentapi.benchmarking import seed_receiver
+from complimentapi.models import RetrievalCount, User
+from complimentapi.retrievals import compact_retrieval_counts
+from complimentapi.tests.utils import APITestCase
+
+HOUR = RetrievalCount.Period.HOUR
+DAY = RetrievalCount.Period.DAY
+
+
+class RetrievalStatsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.receiver = seed_receiver(self.user, 3)
+        self.compliments = list(self.receiver.compliments.order_by('id'))
+        self.today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def add_count(self, compliment, period: str, starts_at, count: int) -> RetrievalCount:
+        return RetrievalCount.objects.create(
+            receiver_id=compliment.receiver_id, compliment=compliment, period=period, starts_at=starts_at, count=count
+        )
+
+    def stats(self, **params) -> dict:
+        response = self.client.get('/receivers/{}/stats'.format(self.receiver.id), params)
+        self.assertEqual(response.status_code, 200)
+
+        return response.json()
+
+    def test_stats_sum_the_buckets_of_the_requested_days(self):
+        first, second, third = self.compliments
+        self.add_count(first, HOUR, self.today + timedelta(hours=1), 2)
+        self.add_count(second, HOUR, self.today + timedelta(hours=1), 5)
+        self.add_count(first, DAY, self.today - timedelta(days=2), 4)
+        # Out of range for the default week
+        self.add_count(third, DAY, self.today - timedelta(days=7), 10)
+
+        stats = self.stats()
+
+        self.assertEqual(stats['retrievals'], 11)
+        self.assertEqual(stats['compliments'], [
+            {'compliment': first.id, 'retrievals': 6},
+            {'compliment': second.id, 'retrievals': 5},
+        ])
+        self.assertEqual([(bucket['period'], bucket['retrievals']) for bucket in stats['buckets']], [
+            (DAY, 4), (HOUR, 7),
+        ])
+        self.assertEqual(self.stats(days=8)['retrievals'], 21)
+        self.assertEqual(self.stats(days=1)['retrievals'], 7)
+
+    def test_stats_leave_out_other_receivers(self):
+        other_receiver = seed_receiver(self.user, 1)
+        self.add_count(other_receiver.compliments.get(), HOUR, self.today, 3)
+
+        self.assertEqual(self.stats()['retrievals'], 0)
+
+    def test_days_are_validated(self):
+        path = '/receivers/{}/stats'.format(self.receiver.id)
+
+        with self.assertLogs('django.request', 'WARNING'):
+            for days in (0, settings.RETRIEVAL_DAILY_DAYS + 1, 'week'):
+                self.assertEqual(self.client.get(path, {'days': days}).status_code, 400, days)
+
+    def test_stats_of_other_users_receivers_are_forbidden(self):
+        other_receiver = User.objects.create(email='other@example.com').receivers.create(name='other')
+
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.client.get('/receivers/{}/stats'.format(other_receiver.id))
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_old_hourly_counts_are_compacted_into_days(self):
+        first, second, _ = self.compliments
+        old_day = self.today - timedelta(days=settings.RETRIEVAL_HOURLY_DAYS + 1)
+        self.add_count(first, HOUR, old_day + timedelta(hours=1), 2)
+        self.add_count(first, HOUR, old_day + timedelta(hours=23), 3)
+        self.add_count(second, HOUR, old_day + timedelta(hours=5), 1)
+        # The compacted day adds to a daily bucket that is already there
+        self.add_count(second, DAY, old_day, 4)
+        recent = self.add_count(first, HOUR, self.today - timedelta(days=1), 6)
+        before = self.stats(days=30)
+
+        self.assertEqual(compact_retrieval_counts(), (3, 0))
+
+        self.assertEqual(
+            set(RetrievalCount.objects.values_list('compliment_id', 'period', 'starts_at', 'count')),
+            {(first.id, DAY, old_day, 5), (second.id, DAY, old_day, 5), (first.id, HOUR, recent.starts_at, 6)},
+        )
+        self.assertEqual(self.stats(days=30)['retrievals'], before['retrievals'])
+        self.assertEqual(self.stats(days=30)['compliments'], before['compliments'])
+
+    def test_expired_daily_counts_are_dropped(self):
+        first = self.compliments[0]
+        self.add_count(first, DAY, self.today - timedelta(days=settings.RETRIEVAL_DAILY_DAYS + 1), 1)
+        kept = self.add_count(first, DAY, self.today - timedelta(days=settings.RETRIEVAL_DAILY_DAYS), 1)
+
+        self.assertEqual(compact_retrieval_counts(), (0, 1))
+        self.assertEqual(list(RetrievalCount.objects.values_list('id', flat=True)), [kept.id])
+
+    def test_compaction_is_relative_to_now(self):
+        self.add_count(self.compliments[0], HOUR, self.today, 1)
+
+        self.assertEqual(compact_retrieval_counts(self.today + timedelta(days=settings.RETRIEVAL_HOURLY_DAYS)), (0, 0))
+        self.assertEqual(
+            compact_retrieval_counts(self.today + timedelta(days=settings.RETRIEVAL_HOURLY_DAYS + 1)), (1, 0)
+        )
+        self.assertEqual(RetrievalCount.objects.get().period, DAY)
+
+    def test_command_compacts(self):
+        self.add_count(self.compliments[0], HOUR, self.today - timedelta(days=settings.RETRIEVAL_HOURLY_DAYS + 1), 1)
+
+        stdout = StringIO()
+        call_command('compact_retrieval_counts', stdout=stdout)
+
+        self.assertIn('Merged 1 hourly buckets', stdout.getvalue())
+        self.assertEqual(RetrievalCount.objects.get().period, DAY)
@@ -0,0 +1,87 @@
+from unittest import mock
+
+from django.test import override_settings
+
+from complimentapi.benchmarking import seed_receiver
+from complimentapi.models import Compliment, RetrievalCount
+from complimentapi.retrievals import RetrievalBuffer
+from complimentapi.sampling import get_sampling_table
+from complimentapi.tests.utils import APITestCase
+
+
+@override_settings(RETRIEVAL_FLUSH_INTERVAL=3600, RETRIEVAL_FLUSH_SIZE=100)
+class RetrievalBufferTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.receiver = seed_receiver(self.user, 5)
+        self.compliments = list(self.receiver.compliments.order_by('id'))
+        self.buffer = RetrievalBuffer()
+
+        # Flushed by hand instead of by the background thread
+        patcher = mock.patch.object(self.buffer, '_ensure_thread')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def counts(self):
+        return dict(RetrievalCount.objects.values_list('compliment_id', 'count'))
+
+    def test_retrievals_are_written_on_flush(self):
+        first, second = self.compliments[:2]
+        last_retrieved_at = first.last_retrieved_at
+
+        with self.assertNumQueries(0):
+            self.buffer.record([first, second])
+            self.buffer.record([first])
+
+        self.assertEqual(Compliment.objects.get(id=first.id).last_retrieved_at, last_retrieved_at)
+
+        # One UPDATE for both compliments, then the existence check and the upsert of the coalesced counts
+        with self.assertNumQueries(3):
+            self.buffer.flush()
+
+        self.assertEqual(Compliment.objects.get(id=first.id).last_retrieved_at, first.last_retrieved_at)
+        self.assertEqual(Compliment.objects.get(id=second.id).last_retrieved_at, second.last_retrieved_at)
+        self.assertEqual(self.counts(), {first.id: 2, second.id: 1})
+
+        with self.assertNumQueries(0):
+            self.buffer.flush()
+
+    def test_flushes_add_to_counts(self):
+        self.buffer.record(self.compliments[:1])
+        self.buffer.flush()
+        self.buffer.count(self.compliments[:1])
+        self.buffer.flush()
+
+        self.assertEqual(self.counts(), {self.compliments[0].id: 2})
+
+    def test_sampling_table_is_patched_before_the_flush(self):
+        table = list(get_sampling_table(self.receiver.id, self.receiver._ordered_compliment_ids))
+        self.buffer.record([Compliment.objects.get(id=table[0])])
+
+        with self.assertNumQueries(0):
+            patched = list(get_sampling_table(self.receiver.id, self.receiver._ordered_compliment_ids))
+
+        self.assertEqual(patched, table[1:] + table[:1])
+
+    @override_settings(RETRIEVAL_FLUSH_SIZE=2)
+    def test_full_buffer_wakes_the_flush_thread(self):
+        self.buffer.record(self.compliments[:1])
+        self.assertFalse(self.buffer._wake.is_set())
+
+        self.buffer.record(self.compliments[1:2])
+        self.assertTrue(self.buffer._wake.is_set())
+
+    @override_settings(RETRIEVAL_FLUSH_INTERVAL=0)
+    def test_zero_interval_writes_right_away(self):
+        self.buffer.record(self.compliments[:1])
+
+        self.assertEqual(self.counts(), {self.compliments[0].id: 1})
+
+    def test_compliments_deleted_before_the_flush_are_skipped(self):
+        deleted, kept = self.compliments[:2]
+        self.buffer.record([deleted, kept])
+        deleted.delete()
+
+        self.buffer.flush()
+
+        self.assertEqual(self.counts(), {kept.id: 1})
@@ -0,0 +1,74 @@
+import threading
+
+from django.core.cache import caches
+from django.db import connections
+from django.test import TransactionTestCase, override_settings, skipUnlessDBFeature
+
+from complimentapi.benchmarking import seed_receiver
+from complimentapi.management.commands.benchmark_endpoints import Command
+from complimentapi.models import User
+from complimentapi.tests.utils import APITestCase
+
+
+@override_settings(COMPLIMENT_SELECTION_MODE='rotation')
+class RotationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.receiver = seed_receiver(self.user, 10)
+
+    def test_hands_out_every_compliment_once_per_rotation(self):
+        handed_out = [compliment.id for _ in range(10) for compliment in self.receiver.rotate_compliments(1)]
+
+        self.assertCountEqual(handed_out, self.receiver.compliments.values_list('id', flat=True))
+
+    def test_number_zero_or_negative_hands_out_nothing(self):
+        path = '/receivers/{}/random-compliment-list'.format(self.receiver.id)
+
+        for number in (0, -1):
+            with self.subTest(number=number):
+                self.assertEqual(self.client.get(path + '?number={}'.format(number)).json(), [])
+
+    @override_settings(RANDOM_COMPLIMENT_LIST_MAX_SIZE=4)
+    def test_number_is_capped(self):
+        self.assertEqual(len(self.receiver.rotate_compliments(8)), 4)
+
+
+# Runs on PostgreSQL in CI, concurrent writers fail with "database table is locked" on SQLite
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+@override_settings(THROTTLE_RATES={'default': '1000000/s'})
+class ConcurrentRotationTests(TransactionTestCase):
+    workers = 4
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def test_concurrent_rotations_hand_out_different_compliments(self):
+        receiver = seed_receiver(User.objects.create(email='test@example.com'), 40)
+        handed_out = []
+        errors = []
+
+        def rotate():
+            try:
+                for _ in range(10):
+                    handed_out.extend(compliment.id for compliment in receiver.rotate_compliments(1))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=rotate) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        # 40 rotations of 40 compliments, each one is handed out exactly once
+        self.assertCountEqual(handed_out, receiver.compliments.values_list('id', flat=True))
+
+    def test_concurrent_requests_hand_out_different_compliments(self):
+        result = Command().throughput(User.objects.create(email='test@example.com'), self.workers, 40)
+
+        self.assertEqual(result['requests'], 40)
+        self.assertEqual(result['duplicates'], 0)
@@ -0,0 +1,139 @@
+import random
+from collections import Counter
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from complimentapi.benchmarking import seed_receiver
+from complimentapi.models import User
+from complimentapi.sampling import sample_few_ranks, sample_rank, sample_ranks
+from complimentapi.tests.utils import APITestCase
+
+
+class SampleRankTests(SimpleTestCase):
+    def setUp(self):
+        random.seed(0)
+
+    def test_ranks_are_weighted_by_recency(self):
+        # Weights 4, 3, 2 and 1 out of 10
+        counts = Counter(sample_rank(4) for _ in range(20000))
+
+        for rank, weight in enumerate((4, 3, 2, 1)):
+            self.assertAlmostEqual(counts[rank] / 20000, weight / 10, delta=0.02)
+
+    def test_empty_set_has_no_rank(self):
+        with self.assertRaises(ValueError):
+            sample_rank(0)
+
+    def test_ranks_without_replacement_are_distinct(self):
+        for size, number in ((10, 3), (10, 10), (3, 10), (0, 3), (10, 0)):
+            with self.subTest(size=size, number=number):
+                ranks = sample_ranks(size, number)
+
+                self.assertEqual(len(ranks), min(size, number))
+                self.assertEqual(len(set(ranks)), len(ranks))
+                self.assertTrue(all(0 <= rank < size for rank in ranks))
+
+    def test_first_rank_without_replacement_is_weighted_by_recency(self):
+        counts = Counter(sample_ranks(4, 2)[0] for _ in range(20000))
+
+        for rank, weight in enumerate((4, 3, 2, 1)):
+            self.assertAlmostEqual(counts[rank] / 20000, weight / 10, delta=0.02)
+
+    def test_few_ranks_are_distinct(self):
+        for size, number in ((1000, 3), (10, 3), (10, 10), (3, 10), (0, 3), (10, 0)):
+            with self.subTest(size=size, number=number):
+                ranks = sample_few_ranks(size, number)
+
+                self.assertEqual(len(ranks), min(size, number))
+                self.assertEqual(len(set(ranks)), len(ranks))
+                self.assertTrue(all(0 <= rank < size for rank in ranks))
+
+    def test_few_ranks_are_weighted_like_ranks_without_replacement(self):
+        # The second rank too, which depends on the first one drawn
+        few = Counter(tuple(sample_few_ranks(10, 2)) for _ in range(40000))
+        without_replacement = Counter(tuple(sample_ranks(10, 2)) for _ in range(40000))
+
+        for ranks in [(0, 1), (1, 0), (0, 9), (5, 6), (9, 8)]:
+            self.assertAlmostEqual(few[ranks] / 40000, without_replacement[ranks] / 40000, delta=0.005)
+
+
+class RandomComplimentTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.receiver = seed_receiver(self.user, 10)
+
+    def get(self, receiver_id: int):
+        return self.client.get('/receivers/{}/random-compliment'.format(receiver_id))
+
+    def test_returns_a_compliment_of_the_receiver(self):
+        response = self.get(self.receiver.id)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['receiver'], self.receiver.id)
+
+    @override_settings(SAMPLING_TABLE_MAX_SIZE=5)
+    def test_returns_a_compliment_of_the_receiver_without_a_sampling_table(self):
+        response = self.get(self.receiver.id)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['receiver'], self.receiver.id)
+
+    def test_receiver_without_compliments_is_not_found(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.get(self.user.receivers.create(name='empty').id).status_code, 404)
+
+    def test_other_users_receiver_is_forbidden(self):
+        other_receiver = seed_receiver(User.objects.create(email='other@example.com'), 3)
+
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.get(other_receiver.id).status_code, 403)
+
+
+@override_settings(SAMPLING_TABLE_MAX_SIZE=5, SAMPLING_RANK_INDEX_STEP=3)
+class UncachedRandomComplimentTests(APITestCase):
+    """
+    Receivers too large for a sampling table, sampled through their rank index.
+    """
+
+    def setUp(self):
+        super().setUp()
+        for cache in caches.all():
+            cache.clear()
+
+        self.receiver = seed_receiver(self.user, 10)
+
+    def test_every_rank_is_looked_up_in_table_order(self):
+        table = self.receiver._ordered_compliment_ids()
+
+        for rank in range(10):
+            with mock.patch('complimentapi.models.sample_few_ranks', return_value=[rank]):
+                self.assertEqual(self.receiver.get_random_compliment().id, table[rank])
+
+    def test_query_count_does_not_grow_with_the_receiver(self):
+        for receiver in (self.receiver, seed_receiver(self.user, 100)):
+            with self.subTest(size=receiver.compliments.count()):
+                receiver.get_random_compliment()
+
+                # The rank index is cached, the rank is looked up and its compliment loaded
+                with self.assertNumQueries(2):
+                    self.assertEqual(receiver.get_random_compliment().receiver_id, receiver.id)
+
+    def test_stale_index_is_rebuilt_and_sampled_again(self):
+        self.receiver.get_random_compliment()
+        table = self.receiver._ordered_compliment_ids()
+
+        # Without the invalidation post_delete would have done, so the cached index still counts 10
+        with mock.patch('complimentapi.signals.invalidate_sampling_table'):
+            for compliment in self.receiver.compliments.filter(id__in=table[7:]):
+                compliment.delete()
+
+        # The last rank is past the end now, the second draw is from an index of the 7 left
+        with mock.patch('complimentapi.models.sample_few_ranks', side_effect=[[9], [6]]) as sample_few_ranks:
+            self.assertEqual(self.receiver.get_random_compliment().id, table[6])
+
+        self.assertEqual([call.args for call in sample_few_ranks.call_args_list], [(10, 1), (7, 1)])
+
+    def test_receiver_without_compliments_has_none(self):
+        self.assertIsNone(self.user.receivers.create(name='empty').get_random_compliment())
@@ -0,0 +1,79 @@
+from django.test import SimpleTestCase
+
+from complimentapi.models import ComplimentTerm, User
+from complimentapi.search import tokenize
+from complimentapi.tests.utils import APITestCase
+
+
+class TokenizeTests(SimpleTestCase):
+    def test_terms_are_case_folded_words_with_counts(self):
+        self.assertEqual(
+            tokenize('You are GREAT, truly great! A ﬁne Straße.'),
+            {'you': 1, 'are': 1, 'great': 2, 'truly': 1, 'fine': 1, 'strasse': 1}
+        )
+
+    def test_long_terms_are_cut(self):
+        max_length = ComplimentTerm._meta.get_field('term').max_length
+
+        self.assertEqual(list(tokenize('a' * 100)), ['a' * max_length])
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        receiver = self.user.receivers.create(name='receiver')
+        other_receiver = self.user.receivers.create(name='other receiver')
+
+        self.kind = receiver.compliments.create(text='You are kind')
+        self.kind_and_smart = other_receiver.compliments.create(text='Kind and smart, really smart')
+        self.smart = receiver.compliments.create(text='You are smart')
+        User.objects.create(email='other@example.com').receivers.create(name='other').compliments.create(
+            text='Kind and smart'
+        )
+
+    def search(self, query: str):
+        response = self.client.get('/compliments/search', {'q': query})
+        self.assertEqual(response.status_code, 200)
+
+        return [compliment['id'] for compliment in response.json()['results']]
+
+    def test_matches_every_term_across_receivers(self):
+        self.assertEqual(self.search('smart KIND'), [self.kind_and_smart.id])
+
+    def test_repeated_terms_rank_first(self):
+        self.assertEqual(self.search('smart'), [self.kind_and_smart.id, self.smart.id])
+
+    def test_rare_terms_weigh_more(self):
+        receiver = self.user.receivers.create(name='weights')
+        rare_twice = receiver.compliments.create(text='alpha alpha beta')
+        common_twice = receiver.compliments.create(text='alpha beta beta')
+        receiver.compliments.create(text='beta')
+
+        # Both have three terms, but "beta" occurs in more compliments than "alpha"
+        self.assertEqual(self.search('alpha beta'), [rare_twice.id, common_twice.id])
+
+    def test_ties_rank_newest_first(self):
+        self.assertEqual(self.search('kind'), [self.kind_and_smart.id, self.kind.id])
+
+    def test_unknown_or_empty_queries_match_nothing(self):
+        for query in ('smart unknown', '', '!'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), [])
+
+    def test_edits_and_deletes_update_the_index(self):
+        self.client.patch(
+            '/receivers/{}/compliments/{}'.format(self.kind.receiver_id, self.kind.id), {'text': 'You are brilliant'},
+            content_type='application/json'
+        )
+        self.client.delete('/receivers/{}/compliments/{}'.format(self.smart.receiver_id, self.smart.id))
+
+        self.assertEqual(self.search('brilliant'), [self.kind.id])
+        self.assertEqual(self.search('kind'), [self.kind_and_smart.id])
+        self.assertEqual(self.search('smart'), [self.kind_and_smart.id])
+
+    def test_results_are_paginated(self):
+        response = self.client.get('/compliments/search', {'q': 'smart', 'page_size': 1}).json()
+
+        self.assertEqual(response['count'], 2)
+        self.assertEqual([compliment['id'] for compliment in response['results']], [self.kind_and_smart.id])
+        self.assertIsNotNone(response['next'])
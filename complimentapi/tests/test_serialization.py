@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.test import SimpleTestCase, override_settings
+from django.utils.translation import gettext_lazy
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from complimentapi.benchmarking import seed_receiver
+from complimentapi.models import Compliment, Receiver
+from complimentapi.renderers import FastJSONRenderer
+from complimentapi.serializers import ComplimentSerializer, ReceiverSerializer, ValuesSerializer
+from complimentapi.tests.utils import APITestCase
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    def assertRendersLikeJSONRenderer(self, data, accepted_media_type=None):
+        self.assertEqual(
+            FastJSONRenderer().render(data, accepted_media_type),
+            JSONRenderer().render(data, accepted_media_type),
+        )
+
+    def test_output_is_byte_identical(self):
+        payloads = {
+            'plain': {'id': 1, 'text': 'A compliment', 'nested': [None, True, False, {'a': []}]},
+            'unicode': {'text': 'Prächtig 👍   line   separators "quoted" \\ \n'},
+            'datetimes': {
+                'utc': datetime(2022, 8, 24, 7, 31, 8, 249521, tzinfo=dt_timezone.utc),
+                'offset': datetime(2022, 8, 24, 7, 31, tzinfo=dt_timezone(timedelta(hours=2))),
+            },
+            'other types': {'decimal': Decimal('1.50'), 'lazy': gettext_lazy('Not found.'), 1: 'int key'},
+            'big integer': {'id': 2 ** 70},
+            'list': [1, 2, 3],
+            'none': None,
+        }
+
+        for name, data in payloads.items():
+            with self.subTest(name):
+                self.assertRendersLikeJSONRenderer(data)
+
+    def test_refused_payloads_fail_like_json_renderer(self):
+        for renderer in (FastJSONRenderer(), JSONRenderer()):
+            with self.subTest(type(renderer).__name__), self.assertRaises(UnicodeEncodeError):
+                renderer.render({'text': '\ud800'})
+
+    def test_indented_output_is_identical(self):
+        self.assertRendersLikeJSONRenderer({'id': 1, 'items': [1, 2]}, 'application/json; indent=4')
+
+
+class ValuesSerializerTests(APITestCase):
+    def test_output_matches_the_model_serializers(self):
+        seed_receiver(self.user, 5)
+
+        for serializer_class, queryset in (
+            (ReceiverSerializer, Receiver.objects.order_by('id')),
+            (ComplimentSerializer, Compliment.objects.order_by('id')),
+        ):
+            with self.subTest(serializer_class.__name__):
+                values_serializer = ValuesSerializer(serializer_class)
+
+                self.assertEqual(
+                    values_serializer.to_representation(values_serializer.values(queryset)),
+                    serializer_class(queryset, many=True).data
+                )
+
+    def test_unsupported_fields_are_refused(self):
+        class ComputedSerializer(serializers.ModelSerializer):
+            name_length = serializers.SerializerMethodField()
+
+            class Meta:
+                model = Receiver
+                fields = ['id', 'name_length']
+
+        with self.assertRaises(TypeError):
+            ValuesSerializer(ComputedSerializer)
+
+    def test_list_pages_are_identical_with_and_without_the_fast_path(self):
+        receiver = seed_receiver(self.user, 5)
+
+        for path in ('/receivers', '/receivers/{}/compliments'.format(receiver.id)):
+            with self.subTest(path):
+                with override_settings(FAST_SERIALIZATION=False):
+                    expected = self.client.get(path).content
+
+                with override_settings(FAST_SERIALIZATION=True):
+                    self.assertEqual(self.client.get(path).content, expected)
@@ -0,0 +1,92 @@
+import time
+from unittest import mock
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from complimentapi.management.commands.check_throttling import Command
+from complimentapi.models import User
+from complimentapi.tests.utils import APITestCase, token_client
+
+
+class ThrottlingTests(APITestCase):
+    def test_throttled_requests_cost_one_cache_round_trip_and_no_queries(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            problems = Command().check_routes()
+
+        self.assertEqual(problems, [])
+
+
+# Bursts of 3 requests, refilled at one every 20 seconds
+@override_settings(THROTTLE_RATES={'default': '3/min'})
+class TokenBucketTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.receiver = self.user.receivers.create(name='receiver')
+
+        # Only the buckets' clock, cache expiry keeps the real one
+        self.now = time.time()
+        patcher = mock.patch('complimentapi.throttling.time')
+        patcher.start().time.side_effect = lambda: self.now
+        self.addCleanup(patcher.stop)
+
+    def statuses(self, count: int, client=None, path: str = '/receivers'):
+        return [(client or self.client).get(path).status_code for _ in range(count)]
+
+    def test_requests_over_the_burst_are_throttled(self):
+        for remaining in (2, 1, 0):
+            response = self.client.get('/receivers')
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['X-RateLimit-Limit'], '3')
+            self.assertEqual(response['X-RateLimit-Remaining'], str(remaining))
+
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.client.get('/receivers')
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '20')
+        self.assertEqual(response['X-RateLimit-Remaining'], '0')
+        self.assertIn('20 seconds', response.json()['detail'])
+
+    def test_tokens_refill_at_the_sustained_rate(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.statuses(4), [200, 200, 200, 429])
+
+            # One token per 20 seconds after the burst
+            self.now += 20
+            self.assertEqual(self.statuses(2), [200, 429])
+
+            self.now += 10
+            self.assertEqual(self.statuses(1), [429])
+
+        # A whole burst again once the bucket is full
+        self.now += 60
+        self.assertEqual(self.statuses(3), [200, 200, 200])
+
+    def test_clients_have_their_own_buckets(self):
+        other_client = token_client(User.objects.create(email='other@example.com'))
+
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.statuses(4), [200, 200, 200, 429])
+
+        self.assertEqual(self.statuses(1, other_client), [200])
+
+    def test_throttled_requests_are_not_permission_checked(self):
+        other_receiver = User.objects.create(email='other@example.com').receivers.create(name='other')
+        path = '/receivers/{}/compliments'.format(other_receiver.id)
+
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.statuses(3, path=path), [403, 403, 403])
+
+            # Throttled before the receiver's owner is queried
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.statuses(1, path=path), [429])
+
+        self.assertEqual(len(queries), 0)
+
+
+@override_settings(ROOT_URLCONF='complimentapi.async_urls')
+class AsyncTokenBucketTests(TokenBucketTests):
+    pass
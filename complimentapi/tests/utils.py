@@ -0,0 +1,28 @@
+from django.core.cache import caches
+from django.test import Client, TestCase, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from complimentapi.models import User
+
+
+def token_client(user: User) -> Client:
+    return Client(HTTP_AUTHORIZATION='Bearer {}'.format(RefreshToken.for_user(user).access_token))
+
+
+@override_settings(
+    # Retrievals written right away instead of by a background thread outside the test's transaction
+    RETRIEVAL_FLUSH_INTERVAL=0,
+    THROTTLE_RATES={'default': '1000000/s'},
+)
+class APITestCase(TestCase):
+    """
+    Starts every test with empty caches, which outlive the rolled back database otherwise, and a user with a client
+    authenticated as them.
+    """
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+        self.user = User.objects.create(email='test@example.com')
+        self.client = token_client(self.user)
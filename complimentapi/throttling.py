@@ -0,0 +1,183 @@
+import math
+import time
+from functools import wraps
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpRequest, HttpResponse
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+from complimentapi.renderers import FastJSONRenderer
+
+# Token buckets per route and client, kept in THROTTLE_CACHE so every worker shares them. A 'num/period' rate in
+# THROTTLE_RATES is a bucket of num tokens refilled at num per period, routes without a rate of their own use 'default'.
+# Clients are users when authenticated and IP addresses otherwise.
+#
+# A bucket is stored as the time it will be full again, in microseconds (GCRA's theoretical arrival time). A throttled
+# request only reads it, and a request that gets through adds one token's worth of time with an atomic incr, so
+# concurrent requests can't lose each other's tokens. Requests racing for the last token can all get it, the bucket
+# then goes into debt and the client waits it off, so the rate still holds over time. Only a bucket found full is
+# written with set, requests racing on it count once.
+#
+# Buckets expire THROTTLE_BUCKET_PERIODS refill periods after they were last found full, as incr keeps the expiry. A
+# client that never lets its bucket refill gets a full one again then, at most one extra bucket per that many periods.
+
+
+def parse_rate(rate: str) -> Tuple[int, int]:
+    """
+    Tokens and refill period in seconds of a 'num/period' rate, period being s, m, h or d like DRF's rates.
+    """
+    num, period = rate.split('/')
+
+    return int(num), {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}[period[0]]
+
+
+class Bucket(NamedTuple):
+    limit: int
+    remaining: int
+    # When the bucket will be full again, in epoch seconds
+    reset: int
+    # Seconds until a token is available again, None if the request got one
+    retry_after: Optional[int]
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Remaining': str(self.remaining),
+            'X-RateLimit-Reset': str(self.reset),
+        }
+
+
+def take_token(route: str, client: str) -> Optional[Bucket]:
+    """
+    Take a token from the client's bucket for the route. None when the route isn't throttled.
+    """
+    rate = settings.THROTTLE_RATES.get(route, settings.THROTTLE_RATES.get('default'))
+    if rate is None:
+        return None
+
+    limit, period = parse_rate(rate)
+    interval = round(period * 1000000 / limit)
+    timeout = period * settings.THROTTLE_BUCKET_PERIODS
+    cache = caches[settings.THROTTLE_CACHE]
+    key = 'throttle:{}:{}'.format(route, client)
+    now = int(time.time() * 1000000)
+
+    full_at = cache.get(key)
+
+    if full_at is not None and full_at - now > (limit - 1) * interval:
+        retry_after = math.ceil((full_at - now - (limit - 1) * interval) / 1000000)
+        return Bucket(limit, 0, math.ceil(full_at / 1000000), retry_after)
+
+    if full_at is None or full_at < now:
+        full_at = now + interval
+        cache.set(key, full_at, timeout)
+    else:
+        try:
+            full_at = cache.incr(key, interval)
+        except ValueError:
+            # Expired since it was read
+            full_at = now + interval
+            cache.set(key, full_at, timeout)
+
+    # Tokens only partly refilled aren't available yet
+    remaining = max(0, limit - math.ceil((full_at - now) / interval))
+
+    return Bucket(limit, remaining, math.ceil(full_at / 1000000), None)
+
+
+def _route(request: HttpRequest) -> str:
+    return request.resolver_match.url_name or request.resolver_match.view_name
+
+
+def _client(request: HttpRequest, user) -> str:
+    if user is not None and user.is_authenticated:
+        return 'user:{}'.format(user.id)
+
+    # X-Forwarded-For aware, see DRF's NUM_PROXIES
+    return 'ip:{}'.format(BaseThrottle().get_ident(request))
+
+
+def with_rate_limit(response: HttpResponse, bucket: Optional[Bucket]) -> HttpResponse:
+    if bucket is not None:
+        for header, value in bucket.headers().items():
+            response[header] = value
+
+        if bucket.retry_after is not None:
+            response['Retry-After'] = str(bucket.retry_after)
+
+    return response
+
+
+def throttled_response(bucket: Bucket) -> HttpResponse:
+    # Same body as DRF's throttled responses
+    response = HttpResponse(
+        FastJSONRenderer().render({'detail': Throttled(bucket.retry_after).detail}), status=429,
+        content_type='application/json'
+    )
+
+    return with_rate_limit(response, bucket)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttles DRF views with the route's token bucket, and adds the bucket's X-RateLimit headers to the response. DRF
+    adds Retry-After to throttled ones.
+    """
+
+    bucket: Optional[Bucket] = None
+
+    def allow_request(self, request, view) -> bool:
+        self.bucket = take_token(_route(request._request), _client(request, request.user))
+        if self.bucket is None:
+            return True
+
+        view.headers.update(self.bucket.headers())
+
+        return self.bucket.retry_after is None
+
+    def wait(self) -> Optional[float]:
+        return self.bucket.retry_after if self.bucket else None
+
+
+class ThrottleBeforePermissionsMixin:
+    """
+    Checks throttles right after authentication, instead of after the permission checks. OwnsReceiver and
+    OwnsCompliment query the database, a throttled request doesn't.
+    """
+
+    def perform_authentication(self, request) -> None:
+        super().perform_authentication(request)
+        super().check_throttles(request)
+
+    def check_throttles(self, request) -> None:
+        # Already checked by perform_authentication
+        pass
+
+
+async def athrottle(request: HttpRequest, user=None) -> Tuple[Optional[Bucket], Optional[HttpResponse]]:
+    """
+    Take a token for a plain async view. Returns the bucket, and the response to send instead when throttled.
+    """
+    bucket = await sync_to_async(take_token)(_route(request), _client(request, user))
+
+    if bucket is not None and bucket.retry_after is not None:
+        return bucket, throttled_response(bucket)
+
+    return bucket, None
+
+
+def throttle(view: Callable) -> Callable:
+    """
+    Throttle a plain async function view by client IP.
+    """
+    @wraps(view)
+    async def throttled_view(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        bucket, response = await athrottle(request)
+
+        return response or with_rate_limit(await view(request, *args, **kwargs), bucket)
+
+    return throttled_view
@@ -13,9 +13,13 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.urls import path
 from rest_framework_nested import routers
 
-from complimentapi.views import AuthViewSet, ReceiverViewSet, ComplimentViewSet
+from complimentapi.instrumentation import metrics
+from complimentapi.views import (
+    AuthViewSet, BatchView, ReceiverViewSet, ComplimentViewSet, ComplimentSearchView, oauth_callback
+)
 
 
 router = routers.SimpleRouter(trailing_slash=False)
@@ -27,5 +31,11 @@ router.register(r'receivers', ReceiverViewSet, basename='receivers')
 receiver_router = routers.NestedSimpleRouter(router, r'receivers', lookup='receiver')
 receiver_router.register(r'compliments', ComplimentViewSet, basename='compliments')
 
-urlpatterns = router.urls
+urlpatterns = [
+    path('auth/oauth_callback', oauth_callback, name='auth-oauth-callback'),
+    path('metrics', metrics, name='metrics'),
+    path('compliments/search', ComplimentSearchView.as_view(), name='compliments-search'),
+    path('batch', BatchView.as_view(), name='batch'),
+]
+urlpatterns += router.urls
 urlpatterns += receiver_router.urls
@@ -0,0 +1,101 @@
+import time
+from typing import Optional, Tuple
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from complimentapi.db_routers import read_from_default
+
+# Validators back conditional GETs of the receiver and compliment endpoints. A validator is a random token and the
+# time it was issued, kept in VALIDATOR_CACHE per user (their receivers) and per receiver (its compliments), and
+# replaced whenever those rows change. Tokens are random rather than counters so a validator lost to eviction or a
+# restart can never match an ETag handed out before.
+#
+# Readers get the validator before querying, and writers replace it after their transaction commits, so a response
+# is never labelled with a validator newer than its data. With more than one process the cache has to be shared.
+# Replicas lag behind that commit though, so for REPLICA_PIN_SECONDS after a validator was issued the request reading
+# it reads from default, whoever wrote the rows, including the retrieval counts flushed in the background.
+#
+# Single objects are validated by their own timestamps instead, they are loaded before the view runs.
+
+Validator = Tuple[str, float]
+
+
+def _validator_key(kind: str, owner_id: int) -> str:
+    return 'validator:{}:{}'.format(kind, owner_id)
+
+
+def _new_validator() -> Validator:
+    return uuid4().hex, time.time()
+
+
+def _get_validator(kind: str, owner_id: int) -> Validator:
+    cache = caches[settings.VALIDATOR_CACHE]
+    key = _validator_key(kind, owner_id)
+    validator = cache.get(key)
+
+    if validator is None:
+        validator = _new_validator()
+
+        # Concurrent misses agree on whichever validator was added first
+        if not cache.add(key, validator, None):
+            validator = cache.get(key, validator)
+
+    if time.time() - validator[1] < settings.REPLICA_PIN_SECONDS:
+        read_from_default()
+
+    return validator
+
+
+def _replace_validators(kind: str, owner_ids) -> None:
+    keys = [_validator_key(kind, owner_id) for owner_id in set(owner_ids)]
+
+    # Outside of a transaction this runs right away
+    transaction.on_commit(lambda: caches[settings.VALIDATOR_CACHE].set_many(
+        {key: _new_validator() for key in keys}, None
+    ))
+
+
+def receivers_validator(user_id: int) -> Validator:
+    return _get_validator('receivers', user_id)
+
+
+def compliments_validator(receiver_id: int) -> Validator:
+    return _get_validator('compliments', receiver_id)
+
+
+def receivers_changed(*user_ids: int) -> None:
+    _replace_validators('receivers', user_ids)
+
+
+def compliments_changed(*receiver_ids: int) -> None:
+    _replace_validators('compliments', receiver_ids)
+
+
+def object_validator(instance, *timestamp_fields: str) -> Validator:
+    timestamps = [getattr(instance, field) for field in timestamp_fields]
+    microseconds = [int(timestamp.timestamp() * 1000000) if timestamp else 0 for timestamp in timestamps]
+
+    return '{}-{}'.format(instance.pk, '-'.join(map(str, microseconds))), max(microseconds) / 1000000
+
+
+def not_modified(request: HttpRequest, validator: Validator) -> Optional[HttpResponse]:
+    """
+    A 304 when the request's If-None-Match or If-Modified-Since still matches the validator, otherwise None.
+    """
+    response = get_conditional_response(request, etag=quote_etag(validator[0]), last_modified=int(validator[1]))
+
+    return with_validator(response, validator) if response is not None else None
+
+
+def with_validator(response: HttpResponse, validator: Validator) -> HttpResponse:
+    response['ETag'] = quote_etag(validator[0])
+    # Last-Modified only has a resolution of seconds, the ETag is what catches changes within the same second
+    response['Last-Modified'] = http_date(int(validator[1]))
+
+    return response
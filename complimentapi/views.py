@@ -1,16 +1,38 @@
 import os
-import requests
-from datetime import datetime
+from contextlib import nullcontext
+from typing import Dict, Iterable, Iterator
+import httpx
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse
 from rest_framework import viewsets
+from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.request import Request
 from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.decorators import action
-
-from complimentapi.models import Receiver, User, Compliment
-from complimentapi.serializers import UserSerializer, ReceiverSerializer, ComplimentSerializer
+from rest_framework.exceptions import ValidationError
+
+from complimentapi import oauth
+from complimentapi.batch import run_operation
+from complimentapi.idempotency import IdempotencyKeyReused, idempotency_key, record_response, replayed_response
+from complimentapi.models import Receiver, User, Compliment, compliment_text_hash
+from complimentapi.serializers import (
+    DUPLICATE_TEXT_ERRORS, BatchSerializer, BulkDeleteSerializer, RetrievalStatsSerializer, UserSerializer,
+    ReceiverSerializer, ComplimentSerializer
+)
+from complimentapi.streaming import async_chunks, csv_lines, ndjson_lines, read_rows
+from complimentapi.pagination import SearchPagination, paginated_response
 from complimentapi.permissions import OwnsReceiver, OwnsCompliment
+from complimentapi.retrievals import retrieval_stats, select_compliments, select_digest
+from complimentapi.sampling import invalidate_sampling_table
+from complimentapi.search import index_compliments, ranked_compliments, search_compliments
+from complimentapi.throttling import ThrottleBeforePermissionsMixin, throttle
+from complimentapi.validators import (
+    compliments_changed, compliments_validator, not_modified, object_validator, receivers_validator, with_validator
+)
 
 import logging
 logger = logging.getLogger('django')
@@ -24,7 +46,7 @@ scopes: list = [
 ]
 
 
-class AuthViewSet(viewsets.GenericViewSet):
+class AuthViewSet(ThrottleBeforePermissionsMixin, viewsets.GenericViewSet):
     """
     A viewset for auth actions.
     """
@@ -40,57 +62,79 @@ class AuthViewSet(viewsets.GenericViewSet):
 
         return Response(headers={'Location': oauth_url}, status=302)
 
-    @action(detail=False, methods=['get'], name='OAuth Callback')
-    def oauth_callback(self, request: Request) -> Response:
-        try:
-            # Check access denied or no code
-            if request.query_params.get('error') == 'access_denied' or not request.query_params.get('code'):
-                return Response(401)
-
-            # Make request for access token and get user info
-            token_response_data = requests.post(
-                'https://oauth2.googleapis.com/token',
-                {
-                    'client_id': oauth_client_id,
-                    'client_secret': oauth_client_secret,
-                    'code': request.query_params.get('code'),
-                    'grant_type': 'authorization_code',
-                    'redirect_uri': redirect_uri
-                }
-            ).json()
-
-            user_info = requests.get(
-                'https://www.googleapis.com/userinfo/v2/me',
-                headers={'Authorization': 'Bearer {}'.format(token_response_data.get('access_token'))}
-            ).json()
-
-            if user_info.get('error'):
-                logger.info(user_info)
-                raise Exception('something went wrong')
-
-            # Get or create user
-            user, _ = User.objects.get_or_create(
-                email=user_info.get('email'), defaults={
-                    'first_name': user_info.get('given_name'),
-                    'last_name': user_info.get('family_name')
-                }
-            )
-
-            # Create jwt to client
-            refresh = RefreshToken.for_user(user)
-
-            # In production, this would be changed to a redirect to the frontend, with the token in a qs param
-            return Response({'access': str(refresh.access_token)}, 200)
-        except Exception as e:
-            logger.error(str(e), exc_info=True)
-            return Response(500)
-
     @action(detail=False, methods=['get'], name='Me', permission_classes=[IsAuthenticated])
     def me(self, request: Request) -> Response:
         return Response(UserSerializer(request.user).data, 200)
 
 
-class ReceiverViewSet(viewsets.ViewSet):
+@throttle
+async def oauth_callback(request: HttpRequest) -> HttpResponse:
+    """
+    Completes the Google login. A plain async Django view rather than a viewset action, so under ASGI waiting on Google
+    doesn't hold a worker thread.
+    """
+    # Check access denied or no code
+    if request.GET.get('error') == 'access_denied' or not request.GET.get('code'):
+        return HttpResponse(status=401)
+
+    try:
+        token_response_data = await oauth.exchange_code(
+            request.GET['code'], oauth_client_id, oauth_client_secret, redirect_uri
+        )
+
+        # The id_token already carries the user's email and name, verifying it locally saves the userinfo round trip
+        if settings.GOOGLE_OAUTH_VERIFY_ID_TOKEN and token_response_data.get('id_token'):
+            user_info = await oauth.verify_id_token(token_response_data['id_token'], audience=oauth_client_id)
+        else:
+            user_info = await oauth.fetch_user_info(token_response_data.get('access_token'))
+    except oauth.OAuthError as e:
+        logger.info(str(e))
+        return HttpResponse(status=401)
+    except (httpx.HTTPError, oauth.ProviderError) as e:
+        logger.error(str(e), exc_info=True)
+        return HttpResponse(status=504 if isinstance(e, httpx.TimeoutException) else 502)
+
+    # Get or create user
+    user, _ = await User.objects.aget_or_create(
+        email=user_info.get('email'), defaults={
+            'first_name': user_info.get('given_name'),
+            'last_name': user_info.get('family_name')
+        }
+    )
+
+    # Create jwt to client
+    refresh = RefreshToken.for_user(user)
+
+    # In production, this would be changed to a redirect to the frontend, with the token in a qs param
+    return JsonResponse({'access': str(refresh.access_token)})
+
+
+EXPORT_CSV_HEADER = [
+    'receiver_id', 'receiver_name', 'receiver_created_at', 'receiver_updated_at',
+    'compliment_id', 'compliment_text', 'compliment_created_at', 'compliment_updated_at', 'compliment_last_retrieved_at'
+]
+
+
+def export_records(rows: Iterable[tuple]) -> Iterator[dict]:
+    """
+    Turn joined receiver/compliment rows into a receiver record followed by one record per compliment.
+    """
+    receiver_id = None
+
+    for row in rows:
+        if row[0] != receiver_id:
+            receiver_id = row[0]
+            yield {'type': 'receiver', 'id': row[0], 'name': row[1], 'created_at': row[2], 'updated_at': row[3]}
+
+        # Receivers without compliments come back with NULL compliment columns
+        if row[4] is not None:
+            yield {
+                'type': 'compliment', 'id': row[4], 'receiver': row[0], 'text': row[5], 'created_at': row[6],
+                'updated_at': row[7], 'last_retrieved_at': row[8]
+            }
+
+
+class ReceiverViewSet(ThrottleBeforePermissionsMixin, viewsets.ViewSet):
     """
     Viewset for Receiver actions.
     """
@@ -105,24 +149,32 @@ class ReceiverViewSet(viewsets.ViewSet):
 
         return permissions
 
-    def list(self, request: Request) -> Response:
-        queryset = Receiver.objects.filter(user=request.user)
-        return Response(ReceiverSerializer(queryset, many=True).data)
+    def list(self, request: Request) -> HttpResponse:
+        validator = receivers_validator(request.user.id)
+
+        return not_modified(request, validator) or with_validator(
+            paginated_response(Receiver.objects.filter(user_id=request.user.id), ReceiverSerializer, request, self),
+            validator
+        )
 
-    def retrieve(self, request: Request, pk: int = None) -> Response:
-        return Response(ReceiverSerializer(Receiver.objects.get(id=pk)).data)
+    def retrieve(self, request: Request, pk: int = None) -> HttpResponse:
+        validator = object_validator(request.receiver, 'updated_at')
+
+        return not_modified(request, validator) or with_validator(
+            Response(ReceiverSerializer(request.receiver).data), validator
+        )
 
     def create(self, request: Request) -> Response:
         serializer = ReceiverSerializer(data={**request.data, 'user': request.user.id})
         if not serializer.is_valid():
             return Response(serializer.errors, 400)
 
-        serializer.save(user=request.user)
+        serializer.save(user_id=request.user.id)
 
         return Response(serializer.data)
 
     def partial_update(self, request: Request, pk: int = None) -> Response:
-        receiver = Receiver.objects.get(id=pk)
+        receiver = request.receiver
         serializer = ReceiverSerializer(receiver, data=request.data, partial=True)
 
         if not serializer.is_valid():
@@ -134,38 +186,94 @@ class ReceiverViewSet(viewsets.ViewSet):
         return Response(serializer.data)
 
     def destroy(self, request: Request, pk: int = None) -> Response:
-        Receiver.objects.get(id=pk).delete()
+        request.receiver.delete()
         return Response(status=204)
 
+    @action(detail=False, methods=['delete'], url_path='bulk')
+    def bulk_destroy(self, request: Request) -> Response:
+        """
+        Delete the user's receivers among {"ids": [...]} with their compliments. Ids of other users' receivers or of
+        receivers that don't exist are ignored.
+        """
+        serializer = BulkDeleteSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, 400)
+
+        receivers = Receiver.objects.filter(user_id=request.user.id, id__in=serializer.validated_data['ids'])
+        deleted: int = 0
+
+        # One at a time, so each receiver's compliments go in bounded batches instead of one long transaction
+        for receiver in receivers:
+            receiver.delete()
+            deleted += 1
+
+        return Response({'deleted': deleted})
+
+    @action(detail=False, url_path='export')
+    def export(self, request: Request) -> HttpResponse:
+        """
+        Stream all of the user's receivers and their compliments as NDJSON, or as CSV with ?type=csv. Rows come from a
+        single receiver/compliment join read in chunks, so memory stays constant however much is exported.
+        """
+        rows = Receiver.objects.filter(user_id=request.user.id).order_by('id', 'compliments__id').values_list(
+            'id', 'name', 'created_at', 'updated_at',
+            'compliments__id', 'compliments__text', 'compliments__created_at', 'compliments__updated_at',
+            'compliments__last_retrieved_at'
+        ).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+        if request.query_params.get('type') == 'csv':
+            lines, content_type = csv_lines(EXPORT_CSV_HEADER, rows), 'text/csv'
+        else:
+            lines, content_type = ndjson_lines(export_records(rows)), 'application/x-ndjson'
+
+        if isinstance(request._request, ASGIRequest):
+            # Django's ASGI handler iterates streaming responses on the event loop, where the ORM can't run
+            lines = async_chunks(lines, settings.EXPORT_CHUNK_SIZE)
+
+        return StreamingHttpResponse(lines, content_type=content_type)
+
+    @action(detail=False, url_path='random-digest')
+    def random_digest(self, request: Request) -> Response:
+        """
+        One random compliment for each of the user's receivers.
+        """
+        return Response(ComplimentSerializer(select_digest(request.user.id), many=True).data)
+
     @action(detail=True, permission_classes=[OwnsReceiver], url_path='random-compliment')
     def random_compliment(self, request: Request, pk: int = None) -> Response:
-        random_compliment = Receiver.objects.get(id=pk).get_random_compliment()
+        random_compliments = select_compliments(request.receiver)
 
-        random_compliment.last_retrieved_at = datetime.now()
-        random_compliment.save()
+        if not random_compliments:
+            return Response(status=404)
 
-        return Response(ComplimentSerializer(random_compliment).data)
+        return Response(ComplimentSerializer(random_compliments[0]).data)
 
     @action(detail=True, permission_classes=[OwnsReceiver], url_path='random-compliment-list')
     def random_compliment_list(self, request: Request, pk: int = None) -> Response:
         number: int = 3
 
         try:
-            number = int(request.QUERY_PARAMS.get('number'))
+            number = int(request.query_params.get('number', number))
         except Exception as e:
             logger.error(str(e), exc_info=True)
 
-        random_compliments = Receiver.objects.get(id=pk).get_random_compliments(number)
+        random_compliments = select_compliments(request.receiver, number)
 
-        for compliment in random_compliments:
-            compliment.last_retrieved_at = datetime.now()
+        return Response(ComplimentSerializer(random_compliments, many=True).data)
 
-        Compliment.objects.bulk_update(random_compliments, ['last_retrieved_at'])
+    @action(detail=True, permission_classes=[OwnsReceiver], url_path='stats')
+    def stats(self, request: Request, pk: int = None) -> Response:
+        """
+        How often the receiver's compliments were retrieved over the last ?days=7 days.
+        """
+        serializer = RetrievalStatsSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, 400)
 
-        return Response(ComplimentSerializer(random_compliments, many=True).data)
+        return Response(retrieval_stats(request.receiver.id, serializer.validated_data['days']))
 
 
-class ComplimentViewSet(viewsets.ViewSet):
+class ComplimentViewSet(ThrottleBeforePermissionsMixin, viewsets.ViewSet):
     """
     Viewset for Receiver actions.
     """
@@ -175,41 +283,204 @@ class ComplimentViewSet(viewsets.ViewSet):
     def get_permissions(self):
         permissions = super().get_permissions()
 
-        if self.action in ['list', 'create']:
+        if self.action in ['list', 'create', 'bulk_import', 'bulk_destroy']:
             permissions.append(OwnsReceiver())
         if self.action in ['retrieve', 'partial_update', 'destroy']:
             permissions.append(OwnsCompliment())
 
         return permissions
 
-    def list(self, request: Request, receiver_pk: int = None) -> Response:
-        receiver = Receiver.objects.get(id=receiver_pk)
-        return Response(ComplimentSerializer(receiver.compliments.all(), many=True).data)
+    def list(self, request: Request, receiver_pk: int = None) -> HttpResponse:
+        validator = compliments_validator(request.receiver.id)
+
+        return not_modified(request, validator) or with_validator(
+            paginated_response(request.receiver.compliments.all(), ComplimentSerializer, request, self), validator
+        )
 
-    def retrieve(self, request: Request, pk: int = None, receiver_pk: int = None) -> Response:
-        return Response(ComplimentSerializer(Compliment.objects.get(id=pk)).data)
+    def retrieve(self, request: Request, pk: int = None, receiver_pk: int = None) -> HttpResponse:
+        validator = object_validator(request.compliment, 'updated_at', 'last_retrieved_at')
+
+        return not_modified(request, validator) or with_validator(
+            Response(ComplimentSerializer(request.compliment).data), validator
+        )
 
     def create(self, request: Request, receiver_pk: int = None) -> Response:
         serializer = ComplimentSerializer(data={**request.data, 'receiver': receiver_pk})
         if not serializer.is_valid():
             return Response(serializer.errors, 400)
 
-        serializer.save(receiver_id=receiver_pk)
+        text_hash = compliment_text_hash(serializer.validated_data['text'])
+        cache_key = idempotency_key(request, request.receiver.id)
 
-        return Response(serializer.data)
+        try:
+            data = replayed_response(cache_key, text_hash)
+        except IdempotencyKeyReused as e:
+            return Response({'detail': str(e)}, 422)
+
+        if data is None:
+            # A retry finds the compliment its first attempt created instead of adding a duplicate
+            compliment, _ = Compliment.objects.get_or_create(
+                receiver_id=request.receiver.id, text_hash=text_hash, defaults=serializer.validated_data
+            )
+            data = ComplimentSerializer(compliment).data
+            record_response(cache_key, text_hash, data)
+
+        return Response(data)
 
     def partial_update(self, request: Request, pk: int = None, receiver_pk: int = None) -> Response:
-        compliment = Compliment.objects.get(id=pk)
+        compliment = request.compliment
         serializer = ComplimentSerializer(compliment, data=request.data, partial=True)
 
         if not serializer.is_valid():
             logger.info(serializer.data)
             return Response(serializer.errors, 400)
 
-        serializer.update(compliment, serializer.validated_data)
+        try:
+            with transaction.atomic():
+                serializer.update(compliment, serializer.validated_data)
+        except IntegrityError:
+            return Response(DUPLICATE_TEXT_ERRORS, 400)
 
         return Response(serializer.data)
 
     def destroy(self, request: Request, pk: int = None, receiver_pk: int = None) -> Response:
-        Compliment.objects.filter(id=pk).delete()
+        request.compliment.delete()
         return Response(status=204)
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_import(self, request: Request, receiver_pk: int = None) -> Response:
+        """
+        Import compliments from an NDJSON body ({"text": ...} per line) or a CSV body with a text column. The body is
+        read as a stream and inserted in batches of COMPLIMENT_IMPORT_BATCH_SIZE, invalid rows are reported and
+        skipped, and compliments the receiver already has are counted as duplicates and skipped.
+        """
+        valid: int = 0
+        created: int = 0
+        errors: list = []
+        error_count: int = 0
+        # Keyed by text hash, the first of duplicates within a batch is kept
+        batch: Dict[str, Compliment] = {}
+
+        # One serializer validates every row, building its fields once per row would dominate the import
+        serializer = ComplimentSerializer()
+
+        with transaction.atomic():
+            # request.stream instead of request.data, so the body is never loaded into memory at once
+            for line, row in read_rows(request.stream, request.content_type):
+                try:
+                    if row is None:
+                        raise ValidationError('Invalid row')
+
+                    compliment = Compliment(receiver_id=request.receiver.id, **serializer.run_validation(row))
+                    compliment.text_hash = compliment_text_hash(compliment.text)
+                    batch.setdefault(compliment.text_hash, compliment)
+                    valid += 1
+                except ValidationError as e:
+                    error_count += 1
+                    if len(errors) < settings.COMPLIMENT_IMPORT_MAX_ERRORS:
+                        errors.append({'line': line, 'errors': e.detail})
+
+                if len(batch) >= settings.COMPLIMENT_IMPORT_BATCH_SIZE:
+                    created += self._create_new(request.receiver.id, batch)
+                    batch = {}
+
+            created += self._create_new(request.receiver.id, batch)
+
+        # bulk_create doesn't send post_save, the batches were indexed for search above
+        invalidate_sampling_table(request.receiver.id)
+        compliments_changed(request.receiver.id)
+
+        return Response({
+            'created': created, 'duplicate_count': valid - created, 'error_count': error_count, 'errors': errors
+        })
+
+    @bulk_import.mapping.delete
+    def bulk_destroy(self, request: Request, receiver_pk: int = None) -> Response:
+        """
+        Delete the receiver's compliments among {"ids": [...]}. Ids of other receivers' compliments or of compliments
+        that don't exist are ignored.
+        """
+        serializer = BulkDeleteSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, 400)
+
+        return Response({'deleted': request.receiver.delete_compliments(serializer.validated_data['ids'])})
+
+    @staticmethod
+    def _create_new(receiver_id: int, batch: Dict[str, Compliment]) -> int:
+        """
+        Insert the compliments of a batch the receiver doesn't have yet, found with a single lookup of the batch's
+        hashes in the unique (receiver, text_hash) index. Returns how many were inserted.
+        """
+        existing_hashes = Compliment.objects.filter(receiver_id=receiver_id, text_hash__in=batch).values_list(
+            'text_hash', flat=True
+        )
+        existing = set(existing_hashes)
+
+        while True:
+            new = [compliment for text_hash, compliment in batch.items() if text_hash not in existing]
+
+            try:
+                # A savepoint, so a conflict rolls back this insert only instead of the whole import
+                with transaction.atomic():
+                    compliments = Compliment.objects.bulk_create(new)
+                break
+            except IntegrityError:
+                # Another request created some of the batch since the lookup, retry without them. A conflict that
+                # isn't explained by new rows would fail the same way again.
+                now_existing = set(existing_hashes.all())
+                if now_existing <= existing:
+                    raise
+
+                existing = now_existing
+
+        index_compliments(compliments)
+
+        return len(new)
+
+
+class ComplimentSearchView(ThrottleBeforePermissionsMixin, APIView):
+    """
+    Search the user's compliments across all of their receivers, best matches first.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request: Request) -> Response:
+        paginator = SearchPagination()
+        page = paginator.paginate_queryset(
+            search_compliments(request.user.id, request.query_params.get('q', '')), request, view=self
+        )
+
+        return paginator.get_paginated_response(ComplimentSerializer(ranked_compliments(page), many=True).data)
+
+
+class BatchView(ThrottleBeforePermissionsMixin, APIView):
+    """
+    Run several API calls in one round trip. Operations run in order, each through its own view with the batch's
+    authentication, and may refer to the bodies of earlier ones, see complimentapi.batch. With atomic set, a failed
+    operation rolls back all of them and ends the batch.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request: Request) -> Response:
+        serializer = BatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, 400)
+
+        results: list = []
+        rolled_back: bool = False
+
+        with transaction.atomic() if serializer.validated_data['atomic'] else nullcontext():
+            for operation in serializer.validated_data['operations']:
+                results.append(run_operation(
+                    request, operation['method'], operation['path'], operation.get('body'), results
+                ))
+
+                if serializer.validated_data['atomic'] and results[-1]['status'] >= 400:
+                    transaction.set_rollback(True)
+                    rolled_back = True
+                    break
+
+        return Response({'results': results, 'rolled_back': rolled_back})